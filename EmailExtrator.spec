@@ -7,7 +7,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['imaplib', 'email', 'json', 'logging', 'src', 'src.email_processor', 'src.app', 'pandas', 'tkinter', 'openpyxl', 'openpyxl.cell', 'openpyxl.workbook', 'openpyxl.writer'],
+    hiddenimports=['imaplib', 'email', 'json', 'logging', 'src', 'src.email_processor', 'src.imap_utils', 'src.mbox_index', 'src.extraction', 'src.normalization', 'src.extraction_cache', 'src.html_text', 'src.decoding', 'src.message_store', 'src.backfill', 'src.reference_index', 'src.sinks', 'src.cli', 'src.app', 'pandas', 'regex', 'tkinter', 'openpyxl', 'openpyxl.cell', 'openpyxl.workbook', 'openpyxl.writer'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
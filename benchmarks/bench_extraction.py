@@ -0,0 +1,65 @@
+"""
+Micro-benchmark da extração de campos: buscas individuais por campo x plano compilado
+
+Uso: python benchmarks/bench_extraction.py [quantidade de campos] [quantidade de emails]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.extraction import ExtractionPlan
+
+
+def legacy_search(field_names, text):
+    """Extração anterior: até duas buscas no texto inteiro por campo"""
+    results = {}
+    for field_name in field_names:
+        match = re.search(r'{}:\s*([^\r\n]+)'.format(re.escape(field_name)), text)
+        if not match:
+            match = re.search(r'{}\s*:?\s*([^\r\n]+)'.format(re.escape(field_name)), text)
+        results[field_name] = match.group(1).strip() if match else None
+    return results
+
+
+def build_sample(field_count):
+    field_names = [f"Campo de teste número {i}" for i in range(field_count)]
+    lines = ["Prezado(a),", "Segue a confirmação da transferência bancária.", ""]
+    lines += ["Texto de preenchimento sem campos relevantes para a extração. " * 4] * 40
+    for i, name in enumerate(field_names):
+        # Metade dos campos no formato exato, alguns no flexível e alguns ausentes
+        if i % 4 == 3:
+            continue
+        lines.append(f"{name}: valor {i}" if i % 2 == 0 else f"{name} valor {i}")
+    lines += ["Atenciosamente,", "Setor financeiro"]
+    return field_names, "\r\n".join(lines)
+
+
+def main():
+    field_count = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+    email_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    field_names, text = build_sample(field_count)
+
+    plan = ExtractionPlan(field_names)
+    assert plan.search(text) == legacy_search(field_names, text)
+
+    start = time.perf_counter()
+    for _ in range(email_count):
+        legacy_search(field_names, text)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(email_count):
+        plan.search(text)
+    plan_time = time.perf_counter() - start
+
+    print(f"{field_count} campos, {email_count} emails de {len(text)} caracteres")
+    print(f"buscas por campo: {legacy_time:.3f}s ({email_count / legacy_time:.0f} emails/s)")
+    print(f"plano compilado:  {plan_time:.3f}s ({email_count / plan_time:.0f} emails/s)")
+    print(f"ganho: {legacy_time / plan_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 from src.app import EmailApp
 import tkinter as tk
 
@@ -9,4 +10,10 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos no executável gerado pelo PyInstaller
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        # Comandos de linha de comando (ex.: pre-carregar, reprocessar)
+        from src.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
     main()
\ No newline at end of file
@@ -37,6 +37,9 @@ class EmailApp:
         self.additional_fields = []  # Campos adicionais para extração do Excel
         self.key_field = ""  # Campo chave para relacionar os dados
         
+        # Evento para encerrar o monitoramento contínuo (None quando inativo)
+        self.watch_stop_event = None
+        
         # Carregar configurações salvas
         self.load_saved_config()
         
@@ -203,6 +206,11 @@ class EmailApp:
         button_frame.grid(row=11, column=0, columnspan=2, pady=15)
         
         ttk.Button(button_frame, text="Processar Emails", command=self.start_processing).pack(side=tk.LEFT, padx=10)
+        self.watch_button = ttk.Button(button_frame, text="Monitorar Emails", command=self.toggle_watch)
+        self.watch_button.pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Importar Pasta", command=self.start_directory_import).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Importar mbox", command=self.start_mbox_import).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Reprocessar Cache", command=self.start_store_reprocessing).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="Teste de Conexão", command=self.test_connection).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="Sair", command=self.root.quit).pack(side=tk.LEFT, padx=10)
         
@@ -384,13 +392,14 @@ class EmailApp:
     def get_custom_fields(self):
         """Obtém todos os campos personalizados inseridos pelo usuário com seu formato"""
         fields = []
+        saved_patterns = {field["name"]: field.get("pattern") for field in self.custom_fields}
         for _, var, _, format_var in self.field_widgets:
             field_name = var.get().strip()
             field_format = format_var.get().strip()
             
             if field_name:
-                # Criar um padrão que capture especificamente o texto entre ": " e a quebra de linha
-                pattern = r'{}:\s*([^\r\n]+)'.format(re.escape(field_name))
+                # Manter o padrão próprio do campo, se houver; senão, capturar o texto entre ": " e a quebra de linha
+                pattern = saved_patterns.get(field_name) or r'{}:\s*([^\r\n]+)'.format(re.escape(field_name))
                 fields.append({
                     "name": field_name, 
                     "pattern": pattern,
@@ -465,9 +474,8 @@ class EmailApp:
         else:
             self.log("Falha no teste de conexão. Verifique os logs para mais detalhes.")
     
-    def start_processing(self):
-        """Inicia o processamento dos emails em uma thread separada"""
-        # Validar campos
+    def _get_processing_params(self):
+        """Valida os campos da interface e retorna os parâmetros de processamento (ou None se inválidos)"""
         email = self.email_var.get().strip()
         password = self.password_var.get().strip()
         server = self.server_var.get().strip()
@@ -477,25 +485,30 @@ class EmailApp:
             port = int(self.port_var.get().strip())
         except ValueError:
             messagebox.showerror("Erro", "A porta deve ser um número!")
-            return
+            return None
             
         try:
             timeout = int(self.timeout_var.get().strip())
         except ValueError:
             messagebox.showerror("Erro", "O timeout deve ser um número!")
-            return
+            return None
         
         use_ssl = self.use_ssl_var.get()
         
         if not email or not password or not server or not subject:
             messagebox.showerror("Erro", "Todos os campos são obrigatórios!")
-            return
+            return None
             
         # Obter campos personalizados
         self.custom_fields = self.get_custom_fields()
         if not self.custom_fields:
             messagebox.showerror("Erro", "É necessário definir pelo menos um campo para extração!")
-            return
+            return None
+            
+        errors = self.email_processor.validate_custom_fields(self.custom_fields)
+        if errors:
+            messagebox.showerror("Erro", "Padrões de extração inválidos:\n" + "\n".join(errors))
+            return None
             
         # Atualizar os campos de extração no processador
         self.email_processor.custom_fields = self.custom_fields
@@ -507,11 +520,118 @@ class EmailApp:
         # Salvar configurações de campos adicionais
         self.save_additional_fields_config()
         
+        return (email, password, server, port, use_ssl, timeout, subject)
+    
+    def start_processing(self):
+        """Inicia o processamento dos emails em uma thread separada"""
+        params = self._get_processing_params()
+        if params is None:
+            return
+        
         # Iniciar thread para não bloquear a interface
         threading.Thread(target=self.process_emails, 
-                         args=(email, password, server, port, use_ssl, timeout, subject), 
+                         args=params, 
+                         daemon=True).start()
+    
+    def toggle_watch(self):
+        """Inicia ou encerra o monitoramento contínuo da caixa de entrada (IMAP IDLE)"""
+        if self.watch_stop_event is not None:
+            self.log("Encerrando monitoramento...")
+            self.watch_stop_event.set()
+            return
+        
+        params = self._get_processing_params()
+        if params is None:
+            return
+        
+        self.watch_stop_event = threading.Event()
+        self.watch_button.config(text="Parar Monitoramento")
+        threading.Thread(target=self.watch_emails, 
+                         args=params + (self.watch_stop_event,), 
+                         daemon=True).start()
+    
+    def watch_emails(self, email, password, server, port, use_ssl, timeout, subject, stop_event):
+        """Monitora a caixa de entrada e processa os novos emails assim que chegam"""
+        try:
+            self.log(f"Conectando ao servidor {server}:{port} para monitoramento...")
+            if not self.email_processor.connect_to_server(email, password, server, port, use_ssl, timeout):
+                self.log("Falha ao conectar ao servidor de email.")
+                return
+            
+            self.log(f"Monitorando novos emails com assunto contendo: '{subject}'...")
+            self.email_processor.watch_mailbox(
+                subject, stop_event,
+                on_new_data=lambda processed: self.log(f"Processados {processed} novos emails."))
+        except Exception as e:
+            error_msg = f"Erro no monitoramento: {str(e)}"
+            self.log(error_msg)
+            logger.error(error_msg, exc_info=True)
+        finally:
+            self.email_processor.close_connection()
+            self.watch_stop_event = None
+            self.watch_button.config(text="Monitorar Emails")
+            self.log("Monitoramento encerrado.")
+    
+    def start_directory_import(self):
+        """Processa offline uma pasta com arquivos .eml ou Maildir exportados"""
+        directory = filedialog.askdirectory(title="Selecione a pasta com os emails exportados")
+        if directory:
+            self._start_offline_import(self.email_processor.process_directory, directory)
+    
+    def start_mbox_import(self):
+        """Processa offline um arquivo mbox exportado (ex.: Thunderbird)"""
+        mbox_path = filedialog.askopenfilename(title="Selecione o arquivo mbox",
+                                               filetypes=[("Arquivos mbox", "*.mbox *"), ("Todos os arquivos", "*.*")])
+        if mbox_path:
+            self._start_offline_import(self.email_processor.process_mbox, mbox_path)
+    
+    def start_store_reprocessing(self):
+        """Reextrai os campos das mensagens guardadas no armazenamento local, sem acessar o servidor"""
+        self._start_offline_import(self.email_processor.process_message_store, self.email_processor.mailbox)
+    
+    def _start_offline_import(self, process_function, source):
+        """Valida os campos de extração e inicia o processamento offline em uma thread separada"""
+        # Obter campos personalizados
+        self.custom_fields = self.get_custom_fields()
+        if not self.custom_fields:
+            messagebox.showerror("Erro", "É necessário definir pelo menos um campo para extração!")
+            return
+        
+        errors = self.email_processor.validate_custom_fields(self.custom_fields)
+        if errors:
+            messagebox.showerror("Erro", "Padrões de extração inválidos:\n" + "\n".join(errors))
+            return
+        
+        self.email_processor.custom_fields = self.custom_fields
+        self.save_additional_fields_config()
+        
+        # Iniciar thread para não bloquear a interface
+        threading.Thread(target=self.process_offline, 
+                         args=(process_function, source), 
                          daemon=True).start()
     
+    def process_offline(self, process_function, source):
+        """Processa os emails exportados (pasta ou mbox) e salva os dados extraídos"""
+        try:
+            self.log(f"Processando emails de: {source}...")
+            processed = process_function(
+                source,
+                on_progress=lambda done, total, rate: self.log(f"{done}/{total} emails processados ({rate:.1f} emails/s)"))
+            
+            self.log(f"Processados {processed} emails.")
+            if not processed:
+                return
+            
+            self.log("Salvando dados em arquivo Excel...")
+            if self.email_processor.save_to_excel():
+                self.log("Dados salvos com sucesso!")
+            else:
+                self.log("Não foi possível salvar os dados.")
+        except Exception as e:
+            error_msg = f"Erro: {str(e)}"
+            self.log(error_msg)
+            logger.error(error_msg, exc_info=True)
+    
     def process_emails(self, email, password, server, port, use_ssl, timeout, subject):
         """Processa os emails com os parâmetros fornecidos"""
         try:
@@ -536,10 +656,14 @@ class EmailApp:
             self.log(f"Processados {processed} emails.")
             self.log("Salvando dados em arquivo Excel...")
             
-            if self.email_processor.save_to_excel():
+            saved = self.email_processor.save_to_excel()
+            if saved:
                 self.log("Dados salvos com sucesso!")
             else:
                 self.log("Não foi possível salvar os dados.")
+            # Avançar a marca de sincronização apenas com a saída gravada
+            if saved or not self.email_processor.extracted_data:
+                self.email_processor.commit_sync_state()
                 
             self.email_processor.close_connection()
             self.log("Conexão fechada. Processamento concluído.")
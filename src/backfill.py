@@ -0,0 +1,68 @@
+import os
+import json
+import logging
+from datetime import timedelta
+
+from src.imap_utils import parse_date
+
+logger = logging.getLogger('email_extrator')
+
+
+def date_shards(since, before, days=30):
+    """
+    Divide o período [since, before) em faixas consecutivas de até 'days' dias
+
+    Returns:
+        Lista de tuplas (início, fim) de datas, com o fim exclusivo (como SINCE/BEFORE do IMAP)
+    """
+    start, end = parse_date(since), parse_date(before)
+    if end <= start:
+        raise ValueError("A data final deve ser posterior à data inicial")
+    step = timedelta(days=max(1, int(days)))
+
+    shards = []
+    while start < end:
+        shards.append((start, min(start + step, end)))
+        start += step
+    return shards
+
+
+def shard_name(shard):
+    """Nome de uma faixa de datas, usado no arquivo de checkpoint (ex.: "20240101_20240131")"""
+    start, end = shard
+    return f"{start:%Y%m%d}_{end:%Y%m%d}"
+
+
+def checkpoint_path(directory, shard):
+    return os.path.join(directory, f"{shard_name(shard)}.json")
+
+
+def load_checkpoint(path, signature):
+    """
+    Lê o checkpoint de uma faixa já concluída
+
+    Returns:
+        Dicionário do checkpoint, ou None se não existir, estiver corrompido ou tiver
+        sido gerado com outra configuração de busca e campos ('signature' diferente)
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Checkpoint {path} ignorado: {str(e)}")
+        return None
+
+    if checkpoint.get('signature') != signature:
+        logger.info(f"Checkpoint {path} gerado com outra configuração, a faixa será refeita")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    """Grava o checkpoint de uma faixa de forma atômica (arquivo temporário + rename)"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(temporary, path)
@@ -0,0 +1,165 @@
+import os
+import sys
+import argparse
+import getpass
+from src.email_processor import EmailProcessor, logger
+
+OUTPUT_HELP = ("Arquivo de saída: .xlsx, .csv, .parquet ou .sqlite3 "
+               "(padrão: o mesmo usado pela interface, no formato 'output_format' das configurações)")
+
+
+def add_connection_arguments(parser):
+    parser.add_argument('--email', help="Endereço de email (padrão: o salvo nas configurações)")
+    parser.add_argument('--servidor', help="Servidor IMAP (padrão: o salvo nas configurações)")
+    parser.add_argument('--porta', type=int, default=993)
+    parser.add_argument('--sem-ssl', action='store_true', help="Conectar sem SSL (com STARTTLS)")
+    parser.add_argument('--timeout', type=int, default=30)
+    parser.add_argument('--senha', help="Senha (ou variável de ambiente EMAIL_AGENTE_SENHA)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='EmailExtrator',
+                                     description="Agente de Extração de Emails (linha de comando)")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    extract = subparsers.add_parser('extrair',
+                                    help="Busca os emails e grava os registros na saída em lotes, à medida que são extraídos")
+    add_connection_arguments(extract)
+    extract.add_argument('--assunto', help="Processar apenas os emails com este texto no assunto "
+                                           "(padrão: o salvo nas configurações)")
+    extract.add_argument('--saida', help=OUTPUT_HELP)
+
+    prewarm = subparsers.add_parser('pre-carregar',
+                                    help="Baixa para o armazenamento local as mensagens ainda não armazenadas")
+    add_connection_arguments(prewarm)
+    prewarm.add_argument('--assunto', help="Baixar apenas os emails com este texto no assunto")
+
+    reprocess = subparsers.add_parser('reprocessar',
+                                      help="Reextrai os campos das mensagens do armazenamento local, sem acessar a rede")
+    reprocess.add_argument('--caixa', help="Caixa de correio (padrão: INBOX)")
+    reprocess.add_argument('--processos', type=int, help="Quantidade de processos (padrão: número de núcleos)")
+    reprocess.add_argument('--saida', help=OUTPUT_HELP)
+
+    backfill = subparsers.add_parser('carga-historica',
+                                     help="Processa todos os emails de um período, em faixas de datas paralelas")
+    add_connection_arguments(backfill)
+    backfill.add_argument('--inicio', required=True, help="Data inicial (dd/mm/aaaa)")
+    backfill.add_argument('--fim', required=True, help="Data final, exclusiva (dd/mm/aaaa)")
+    backfill.add_argument('--assunto', help="Processar apenas os emails com este texto no assunto "
+                                            "(padrão: o salvo nas configurações)")
+    backfill.add_argument('--dias', type=int, default=30, help="Tamanho de cada faixa, em dias (padrão: 30)")
+    backfill.add_argument('--processos', type=int, default=4,
+                          help="Faixas processadas ao mesmo tempo, cada uma com uma sessão IMAP (padrão: 4)")
+    backfill.add_argument('--tentativas', type=int, default=1, help="Repetições das faixas com falha (padrão: 1)")
+    backfill.add_argument('--refazer', action='store_true', help="Ignorar os checkpoints das faixas já concluídas")
+    backfill.add_argument('--saida', help=OUTPUT_HELP)
+
+    return parser
+
+
+def connect(processor, config, args):
+    """Conecta ao servidor com os argumentos da linha de comando ou as configurações salvas"""
+    email_user = args.email or config.get('email_user')
+    imap_host = args.servidor or config.get('imap_host')
+    if not email_user or not imap_host:
+        print("Informe --email e --servidor (ou salve as configurações pela interface)")
+        return False
+
+    password = args.senha or os.environ.get('EMAIL_AGENTE_SENHA') or getpass.getpass("Senha: ")
+    if not processor.connect_to_server(email_user, password, imap_host, args.porta, not args.sem_ssl, args.timeout):
+        print("Falha ao conectar ao servidor de email.")
+        return False
+    return True
+
+
+def run_extract(processor, config, args):
+    if not connect(processor, config, args):
+        return 1
+
+    try:
+        search_subject = args.assunto if args.assunto is not None else config.get('search_subject')
+        email_ids = processor.search_emails(search_subject)
+        if not email_ids:
+            print("Nenhum email encontrado com os critérios especificados.")
+            return 0
+
+        # Os registros vão para a saída em lotes de output_batch_size (no Excel, fica em memória só a parte atual)
+        with processor.create_output_sink(processor.output_path(args.saida)) as sink:
+            processed = processor.process_emails(email_ids, sink)
+        # Destino fechado sem erro: avançar a marca de sincronização
+        processor.commit_sync_state()
+        print(f"Processados {processed} emails, {sink.count} registros gravados em: {', '.join(sink.paths)}")
+        return 0
+    finally:
+        processor.close_connection()
+
+
+def run_prewarm(processor, config, args):
+    if not connect(processor, config, args):
+        return 1
+
+    try:
+        saved = processor.prewarm_message_store(
+            args.assunto,
+            on_progress=lambda done, total, rate: print(f"{done}/{total} emails armazenados ({rate:.1f} emails/s)"))
+        print(f"{saved} emails gravados no armazenamento local: {processor.message_store_file}")
+        return 0
+    finally:
+        processor.close_connection()
+
+
+def run_reprocess(processor, config, args):
+    processed = processor.process_message_store(
+        args.caixa, args.processos,
+        on_progress=lambda done, total, rate: print(f"{done}/{total} emails processados ({rate:.1f} emails/s)"))
+    print(f"Processados {processed} emails.")
+    if processed and processor.save_to_excel(args.saida):
+        print("Dados salvos com sucesso!")
+    return 0
+
+
+def run_backfill(processor, config, args):
+    # A conexão inicial apenas valida as credenciais; cada faixa abre a sua própria sessão
+    if not connect(processor, config, args):
+        return 1
+    processor.close_connection()
+
+    search_subject = args.assunto if args.assunto is not None else config.get('search_subject')
+    processed, failed = processor.backfill(
+        args.inicio, args.fim, search_subject, shard_days=args.dias, workers=args.processos,
+        retries=args.tentativas, force=args.refazer,
+        on_progress=lambda done, total, rate: print(f"{done}/{total} faixas concluídas ({rate:.1f} emails/s)"))
+    print(f"Processados {processed} emails. Checkpoints em: {processor.backfill_dir}")
+    if failed:
+        print(f"Faixas com falha: {', '.join(failed)}. Execute o mesmo comando novamente para repeti-las.")
+        return 1
+    if processor.extracted_data and processor.save_to_excel(args.saida):
+        print("Dados salvos com sucesso!")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    processor = EmailProcessor()
+    processor.show_dialogs = False
+    config = processor.load_config()
+    if 'custom_fields' in config:
+        processor.custom_fields = config['custom_fields']
+
+    try:
+        if args.comando == 'extrair':
+            return run_extract(processor, config, args)
+        if args.comando == 'pre-carregar':
+            return run_prewarm(processor, config, args)
+        if args.comando == 'carga-historica':
+            return run_backfill(processor, config, args)
+        return run_reprocess(processor, config, args)
+    except Exception as e:
+        logger.error(f"Erro na linha de comando: {str(e)}", exc_info=True)
+        print(f"Erro: {str(e)}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import codecs
+from functools import lru_cache
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+CHARDET_SAMPLE_SIZE = 4 * 1024  # Trecho examinado pelo chardet (o custo cresce com o tamanho da amostra)
+CHARDET_MIN_CONFIDENCE = 0.1
+
+
+@lru_cache(maxsize=256)
+def lookup_codec(charset):
+    """Nome normalizado do codec de um charset declarado (ex.: "ISO_8859-1" -> "iso8859-1"), ou None se desconhecido"""
+    if not charset:
+        return None
+    try:
+        codec = codecs.lookup(charset.strip().strip('"\''))
+    except LookupError:
+        return None
+    # Codecs bytes-para-bytes (ex.: "base64") não servem para decodificar texto
+    return codec.name if getattr(codec, '_is_text_encoding', True) else None
+
+
+def decode_bytes(data, charset=None, detect=True):
+    """
+    Decodifica bytes em texto com uma única passada por tentativa, sem exceções em cascata
+
+    Ordem: charset declarado, UTF-8, palpite do chardet sobre uma amostra (se
+    instalado e 'detect' ativo) e, por fim, latin-1, que aceita qualquer sequência
+    de bytes e é comum em emails em português. Cada mensagem é decodificada de forma
+    independente: o codec que resolveu uma mensagem não é reaproveitado nas seguintes,
+    pois um palpite errado (ex.: utf-16) decodificaria as próximas sem erro, com texto
+    sem sentido.
+    """
+    if not data:
+        return ""
+
+    declared = lookup_codec(charset)
+    tried = []
+    for codec in (declared, 'utf-8'):
+        if codec and codec not in tried:
+            tried.append(codec)
+            try:
+                return str(data, codec)
+            except UnicodeDecodeError:
+                pass
+
+    codec = 'latin-1'
+    if detect and chardet is not None:
+        guess = chardet.detect(bytes(data[:CHARDET_SAMPLE_SIZE]))
+        guessed = lookup_codec(guess.get('encoding')) if (guess.get('confidence') or 0) >= CHARDET_MIN_CONFIDENCE else None
+        if guessed and guessed not in tried:
+            try:
+                return str(data, guessed)
+            except UnicodeDecodeError:
+                pass
+
+    return str(data, codec)
@@ -4,10 +4,34 @@ import re
 import os
 import json
 import logging
-import pandas as pd
+import traceback
+import unicodedata
+from tkinter import messagebox
 from email.header import decode_header
 from datetime import datetime
-import chardet
+import time
+import base64
+import quopri
+import threading
+import queue
+import heapq
+import multiprocessing
+import multiprocessing.util
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from src.imap_utils import (SocketLineReader, chunked, compress_uid_ranges, find_text_sections, get_bodystructure,
+                            imap_date, imap_quote, or_criteria, parse_esearch_response, parse_fetch_response,
+                            parse_search_response, take_buffered_bytes, to_uid_list)
+from src.mbox_index import MboxIndex
+from src.message_store import MessageStore
+from src.extraction import ExtractionPlan, label_pattern, validate_pattern
+from src.normalization import normalize_records
+from src.html_text import html_to_text
+from src.decoding import decode_bytes
+from src.extraction_cache import ExtractionCache, field_fingerprint, message_fingerprint
+from src.reference_index import load_reference_excel
+from src.sinks import OUTPUT_FORMATS, CsvSink, ExcelSink, ParquetSink, SqliteSink, output_format_for
+from src.backfill import checkpoint_path, date_shards, load_checkpoint, save_checkpoint, shard_name
 
 # Configurar logging
 logging.basicConfig(
@@ -18,6 +42,14 @@ logging.basicConfig(
 
 logger = logging.getLogger('email_extrator')
 
+# Cabeçalhos buscados pelo pré-filtro, antes de baixar o corpo das mensagens
+HEADER_FIELDS = 'HEADER.FIELDS (SUBJECT FROM DATE MESSAGE-ID)'
+
+# Configurações copiadas para cada processo da carga histórica, que abre a sua própria sessão IMAP
+BACKFILL_SETTINGS = ('email_user', 'email_pass', 'imap_host', 'imap_port', 'use_ssl', 'timeout', 'mailbox',
+                     'fetch_batch_size', 'sender_filter', 'search_body_labels', 'use_esearch', 'max_content_chars',
+                     'header_prefilter', 'header_batch_size')
+
 class EmailProcessor:
     def __init__(self):
         self.imap_server = None
@@ -25,7 +57,39 @@ class EmailProcessor:
         self.email_pass = None
         self.imap_host = None
         self.imap_port = 993  # Definindo a porta padrão IMAPS
+        self.use_ssl = True
+        self.timeout = 30
+        self.mailbox = 'INBOX'
         self.search_subject = None
+        self.fetch_batch_size = 200  # Quantidade de emails buscados por comando UID FETCH
+        self.fetch_pool_size = 1  # Quantidade de sessões IMAP paralelas para a busca (1 = sem paralelismo)
+        self.session_timeout = 60  # Timeout (segundos) de cada sessão do pool
+        self.fetch_mode = 'rfc822'  # 'rfc822' (mensagem completa) ou 'bodystructure' (apenas as partes de texto)
+        self.incremental_sync = False  # Buscar apenas UIDs acima da última marca processada, em vez de UNSEEN
+        self._pending_sync = None  # Estado de sincronização da busca atual, gravado ao final do processamento
+        self.idle_timeout = 28 * 60  # Reemitir o IDLE antes do limite de 29 minutos dos servidores
+        self.poll_interval = 60  # Intervalo (segundos) de verificação quando o servidor não suporta IDLE
+        self.show_dialogs = True  # Exibir caixas de diálogo (desativado no modo de monitoramento)
+        self.use_pipeline = False  # Sobrepor busca, extração e gravação em etapas concorrentes
+        self.pipeline_queue_size = 50  # Capacidade das filas entre as etapas do pipeline
+        self.pipeline_stats = {}  # Profundidade das filas do último processamento em pipeline
+        self.use_condstore = True  # Usar CONDSTORE/QRESYNC na sincronização incremental, se o servidor suportar
+        self._sync_extension = None  # Extensão (CONDSTORE/QRESYNC) habilitada na conexão atual
+        self._sync_extension_server = None
+        self.current_uidvalidity = None  # UIDVALIDITY da caixa selecionada na última busca
+        self.use_message_store = False  # Guardar localmente as mensagens buscadas para reextração sem rede
+        self.message_store_max_mb = 1024  # Tamanho máximo do armazenamento local (MB), com remoção LRU
+        self._message_store = None
+        self.use_extraction_cache = False  # Reaproveitar os valores já extraídos de cada mensagem (por hash)
+        self.extraction_cache_max_entries = 1000000  # Máximo de entradas (mensagem x campo) no cache de extração
+        self._extraction_cache = None
+        self.header_prefilter = False  # Buscar primeiro só os cabeçalhos e filtrar assunto/remetente localmente
+        self.header_batch_size = 1000  # Quantidade de cabeçalhos buscados por comando UID FETCH no pré-filtro
+        self.sender_filter = ""  # Trecho do remetente exigido na busca (FROM) e no pré-filtro (vazio = qualquer remetente)
+        self.search_since = ""  # Buscar apenas emails a partir desta data (dd/mm/aaaa, vazio = sem limite)
+        self.search_before = ""  # Buscar apenas emails anteriores a esta data (dd/mm/aaaa, exclusiva)
+        self.search_body_labels = False  # Exigir no corpo ao menos um dos rótulos dos campos (BODY), filtrado no servidor
+        self.use_esearch = True  # Pedir o resultado compacto do ESEARCH (MIN MAX COUNT ALL), se o servidor suportar
         
         # Campos personalizados para extração
         self.custom_fields = [
@@ -38,9 +102,26 @@ class EmailProcessor:
         self.additional_fields = []  # Campos adicionais para extração do Excel
         self.key_field = ""  # Campo chave para relacionar os dados
         self.reference_data = None  # DataFrame com dados de referência
+        self.reference_index = None  # Índice (dicionário) das linhas de referência pelo campo chave
+        self.reference_duplicates = 'first'  # Chave repetida no Excel de referência: vale a primeira ('first') ou a última ('last') linha
+        self.use_reference_snapshot = True  # Reaproveitar o snapshot binário das colunas usadas do Excel de referência
+        
+        self._extraction_plans = {}  # Planos de extração compilados, por conjunto de campos
+        self.extraction_stats = {'timeouts': 0}  # Buscas de padrões personalizados interrompidas pelo limite de tempo
+        self.max_content_chars = 200000  # Tamanho máximo do texto examinado em cada email
+        
+        self.excel_max_rows = 50000  # Linhas por parte da saída Excel antes de continuar em outro arquivo/planilha
+        self.excel_rollover = 'file'  # Ao atingir excel_max_rows: novo arquivo ('file') ou nova planilha ('sheet')
+        self.output_format = 'excel'  # Formato da saída: 'excel', 'csv', 'parquet' ou 'sqlite'
+        self.output_batch_size = 5000  # Registros por lote entregue à saída, por grupo de linhas (Parquet) e por transação (SQLite)
+        self.output_key_columns = []  # Colunas indexadas na saída SQLite (padrão: o campo chave)
         
         self.extracted_data = []
         self.config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.json')
+        self.sync_state_file = os.path.join(os.path.dirname(self.config_file), 'sync_state.json')
+        self.message_store_file = os.path.join(os.path.dirname(self.config_file), 'message_store.sqlite3')
+        self.extraction_cache_file = os.path.join(os.path.dirname(self.config_file), 'extraction_cache.sqlite3')
+        self.backfill_dir = os.path.join(os.path.dirname(self.config_file), 'backfill')
         
     def save_config(self, email_user, imap_host, search_subject, custom_fields=None):
         """Salva as configurações para uso futuro"""
@@ -53,12 +134,46 @@ class EmailProcessor:
             
             # Salvar os campos personalizados, se fornecidos
             if custom_fields:
+                errors = self.validate_custom_fields(custom_fields)
+                if errors:
+                    logger.error(f"Configurações não salvas, padrões inválidos: {'; '.join(errors)}")
+                    return False
                 config['custom_fields'] = custom_fields
             
             # Salvar as configurações de campos adicionais
             config['additional_excel_file'] = self.additional_excel_file
             config['key_field'] = self.key_field
             config['additional_fields'] = self.additional_fields
+            config['reference_duplicates'] = self.reference_duplicates
+            config['use_reference_snapshot'] = self.use_reference_snapshot
+            config['excel_max_rows'] = self.excel_max_rows
+            config['excel_rollover'] = self.excel_rollover
+            config['output_format'] = self.output_format
+            config['output_batch_size'] = self.output_batch_size
+            config['output_key_columns'] = self.output_key_columns
+            
+            # Salvar as configurações de busca
+            config['fetch_batch_size'] = self.fetch_batch_size
+            config['fetch_pool_size'] = self.fetch_pool_size
+            config['session_timeout'] = self.session_timeout
+            config['fetch_mode'] = self.fetch_mode
+            config['incremental_sync'] = self.incremental_sync
+            config['idle_timeout'] = self.idle_timeout
+            config['use_condstore'] = self.use_condstore
+            config['use_pipeline'] = self.use_pipeline
+            config['pipeline_queue_size'] = self.pipeline_queue_size
+            config['use_message_store'] = self.use_message_store
+            config['message_store_max_mb'] = self.message_store_max_mb
+            config['use_extraction_cache'] = self.use_extraction_cache
+            config['max_content_chars'] = self.max_content_chars
+            config['extraction_cache_max_entries'] = self.extraction_cache_max_entries
+            config['header_prefilter'] = self.header_prefilter
+            config['header_batch_size'] = self.header_batch_size
+            config['sender_filter'] = self.sender_filter
+            config['search_since'] = self.search_since
+            config['search_before'] = self.search_before
+            config['search_body_labels'] = self.search_body_labels
+            config['use_esearch'] = self.use_esearch
             
             with open(self.config_file, 'w') as f:
                 json.dump(config, f)
@@ -83,6 +198,62 @@ class EmailProcessor:
                     self.key_field = config['key_field']
                 if 'additional_fields' in config:
                     self.additional_fields = config['additional_fields']
+                if 'reference_duplicates' in config:
+                    self.reference_duplicates = config['reference_duplicates']
+                if 'use_reference_snapshot' in config:
+                    self.use_reference_snapshot = bool(config['use_reference_snapshot'])
+                if 'excel_max_rows' in config:
+                    self.excel_max_rows = int(config['excel_max_rows'])
+                if 'excel_rollover' in config:
+                    self.excel_rollover = config['excel_rollover']
+                if 'output_format' in config:
+                    self.output_format = config['output_format']
+                if 'output_batch_size' in config:
+                    self.output_batch_size = int(config['output_batch_size'])
+                if 'output_key_columns' in config:
+                    self.output_key_columns = list(config['output_key_columns'])
+                if 'fetch_batch_size' in config:
+                    self.fetch_batch_size = int(config['fetch_batch_size'])
+                if 'fetch_pool_size' in config:
+                    self.fetch_pool_size = int(config['fetch_pool_size'])
+                if 'session_timeout' in config:
+                    self.session_timeout = int(config['session_timeout'])
+                if 'fetch_mode' in config:
+                    self.fetch_mode = config['fetch_mode']
+                if 'incremental_sync' in config:
+                    self.incremental_sync = bool(config['incremental_sync'])
+                if 'idle_timeout' in config:
+                    self.idle_timeout = int(config['idle_timeout'])
+                if 'use_condstore' in config:
+                    self.use_condstore = bool(config['use_condstore'])
+                if 'use_pipeline' in config:
+                    self.use_pipeline = bool(config['use_pipeline'])
+                if 'pipeline_queue_size' in config:
+                    self.pipeline_queue_size = int(config['pipeline_queue_size'])
+                if 'use_message_store' in config:
+                    self.use_message_store = bool(config['use_message_store'])
+                if 'message_store_max_mb' in config:
+                    self.message_store_max_mb = int(config['message_store_max_mb'])
+                if 'max_content_chars' in config:
+                    self.max_content_chars = int(config['max_content_chars'])
+                if 'use_extraction_cache' in config:
+                    self.use_extraction_cache = bool(config['use_extraction_cache'])
+                if 'extraction_cache_max_entries' in config:
+                    self.extraction_cache_max_entries = int(config['extraction_cache_max_entries'])
+                if 'header_prefilter' in config:
+                    self.header_prefilter = bool(config['header_prefilter'])
+                if 'header_batch_size' in config:
+                    self.header_batch_size = int(config['header_batch_size'])
+                if 'sender_filter' in config:
+                    self.sender_filter = config['sender_filter']
+                if 'search_since' in config:
+                    self.search_since = config['search_since']
+                if 'search_before' in config:
+                    self.search_before = config['search_before']
+                if 'search_body_labels' in config:
+                    self.search_body_labels = bool(config['search_body_labels'])
+                if 'use_esearch' in config:
+                    self.use_esearch = bool(config['use_esearch'])
                 
                 logger.info("Configurações carregadas com sucesso")
                 return config
@@ -106,6 +277,8 @@ class EmailProcessor:
             self.email_pass = email_pass
             self.imap_host = imap_host
             self.imap_port = imap_port
+            self.use_ssl = use_ssl
+            self.timeout = timeout
             
             # Definindo timeout para a conexão
             imaplib.IMAP4.TIMEOUT = timeout
@@ -134,17 +307,17 @@ class EmailProcessor:
         except ConnectionRefusedError:
             error_msg = f"Conexão recusada pelo servidor {imap_host}:{imap_port}. Verifique se o endereço e porta estão corretos."
             logger.error(error_msg)
-            messagebox.showerror("Erro de Conexão", error_msg)
+            self._notify('showerror', "Erro de Conexão", error_msg)
             return False
         except TimeoutError:
             error_msg = f"Tempo limite excedido ao conectar a {imap_host}:{imap_port}. Verifique sua conexão e se o servidor está acessível.\n\nDica: Aumente o valor de timeout ou verifique se há firewalls bloqueando a conexão."
             logger.error(error_msg)
-            messagebox.showerror("Erro de Timeout", error_msg)
+            self._notify('showerror', "Erro de Timeout", error_msg)
             return False
         except socket.timeout:
             error_msg = f"Socket timeout ao conectar a {imap_host}:{imap_port}. Aumentar o timeout pode resolver este problema (WinError 10060)."
             logger.error(error_msg)
-            messagebox.showerror("Erro de Timeout", error_msg)
+            self._notify('showerror', "Erro de Timeout", error_msg)
             return False
         except imaplib.IMAP4.error as e:
             if 'LOGIN failed' in str(e):
@@ -152,15 +325,20 @@ class EmailProcessor:
             else:
                 error_msg = f"Erro de IMAP: {str(e)}"
             logger.error(error_msg)
-            messagebox.showerror("Erro IMAP", error_msg)
+            self._notify('showerror', "Erro IMAP", error_msg)
             return False
         except Exception as e:
             error_msg = f"Não foi possível conectar ao servidor: {str(e)}"
             logger.error(error_msg)
             logger.error(traceback.format_exc())
-            messagebox.showerror("Erro de Conexão", error_msg)
+            self._notify('showerror', "Erro de Conexão", error_msg)
             return False
 
+    def _notify(self, kind, title, message):
+        """Exibe uma caixa de diálogo (showinfo/showwarning/showerror) se os diálogos estiverem ativos"""
+        if self.show_dialogs:
+            getattr(messagebox, kind)(title, message)
+
     def _check_network_connectivity(self, host, port):
         """Verifica a conectividade de rede antes de tentar a conexão IMAP"""
         import socket
@@ -198,6 +376,18 @@ class EmailProcessor:
         text = re.sub(r'\s+', ' ', text.strip())
         return text
 
+    def fold_text(self, text):
+        """
+        Normaliza o texto para comparações sem distinção de acentos e maiúsculas
+        
+        Ex.: "Confirmação  de Transferência" -> "confirmacao de transferencia"
+        """
+        text = self.clean_text(text)
+        if not text.isascii():
+            # NFKD separa as letras dos acentos (marcas combinantes), que são descartados
+            text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+        return text.casefold()
+
     def decode_email_subject(self, subject):
         """Decodifica o assunto do email, tratando adequadamente caracteres do português"""
         if subject is None:
@@ -205,114 +395,105 @@ class EmailProcessor:
         decoded_parts = []
         for part, encoding in decode_header(subject):
             if isinstance(part, bytes):
-                if encoding:
-                    try:
-                        # Tenta usar a codificação especificada primeiro
-                        decoded_parts.append(part.decode(encoding))
-                    except (UnicodeDecodeError, LookupError):
-                        try:
-                            # Tenta UTF-8 que é comum para caracteres especiais do português
-                            decoded_parts.append(part.decode('utf-8'))
-                        except UnicodeDecodeError:
-                            # Fallback para latin-1 (ISO-8859-1) que é comum em emails em português
-                            try:
-                                decoded_parts.append(part.decode('latin-1'))
-                            except:
-                                # Último recurso: substituição de caracteres não reconhecidos
-                                decoded_parts.append(part.decode('utf-8', errors='replace'))
-                else:
-                    try:
-                        # Tenta UTF-8 primeiro
-                        decoded_parts.append(part.decode('utf-8'))
-                    except UnicodeDecodeError:
-                        try:
-                            # Tenta latin-1 que é comum para português
-                            decoded_parts.append(part.decode('latin-1'))
-                        except:
-                            # Último recurso com substituição de caracteres
-                            decoded_parts.append(part.decode('utf-8', errors='replace'))
+                # Codificação declarada, UTF-8 e latin-1 (comum em português); o assunto é curto
+                # demais para um palpite confiável do chardet
+                decoded_parts.append(decode_bytes(part, encoding, detect=False))
             else:
                 decoded_parts.append(part)
         return ''.join(decoded_parts)
 
     def get_email_content(self, msg):
-        """Extrai o conteúdo do email (texto), tratando adequadamente caracteres do português"""
-        content = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                # Pular anexos
-                if "attachment" in content_disposition:
-                    continue
-                
-                # Obter conteúdo de texto
-                if content_type == "text/plain" or content_type == "text/html":
-                    try:
-                        # Tentar obter a codificação especificada no email
-                        charset = part.get_content_charset()
-                        if charset:
-                            body = part.get_payload(decode=True).decode(charset)
-                        else:
-                            # Se não especificado, tentar UTF-8
-                            body = part.get_payload(decode=True).decode('utf-8')
-                        content += body
-                    except UnicodeDecodeError:
-                        try:
-                            # UTF-8 falhou, tentar latin-1 (comum para português)
-                            body = part.get_payload(decode=True).decode('latin-1')
-                            content += body
-                        except:
-                            # Último recurso: substituição de caracteres
-                            body = part.get_payload(decode=True).decode('utf-8', errors='replace')
-                            content += body
-        else:
-            # Mensagens não multipart
-            content_type = msg.get_content_type()
-            if content_type == "text/plain" or content_type == "text/html":
-                try:
-                    # Tentar obter a codificação especificada no email
-                    charset = msg.get_content_charset()
-                    if charset:
-                        content = msg.get_payload(decode=True).decode(charset)
-                    else:
-                        # Se não especificado, tentar UTF-8
-                        content = msg.get_payload(decode=True).decode('utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        # UTF-8 falhou, tentar latin-1 (comum para português)
-                        content = msg.get_payload(decode=True).decode('latin-1')
-                    except:
-                        # Último recurso: substituição de caracteres
-                        content = msg.get_payload(decode=True).decode('utf-8', errors='replace')
+        """
+        Extrai o conteúdo do email (texto), tratando adequadamente caracteres do português
+        
+        Usa apenas as partes text/plain quando existirem; o HTML só é convertido em texto
+        (sem as tags) quando a mensagem não tem texto simples. Assim, em mensagens
+        multipart/alternative a mesma informação não é examinada duas vezes. O texto
+        é limitado a 'max_content_chars' caracteres.
+        """
+        plain_parts = []
+        html_parts = []
+        for part in (msg.walk() if msg.is_multipart() else [msg]):
+            content_type = part.get_content_type()
+            
+            # Obter conteúdo de texto
+            if content_type != "text/plain" and content_type != "text/html":
+                continue
+            
+            # Pular anexos
+            if msg.is_multipart() and "attachment" in str(part.get("Content-Disposition")):
+                continue
+            
+            body = self._decode_text_part(part)
+            if content_type == "text/plain":
+                plain_parts.append(body)
+            else:
+                html_parts.append(body)
+        
+        content = "".join(plain_parts)
+        if not content.strip() and html_parts:
+            # Sem texto simples (ou apenas um texto vazio): converter o HTML
+            content = html_to_text("".join(html_parts), self.max_content_chars)
+        
+        return content[:self.max_content_chars]
+
+    def _decode_text_part(self, part):
+        """Decodifica o conteúdo de uma parte de texto (a codificação de transferência é desfeita uma única vez)"""
+        payload = part.get_payload(decode=True)
+        return decode_bytes(payload, part.get_content_charset())
+
+    def validate_custom_fields(self, custom_fields):
+        """
+        Valida os padrões dos campos personalizados
+        
+        Returns:
+            Lista de mensagens de erro (vazia se todos os padrões forem válidos)
+        """
+        errors = []
+        for field in custom_fields:
+            pattern = field.get("pattern")
+            if pattern:
+                error = validate_pattern(pattern)
+                if error:
+                    errors.append(f"Campo '{field['name']}': {error}")
+        return errors
+
+    def get_extraction_plan(self, fields=None):
+        """Retorna o plano de extração compilado dos campos (padrão: todos), reconstruindo-o apenas quando mudam"""
+        fields = self.custom_fields if fields is None else fields
+        key = tuple((field["name"], field.get("pattern")) for field in fields)
+        plan = self._extraction_plans.get(key)
+        if plan is None:
+            if len(self._extraction_plans) >= 32:
+                self._extraction_plans.clear()
+            plan = self._extraction_plans[key] = ExtractionPlan([name for name, _ in key],
+                                                                {name: pattern for name, pattern in key if pattern})
+        return plan
+
+    def extract_fields(self, text, normalize=True):
+        """
+        Extrai os campos personalizados do texto do email baseado no formato especificado
         
-        return content
+        Com normalize=False os valores ficam como texto bruto, para serem convertidos
+        depois, coluna a coluna, por normalize_extracted_data (processamento em lote).
+        """
+        # Localizar todos os campos em uma única passada pelo texto
+        # (padrão próprio do campo, depois "Campo: valor" e, se não houver, o formato flexível "Campo valor")
+        raw_values = self.get_extraction_plan().search(text, self.extraction_stats)
+        return self.build_fields(raw_values, normalize)
 
-    def extract_fields(self, text):
-        """Extrai os campos personalizados do texto do email baseado no formato especificado"""
+    def build_fields(self, raw_values, normalize=True):
+        """Monta o registro dos campos personalizados a partir dos valores brutos {nome: valor ou None}"""
         extracted_fields = {}
         
-        # Aplicar cada padrão de extração personalizado
         for field in self.custom_fields:
             field_name = field["name"]
             field_format = field.get("format", "texto")  # Formato padrão é texto
+            raw_value = raw_values.get(field_name)
             
-            # Criar um padrão que capture especificamente o texto entre ": " e a quebra de linha
-            # Primeiro tentamos encontrar o campo exato com dois-pontos
-            pattern = r'{}:\s*([^\r\n]+)'.format(re.escape(field_name))
-            match = re.search(pattern, text)
-            
-            # Se não encontrar com o formato exato, tenta um formato mais flexível
-            if not match:
-                pattern = r'{}\s*:?\s*([^\r\n]+)'.format(re.escape(field_name))
-                match = re.search(pattern, text)
-            
-            if match:
-                raw_value = match.group(1).strip()
+            if raw_value is not None:
                 # Processar o valor conforme o formato especificado
-                processed_value = self.process_value(raw_value, field_format)
-                extracted_fields[field_name] = processed_value
+                extracted_fields[field_name] = self.process_value(raw_value, field_format) if normalize else raw_value
             else:
                 # Se não encontrar, definir como vazio
                 extracted_fields[field_name] = ""
@@ -358,250 +539,1528 @@ class EmailProcessor:
             return value
 
     def search_emails(self, search_subject):
-        """Busca emails não lidos com o assunto específico, suportando caracteres do português"""
+        """
+        Busca os UIDs dos emails com o assunto específico, suportando caracteres do português
+        
+        Por padrão busca apenas emails não lidos. Com a sincronização incremental ativa,
+        busca os emails com UID acima da última marca processada, independentemente
+        de já terem sido lidos.
+        
+        Os demais critérios configurados (período, remetente e rótulos no corpo) são
+        acrescentados à busca por search_uids.
+        
+        Com o pré-filtro de cabeçalhos ativo, o servidor não filtra pelo assunto: os
+        cabeçalhos dos candidatos são buscados e o assunto (e o remetente, se
+        configurado) é comparado localmente, sem distinção de acentos.
+        """
         try:
-            self.imap_server.select('INBOX')
+            if self.incremental_sync:
+                criteria = self._incremental_criteria(search_subject)
+            else:
+                self.imap_server.select(self.mailbox)
+                self.current_uidvalidity = self._selected_uidvalidity()
+                criteria = 'UNSEEN'
             
-            # Codificação para lidar com caracteres especiais no assunto da busca
-            # Para IMAP, usamos a codificação UTF-8 em strings literais
-            try:
-                # Usar caracteres literais para garantir que caracteres especiais sejam tratados corretamente
-                # Isso é necessário para suportar acentos e outros caracteres especiais do português na pesquisa
-                self.imap_server.literal = search_subject.encode('utf-8')
-                status, messages = self.imap_server.search(None, 'UNSEEN SUBJECT')
-            except (AttributeError, UnicodeEncodeError):
-                # Fallback para o método tradicional se o anterior falhar
-                # Isso pode não funcionar perfeitamente com caracteres especiais
-                logger.warning("Usando método de busca alternativo para sujeito com caracteres especiais")
-                status, messages = self.imap_server.search(None, '(UNSEEN SUBJECT "{}")'.format(search_subject))
+            if criteria is None:
+                # HIGHESTMODSEQ inalterado: nenhuma mensagem nova ou alterada, não é preciso buscar
+                status, email_ids = 'OK', []
+            else:
+                # Com o pré-filtro, o assunto é comparado localmente após a busca dos cabeçalhos
+                status, email_ids = self.search_uids(criteria, None if self.header_prefilter else search_subject,
+                                                     body_labels=self.search_body_labels)
             
             if status != 'OK':
-                messagebox.showwarning("Aviso", "Não foi possível buscar emails.")
+                self._notify('showwarning', "Aviso", "Não foi possível buscar emails.")
                 return []
             
-            email_ids = messages[0].split()
+            if self.incremental_sync:
+                # "UID n:*" sempre inclui a última mensagem, mesmo que já processada
+                last_uid = self._pending_sync['last_uid']
+                email_ids = [email_id for email_id in email_ids if int(email_id) > last_uid]
+            
+            if self.header_prefilter and email_ids:
+                email_ids = self.prefilter_by_headers(email_ids, search_subject)
+            
+            if self.incremental_sync and not email_ids:
+                # Todos os candidatos foram avaliados: avançar a marca mesmo sem emails a processar
+                self.commit_sync_state([], [])
             
             if not email_ids:
-                messagebox.showinfo("Informação", "Nenhum email não lido encontrado com o assunto especificado.")
+                self._notify('showinfo', "Informação", "Nenhum email não lido encontrado com o assunto especificado.")
                 return []
                 
             return email_ids
         except Exception as e:
             logger.error(f"Erro ao buscar emails: {str(e)}", exc_info=True)
-            messagebox.showerror("Erro", f"Erro ao buscar emails: {str(e)}")
+            self._notify('showerror', "Erro", f"Erro ao buscar emails: {str(e)}")
             return []
 
-    def process_emails(self, email_ids):
-        """Processa cada email encontrado"""
+    def search_uids(self, criteria, search_subject=None, body_labels=False, imap_server=None):
+        """
+        Executa um UID SEARCH com os critérios configurados, filtrados no próprio servidor
+        
+        Acrescenta a 'criteria' o período (SINCE/BEFORE), o remetente (FROM), os
+        rótulos dos campos no corpo (BODY, em alternância com OR) se 'body_labels'
+        estiver ativo e, por último, o assunto. Apenas um literal pode ser enviado
+        por comando, reservado ao assunto (com CHARSET UTF-8); os demais termos vão
+        entre aspas e, se tiverem acentos, são reduzidos ao maior trecho ASCII.
+        
+        Se o servidor anunciar ESEARCH, o resultado vem compactado em intervalos
+        (RETURN (MIN MAX COUNT ALL)) em vez de um UID por mensagem.
+        
+        Returns:
+            Tupla (status, lista de UIDs inteiros em ordem crescente)
+        """
+        imap_server = imap_server or self.imap_server
+        terms = [criteria]
+        if self.search_since:
+            terms.append(f"SINCE {imap_date(self.search_since)}")
+        if self.search_before:
+            terms.append(f"BEFORE {imap_date(self.search_before)}")
+        if self.sender_filter:
+            sender = imap_quote(self.sender_filter)
+            if sender:
+                terms.append(f"FROM {sender}")
+            else:
+                logger.warning("Remetente com caracteres fora do ASCII: filtro FROM não enviado ao servidor")
+        if body_labels:
+            body_terms = self._body_search_terms()
+            if body_terms:
+                terms.append(or_criteria([f"BODY {imap_quote(term)}" for term in body_terms]))
+        criteria = ' '.join(terms)
+        
+        use_esearch = self.use_esearch and 'ESEARCH' in imap_server.capabilities
+        prefix = 'RETURN (MIN MAX COUNT ALL) ' if use_esearch else ''
+        # Descartar respostas ESEARCH antigas que ainda não foram lidas
+        imap_server.untagged_responses.pop('ESEARCH', None)
+        
+        if not search_subject:
+            status, messages = imap_server.uid('SEARCH', f'{prefix}{criteria}')
+        else:
+            # Codificação para lidar com caracteres especiais no assunto da busca
+            # Para IMAP, usamos a codificação UTF-8 em strings literais
+            try:
+                # Usar caracteres literais para garantir que caracteres especiais sejam tratados corretamente
+                # Isso é necessário para suportar acentos e outros caracteres especiais do português na pesquisa
+                imap_server.literal = search_subject.encode('utf-8')
+                status, messages = imap_server.uid('SEARCH', f'{prefix}CHARSET UTF-8 {criteria} SUBJECT')
+            except (AttributeError, UnicodeEncodeError):
+                # Fallback para o método tradicional se o anterior falhar
+                # Isso pode não funcionar perfeitamente com caracteres especiais
+                logger.warning("Usando método de busca alternativo para sujeito com caracteres especiais")
+                status, messages = imap_server.uid('SEARCH', '{}({} SUBJECT "{}")'.format(prefix, criteria, search_subject))
+        
+        if status != 'OK':
+            return status, []
+        
+        if use_esearch:
+            _, data = imap_server.response('ESEARCH')
+            result = parse_esearch_response(data)
+            logger.info(f"Busca: {result['count']} emails (UID mín. {result['min']}, máx. {result['max']})")
+            return status, sorted(set(result['uids']))
+        
+        return status, parse_search_response(messages)
+
+    def _search_filters(self):
+        """Filtros de busca configurados além do assunto (apenas os ativos), guardados no estado de sincronização"""
+        filters = {
+            'since': self.search_since,
+            'before': self.search_before,
+            'sender': self.sender_filter,
+            'body_labels': self._body_search_terms() if self.search_body_labels else [],
+        }
+        return {name: value for name, value in filters.items() if value}
+
+    def _body_search_terms(self):
+        """
+        Termos da busca BODY a partir dos rótulos dos campos personalizados
+        
+        Rótulos com acentos não podem ir entre aspas, então é usada a maior sequência
+        de palavras só com caracteres ASCII (ex.: "Número processo CNJ" -> "processo CNJ"),
+        que também aparece em toda mensagem com o rótulo completo. Se algum rótulo não
+        tiver um trecho útil, a busca por corpo é dispensada, para não perder emails.
+        O mesmo vale para campos com padrão próprio, que podem casar sem o rótulo.
+        """
+        terms = []
+        for field in self.custom_fields:
+            pattern = field.get("pattern")
+            if pattern and pattern != label_pattern(field["name"]):
+                logger.info(f"Campo '{field['name']}' com padrão próprio, busca por corpo dispensada")
+                return []
+            runs = re.split(r'\s*\S*[^\x00-\x7f]\S*\s*', field["name"])
+            term = max((run.strip() for run in runs), key=len, default='')
+            if len(term) < 3:
+                logger.info(f"Rótulo '{field['name']}' sem trecho ASCII para a busca BODY, busca por corpo dispensada")
+                return []
+            terms.append(term)
+        return list(dict.fromkeys(terms))
+
+    def prefilter_by_headers(self, email_ids, search_subject, imap_server=None):
+        """
+        Filtra os UIDs candidatos pelo assunto e remetente, buscando apenas alguns cabeçalhos
+        
+        Cada lote de até 'header_batch_size' UIDs é buscado com um único
+        UID FETCH de BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE MESSAGE-ID)], que
+        não marca as mensagens como lidas. O corpo só é baixado depois, para os
+        UIDs aprovados.
+        
+        Returns:
+            Lista dos UIDs (inteiros, em ordem crescente) cujo assunto contém 'search_subject'
+            e cujo remetente contém 'sender_filter', sem distinção de acentos e maiúsculas
+        """
+        imap_server = imap_server or self.imap_server
+        subject_filter = self.fold_text(search_subject)
+        sender_filter = self.fold_text(self.sender_filter)
+        uids = to_uid_list(email_ids)
+        accepted = []
+        
+        for batch in chunked(uids, self.header_batch_size):
+            uid_set = compress_uid_ranges(batch)
+            try:
+                status, data = imap_server.uid('FETCH', uid_set, f'(UID BODY.PEEK[{HEADER_FIELDS}])')
+            except Exception as e:
+                logger.error(f"Erro ao buscar cabeçalhos dos emails {uid_set}: {str(e)}", exc_info=True)
+                status = None
+            if status != 'OK':
+                # Sem os cabeçalhos não é possível filtrar: manter os candidatos do lote
+                logger.warning(f"Falha ao buscar cabeçalhos dos emails {uid_set}, mantidos sem pré-filtro")
+                accepted.extend(batch)
+                continue
+            
+            for message in parse_fetch_response(data):
+                header = next(iter(message['items'].values()), None)
+                if header is None:
+                    continue
+                msg = email.message_from_bytes(bytes(header))
+                if subject_filter and subject_filter not in self.fold_text(self.decode_email_subject(msg['Subject'])):
+                    continue
+                if sender_filter and sender_filter not in self.fold_text(self.decode_email_subject(msg['From'])):
+                    continue
+                accepted.append(message['uid'])
+        
+        accepted = sorted(set(accepted))
+        logger.info(f"Pré-filtro de cabeçalhos: {len(accepted)} de {len(uids)} emails aprovados")
+        return accepted
+
+    def _sync_state_key(self):
+        """Chave do estado de sincronização: conta, servidor e caixa de correio"""
+        return f"{self.email_user}@{self.imap_host}/{self.mailbox}"
+
+    def load_sync_state(self):
+        """Carrega o estado de sincronização incremental salvo ao lado do config.json"""
+        try:
+            if os.path.exists(self.sync_state_file):
+                with open(self.sync_state_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao carregar estado de sincronização: {str(e)}")
+        return {}
+
+    def save_sync_state(self, state):
+        """Salva o estado de sincronização incremental"""
+        try:
+            with open(self.sync_state_file, 'w') as f:
+                json.dump(state, f)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao salvar estado de sincronização: {str(e)}")
+            return False
+
+    def _incremental_criteria(self, search_subject):
+        """
+        Seleciona a caixa de correio e monta o critério de busca incremental
+        
+        Usa "UID <última+1>:*" quando o UIDVALIDITY e o assunto são os mesmos da última
+        execução. Se o UIDVALIDITY mudou (UIDs antigos deixaram de valer), faz uma
+        varredura completa.
+        
+        Quando o servidor oferece CONDSTORE/QRESYNC, também compara o HIGHESTMODSEQ
+        salvo: se não mudou, nenhuma mensagem foi criada ou alterada e a busca é
+        dispensada (retorna None). Caso contrário, pede apenas mensagens com MODSEQ
+        acima do salvo. Sem essas extensões, segue apenas pela marca de UID.
+        """
+        state = self.load_sync_state().get(self._sync_state_key(), {})
+        extension = self._enable_sync_extension() if self.use_condstore else None
+        
+        if extension == 'QRESYNC' and state.get('uidvalidity') and state.get('highestmodseq'):
+            # QRESYNC: o servidor já informa as mudanças desde o HIGHESTMODSEQ salvo no próprio SELECT
+            self._select_with_params(f"(QRESYNC ({state['uidvalidity']} {state['highestmodseq']}))")
+        elif extension == 'CONDSTORE':
+            self._select_with_params('(CONDSTORE)')
+        else:
+            self.imap_server.select(self.mailbox)
+        
+        uidvalidity = self.current_uidvalidity = self._selected_uidvalidity()
+        _, data = self.imap_server.response('UIDNEXT')
+        uidnext = int(data[0]) if data and data[0] else 0
+        
+        highestmodseq = None
+        if extension:
+            _, data = self.imap_server.response('HIGHESTMODSEQ')
+            if data and data[0]:
+                highestmodseq = int(data[0])
+            else:
+                # Caixa sem suporte a MODSEQ (NOMODSEQ): seguir apenas pela marca de UID
+                logger.info(f"Caixa {self.mailbox} não informa HIGHESTMODSEQ, usando apenas a marca de UID")
+            # Descartar respostas VANISHED/FETCH do resync, que não são usadas
+            self.imap_server.untagged_responses.pop('VANISHED', None)
+            self.imap_server.untagged_responses.pop('FETCH', None)
+        
+        last_uid = 0
+        if state.get('uidvalidity') != uidvalidity:
+            if state:
+                logger.warning(f"UIDVALIDITY mudou ({state.get('uidvalidity')} -> {uidvalidity}), refazendo varredura completa")
+        elif state.get('search_subject') != search_subject:
+            logger.info("Assunto de busca alterado, refazendo varredura completa")
+        elif state.get('search_filters', {}) != self._search_filters():
+            logger.info("Filtros de busca alterados, refazendo varredura completa")
+        else:
+            last_uid = int(state.get('last_uid', 0))
+        
+        self._pending_sync = {
+            'uidvalidity': uidvalidity,
+            'uidnext': uidnext,
+            'last_uid': last_uid,
+            'search_subject': search_subject,
+            'search_filters': self._search_filters(),
+            'highestmodseq': highestmodseq,
+            'previous_modseq': state.get('highestmodseq') if last_uid else None,
+        }
+        
+        if not last_uid:
+            return 'ALL'
+        
+        previous_modseq = self._pending_sync['previous_modseq']
+        if highestmodseq and previous_modseq:
+            if highestmodseq <= previous_modseq:
+                logger.info(f"HIGHESTMODSEQ inalterado ({highestmodseq}), nenhuma mensagem nova")
+                return None
+            logger.info(f"Sincronização incremental a partir do UID {last_uid + 1} e MODSEQ {previous_modseq + 1}")
+            return f'UID {last_uid + 1}:* MODSEQ {previous_modseq + 1}'
+        
+        logger.info(f"Sincronização incremental a partir do UID {last_uid + 1}")
+        return f'UID {last_uid + 1}:*'
+
+    def _selected_uidvalidity(self, imap_server=None):
+        """Retorna o UIDVALIDITY informado pelo servidor no último SELECT (0 se ausente)"""
+        imap_server = imap_server or self.imap_server
+        _, data = imap_server.response('UIDVALIDITY')
+        return int(data[0]) if data and data[0] else 0
+
+    def _enable_sync_extension(self):
+        """
+        Habilita QRESYNC ou CONDSTORE na conexão atual, conforme anunciado pelo servidor
+        
+        Returns:
+            'QRESYNC', 'CONDSTORE' ou None quando o servidor não oferece nenhuma das duas
+        """
+        if self._sync_extension_server is self.imap_server:
+            return self._sync_extension
+        
+        capabilities = self.imap_server.capabilities
+        extension = None
+        try:
+            if 'QRESYNC' in capabilities and 'ENABLE' in capabilities:
+                self.imap_server.enable('QRESYNC')
+                extension = 'QRESYNC'
+            elif 'CONDSTORE' in capabilities:
+                # CONDSTORE pode ser ativado pelo próprio SELECT, mesmo sem ENABLE
+                extension = 'CONDSTORE'
+        except imaplib.IMAP4.error as e:
+            logger.warning(f"Não foi possível habilitar QRESYNC: {str(e)}")
+            extension = 'CONDSTORE' if 'CONDSTORE' in capabilities else None
+        
+        if extension:
+            logger.info(f"Usando a extensão {extension} para sincronização incremental")
+        else:
+            logger.info("Servidor sem CONDSTORE/QRESYNC, usando sincronização apenas por UID")
+        
+        self._sync_extension = extension
+        self._sync_extension_server = self.imap_server
+        return extension
+
+    def _select_with_params(self, params):
+        """
+        Seleciona a caixa de correio com parâmetros de SELECT (CONDSTORE/QRESYNC)
+        
+        O select() do imaplib não aceita parâmetros, então o comando é enviado
+        diretamente e o estado da conexão é atualizado da mesma forma.
+        """
+        server = self.imap_server
+        server.untagged_responses = {}
+        server.is_readonly = False
+        typ, data = server._simple_command('SELECT', self.mailbox, params)
+        if typ != 'OK':
+            server.state = 'AUTH'
+            logger.warning(f"SELECT com {params} recusado, usando SELECT simples")
+            return server.select(self.mailbox)
+        server.state = 'SELECTED'
+        return typ, server.untagged_responses.get('EXISTS', [None])
+
+    def commit_sync_state(self, requested_ids=None, received_ids=None):
+        """
+        Avança a marca de sincronização após o processamento
+        
+        A marca só avança até antes do primeiro UID pedido que não foi recebido (ou
+        cuja extração falhou), para que ele seja buscado novamente na próxima execução.
+        
+        Sem argumentos, usa os UIDs do último process_emails. Deve ser chamado apenas
+        depois que a saída foi gravada (save_to_excel ou fechamento do destino), para
+        que uma falha na gravação não faça os emails serem pulados na próxima execução.
+        """
+        if not self._pending_sync:
+            return False
+        
+        pending = self._pending_sync
+        if requested_ids is None:
+            requested_ids = pending.get('requested_ids', [])
+            received_ids = pending.get('processed_ids', [])
+        received = set(received_ids)
+        missing = [uid for uid in to_uid_list(requested_ids) if uid not in received]
+        
+        if missing:
+            last_uid = missing[0] - 1
+            # Manter o HIGHESTMODSEQ anterior para que a próxima execução volte a buscar
+            highestmodseq = pending['previous_modseq']
+        else:
+            highestmodseq = pending.get('highestmodseq')
+            # Todos os UIDs abaixo de UIDNEXT foram avaliados pela busca
+            last_uid = max([pending['uidnext'] - 1] + list(received))
+        last_uid = max(last_uid, pending['last_uid'])
+        
+        state = self.load_sync_state()
+        state[self._sync_state_key()] = {
+            'uidvalidity': pending['uidvalidity'],
+            'last_uid': last_uid,
+            'search_subject': pending['search_subject'],
+        }
+        if pending['search_filters']:
+            state[self._sync_state_key()]['search_filters'] = pending['search_filters']
+        if highestmodseq:
+            state[self._sync_state_key()]['highestmodseq'] = highestmodseq
+        self._pending_sync = None
+        logger.info(f"Marca de sincronização atualizada para o UID {last_uid}")
+        return self.save_sync_state(state)
+
+    def process_emails(self, email_ids, sink=None):
+        """
+        Processa cada email encontrado
+        
+        Por padrão os registros ficam em self.extracted_data, prontos para save_to_excel.
+        Com um destino ('sink', ver create_output_sink), os registros são entregues em
+        lotes de 'output_batch_size', cada lote convertido coluna a coluna (ver
+        normalize_records) antes de ir para o destino, em vez de acumular todos os
+        registros; fechar o destino fica a cargo de quem o criou.
+        
+        Com a sincronização incremental, a marca não é gravada aqui: quem chama deve
+        chamar commit_sync_state() depois de salvar a saída.
+        """
         total_emails = len(email_ids)
         processed = 0
+        written = 0
         
         # Limpar dados extraídos anteriormente
         self.extracted_data = []
         
         # Carregar dados de referência do Excel se campos adicionais estiverem configurados
-        reference_data_loaded = False
-        if self.additional_excel_file and self.key_field and self.additional_fields:
-            reference_data_loaded = self.load_reference_data()
-            if reference_data_loaded:
-                logger.info(f"Dados de referência carregados do arquivo: {self.additional_excel_file}")
-            else:
-                logger.warning(f"Não foi possível carregar dados de referência: {self.additional_excel_file}")
+        reference_data_loaded = self._load_reference_if_configured()
         
         logger.info(f"Iniciando processamento de {total_emails} emails")
         
-        for email_id in email_ids:
-            try:
-                logger.debug(f"Buscando email com ID: {email_id}")
-                status, data = self.imap_server.fetch(email_id, '(RFC822)')
-                
-                if status != 'OK':
-                    logger.warning(f"Falha ao buscar email com ID {email_id}, status: {status}")
-                    continue
-                    
-                logger.debug(f"Email com ID {email_id} recuperado com sucesso")
-                raw_email = data[0][1]
-                msg = email.message_from_bytes(raw_email)
-                
-                # Extrair informações do email
-                subject = self.decode_email_subject(msg['Subject'])
-                sender = msg['From']
-                date = msg['Date']
-                
-                logger.info(f"Processando email: '{subject}' de {sender}")
-                
-                # Obter conteúdo do email
-                content = self.get_email_content(msg)
-                
-                # Extrair campos personalizados
-                extracted_fields = self.extract_fields(content)
-                
-                if extracted_fields:
-                    # Se temos dados de referência carregados, buscar campos adicionais
-                    if reference_data_loaded and self.key_field in self.custom_fields:
-                        # Buscar o valor do campo chave entre os campos extraídos
-                        key_field_name = self.key_field
-                        key_value = None
-                        
-                        # Encontrar o campo chave entre os extraídos
-                        for field in self.custom_fields:
-                            if field["name"] == key_field_name and field["name"] in extracted_fields:
-                                key_value = extracted_fields[field["name"]]
-                                break
+        # Usar o pool de sessões quando configurado para mais de uma conexão
+        fetcher = self.fetch_emails_parallel if self.fetch_pool_size > 1 else self.fetch_emails
+        if self.use_message_store:
+            fetched_emails = self._fetch_through_store(email_ids, fetcher)
+        else:
+            fetched_emails = fetcher(email_ids)
+        
+        received_ids = []
+        failed_ids = []
+        pending = []  # Lote de registros brutos ainda não entregues ao destino
+        
+        def flush_to_sink():
+            self.normalize_records(pending, reference_data_loaded, sink.count)
+            sink.write(pending)
+            pending.clear()
+        
+        def record_sink(extracted_fields):
+            if sink is None:
+                self.extracted_data.append(extracted_fields)
+                return
+            pending.append(extracted_fields)
+            if len(pending) >= self.output_batch_size:
+                flush_to_sink()
+        
+        if self.use_pipeline:
+            processed = self._process_pipeline(fetched_emails, received_ids, total_emails, record_sink, failed_ids)
+        else:
+            for email_id, raw_email in fetched_emails:
+                received_ids.append(email_id)
+                try:
+                    extracted_fields = self.process_raw_email(raw_email, normalize=False)
+                    if extracted_fields:
+                        record_sink(extracted_fields)
                         
-                        if key_value:
-                            # Buscar dados adicionais usando o valor do campo chave
-                            additional_data = self.get_additional_fields_data(key_value)
-                            if additional_data:
-                                logger.info(f"Dados adicionais encontrados para a chave '{key_value}'")
-                                # Adicionar os campos adicionais aos dados extraídos
-                                extracted_fields.update(additional_data)
-                            else:
-                                logger.warning(f"Nenhum dado adicional encontrado para a chave '{key_value}'")
-                        else:
-                            logger.warning(f"Campo chave '{key_field_name}' não encontrado ou vazio nos dados extraídos")
+                    processed += 1
+                    logger.debug(f"Email processado: {processed}/{total_emails}")
                     
-                    # Adicionar metadados do email apenas se solicitado
-                    # (mantemos apenas os campos especificados pelo usuário)
-                    logger.info(f"Campos extraídos: {extracted_fields}")
-                    self.extracted_data.append(extracted_fields)
+                except Exception as e:
+                    failed_ids.append(email_id)
+                    logger.error(f"Erro ao processar email ID {email_id}: {str(e)}", exc_info=True)
+        
+        if sink is None:
+            self.normalize_extracted_data(reference_data_loaded)
+            written = len(self.extracted_data)
+        else:
+            if pending:
+                flush_to_sink()
+            written = sink.count
+        self._evict_extraction_cache()
+        
+        if self.incremental_sync and self._pending_sync:
+            # Emails com erro na extração contam como não recebidos e serão buscados novamente
+            failed = set(failed_ids)
+            self._pending_sync['requested_ids'] = list(email_ids)
+            self._pending_sync['processed_ids'] = [email_id for email_id in received_ids if email_id not in failed]
+        
+        if self.extraction_stats['timeouts']:
+            logger.warning(f"{self.extraction_stats['timeouts']} buscas de padrões personalizados interrompidas pelo limite de tempo")
+        logger.info(f"Processamento finalizado. {processed} emails processados, {written} registros extraídos.")
+        return processed
+
+    def process_raw_email(self, raw_email, reference_data_loaded=False, normalize=True):
+        """
+        Decodifica um email bruto, extrai os campos personalizados e busca os campos adicionais
+        
+        Args:
+            raw_email: Bytes da mensagem ou memoryview (ex.: fatia de um mbox mapeado em memória)
+            normalize: Converter os valores conforme o formato; em lote, usar False e
+                normalize_extracted_data ao final (os campos adicionais também ficam para depois)
+            
+        Returns:
+            Dicionário com os campos extraídos (vazio se nenhum campo estiver configurado)
+        """
+        # Valores já extraídos desta mensagem em execuções anteriores (cache de extração)
+        cache = self.get_extraction_cache() if self.use_extraction_cache else None
+        raw_values = {}
+        if cache is not None:
+            message_key = message_fingerprint(raw_email)
+            fingerprints = {field_fingerprint(field, self.max_content_chars): field["name"]
+                            for field in self.custom_fields}
+            cached = cache.get_many(message_key, fingerprints)
+            raw_values = {fingerprints[fingerprint]: value for fingerprint, value in cached.items()}
+        pending_fields = [field for field in self.custom_fields if field["name"] not in raw_values]
+        
+        subject = None
+        if pending_fields or cache is None:
+            if isinstance(raw_email, memoryview):
+                # Mesmo tratamento de message_from_bytes, sem copiar a fatia para um objeto bytes
+                msg = email.message_from_string(str(raw_email, 'ascii', 'surrogateescape'))
+            else:
+                msg = email.message_from_bytes(raw_email)
+            
+            # Extrair informações do email
+            subject = self.decode_email_subject(msg['Subject'])
+            sender = msg['From']
+            date = msg['Date']
+            
+            logger.info(f"Processando email: '{subject}' de {sender}")
+            
+            # Obter conteúdo do email
+            content = self.get_email_content(msg)
+            
+            # Extrair apenas os campos que não estão no cache
+            timed_out = set()
+            found_values = self.get_extraction_plan(pending_fields).search(content, self.extraction_stats, timed_out)
+            raw_values.update(found_values)
+            if cache is not None:
+                # Valores de padrões interrompidos pelo limite de tempo não são definitivos: não guardar
+                cache.put_many(message_key, {fingerprint: found_values[name] for fingerprint, name in fingerprints.items()
+                                             if name in found_values and name not in timed_out})
+        else:
+            logger.info(f"Campos obtidos do cache de extração para o email {message_key[:12]}")
+        
+        # Montar os campos personalizados
+        extracted_fields = self.build_fields(raw_values, normalize)
+        
+        if extracted_fields:
+            # Se temos dados de referência carregados, buscar campos adicionais
+            if reference_data_loaded:
+                self.apply_reference_data(extracted_fields)
+            
+            # Adicionar metadados do email apenas se solicitado
+            # (mantemos apenas os campos especificados pelo usuário)
+            logger.info(f"Campos extraídos: {extracted_fields}")
+        else:
+            logger.warning(f"Nenhum campo personalizado encontrado no email com assunto: {subject or '(cache)'}")
+            
+        return extracted_fields
+
+    def apply_reference_data(self, extracted_fields):
+        """Acrescenta aos campos extraídos os campos adicionais do Excel de referência, usando o campo chave"""
+        if any(field["name"] == self.key_field for field in self.custom_fields):
+            # Buscar o valor do campo chave entre os campos extraídos
+            key_field_name = self.key_field
+            key_value = None
+        
+            # Encontrar o campo chave entre os extraídos
+            for field in self.custom_fields:
+                if field["name"] == key_field_name and field["name"] in extracted_fields:
+                    key_value = extracted_fields[field["name"]]
+                    break
+        
+            if key_value:
+                # Buscar dados adicionais usando o valor do campo chave
+                additional_data = self.get_additional_fields_data(key_value)
+                if additional_data:
+                    logger.info(f"Dados adicionais encontrados para a chave '{key_value}'")
+                    # Adicionar os campos adicionais aos dados extraídos
+                    extracted_fields.update(additional_data)
                 else:
-                    logger.warning(f"Nenhum campo personalizado encontrado no email com assunto: {subject}")
-                    
+                    logger.warning(f"Nenhum dado adicional encontrado para a chave '{key_value}'")
+            else:
+                logger.warning(f"Campo chave '{key_field_name}' não encontrado ou vazio nos dados extraídos")
+
+    def normalize_extracted_data(self, reference_data_loaded=False, start=0):
+        """
+        Converte coluna a coluna os valores brutos de self.extracted_data[start:]
+        
+        Os campos "número" e "data" de todos os registros são convertidos de uma vez
+        (ver src.normalization); valores que não puderem ser convertidos são mantidos
+        como texto e informados no log com o número do registro. Em seguida, os
+        campos adicionais do Excel de referência são acrescentados, já com a chave
+        convertida.
+        """
+        return self.normalize_records(self.extracted_data[start:], reference_data_loaded, start)
+
+    def normalize_records(self, records, reference_data_loaded=False, offset=0):
+        """
+        Converte coluna a coluna os valores brutos de um lote de registros (no próprio lote)
+        
+        'offset' é a posição do primeiro registro do lote, usada apenas no log.
+        """
+        failures = normalize_records(records, self.custom_fields)
+        for index, field_name, value in failures:
+            logger.warning(f"Registro {offset + index + 1}: valor '{value}' do campo '{field_name}' não pôde ser convertido")
+        
+        if reference_data_loaded:
+            for extracted_fields in records:
+                self.apply_reference_data(extracted_fields)
+        return failures
+
+    def _load_reference_if_configured(self):
+        """Carrega os dados de referência do Excel se os campos adicionais estiverem configurados"""
+        if not (self.additional_excel_file and self.key_field and self.additional_fields):
+            return False
+        
+        reference_data_loaded = self.load_reference_data()
+        if reference_data_loaded:
+            logger.info(f"Dados de referência carregados do arquivo: {self.additional_excel_file}")
+        else:
+            logger.warning(f"Não foi possível carregar dados de referência: {self.additional_excel_file}")
+        return reference_data_loaded
+
+    def process_directory(self, directory, workers=None, on_progress=None):
+        """
+        Processa offline um diretório com arquivos .eml e/ou pastas Maildir
+        
+        A decodificação e a extração dos campos são distribuídas entre processos
+        (ProcessPoolExecutor), aproveitando todos os núcleos. Os registros são
+        acrescentados a self.extracted_data na ordem dos arquivos, prontos para
+        save_to_excel.
+        
+        Args:
+            directory: Diretório raiz a ser percorrido
+            workers: Quantidade de processos (padrão: número de núcleos)
+            on_progress: Função chamada com (processados, total, emails por segundo)
+            
+        Returns:
+            Quantidade de emails processados
+        """
+        files = list_email_files(directory)
+        return self._process_offline(files, _extract_offline_file, workers, on_progress)
+
+    def process_mbox(self, mbox_path, workers=None, on_progress=None):
+        """
+        Processa offline um arquivo mbox (ex.: exportação do Thunderbird)
+        
+        O arquivo é mapeado em memória e indexado uma única vez (o índice é salvo
+        ao lado do arquivo e reaproveitado nas próximas execuções). Cada mensagem é
+        lida como fatia do mmap e as faixas de posições são distribuídas entre
+        processos; com workers=1 tudo roda no processo atual.
+        
+        Returns:
+            Quantidade de emails processados
+        """
+        with MboxIndex(mbox_path) as index:
+            tasks = [(mbox_path, start, end) for start, end in index.ranges()]
+        return self._process_offline(tasks, _extract_mbox_message, workers, on_progress)
+
+    def _process_offline(self, tasks, worker_function, workers=None, on_progress=None):
+        """Executa worker_function sobre cada tarefa em um pool de processos, preservando a ordem"""
+        total_emails = len(tasks)
+        processed = 0
+        self.extracted_data = []
+        
+        if not tasks:
+            logger.info("Nenhum email encontrado para processamento offline")
+            return 0
+        
+        reference_data_loaded = self._load_reference_if_configured()
+        
+        logger.info(f"Iniciando processamento offline de {total_emails} emails")
+        start_time = time.monotonic()
+        # Blocos maiores reduzem a troca de mensagens entre processos
+        chunksize = max(1, min(100, total_emails // ((workers or os.cpu_count() or 1) * 4)))
+        
+        extraction_cache_file = self.extraction_cache_file if self.use_extraction_cache else None
+        if workers == 1:
+            # Sem paralelismo: processar no próprio processo
+            _init_offline_worker(self.custom_fields, extraction_cache_file, self.max_content_chars)
+            results, executor = map(worker_function, tasks), None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_offline_worker,
+                                           initargs=(self.custom_fields, extraction_cache_file, self.max_content_chars))
+            results = executor.map(worker_function, tasks, chunksize=chunksize)
+        
+        try:
+            for extracted_fields in results:
                 processed += 1
-                logger.debug(f"Email processado: {processed}/{total_emails}")
+                if extracted_fields:
+                    self.extracted_data.append(extracted_fields)
                 
-            except Exception as e:
-                logger.error(f"Erro ao processar email ID {email_id}: {str(e)}", exc_info=True)
+                if processed % 100 == 0 or processed == total_emails:
+                    rate = processed / max(time.monotonic() - start_time, 1e-6)
+                    logger.info(f"Processamento offline: {processed}/{total_emails} emails ({rate:.1f} emails/s)")
+                    if on_progress:
+                        on_progress(processed, total_emails, rate)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            else:
+                _close_worker_mboxes()
+        
+        self.normalize_extracted_data(reference_data_loaded)
+        if self.use_extraction_cache:
+            self.get_extraction_cache()
+            self._evict_extraction_cache()
         
-        logger.info(f"Processamento finalizado. {processed} emails processados, {len(self.extracted_data)} registros extraídos.")
+        logger.info(f"Processamento offline finalizado. {processed} emails processados, {len(self.extracted_data)} registros extraídos.")
         return processed
 
-    def save_to_excel(self, filename=None):
-        """Salva os dados extraídos em um arquivo Excel com os formatos adequados"""
-        if not self.extracted_data:
-            messagebox.showinfo("Informação", "Nenhum dado para salvar.")
-            return False
+    def _process_pipeline(self, fetched_emails, received_ids, total_emails, record_sink=None, failed_ids=None):
+        """
+        Processa os emails em três etapas concorrentes ligadas por filas limitadas
+        
+        - rede: busca as mensagens no servidor (fetched_emails)
+        - extração: decodifica e extrai os campos (process_raw_email)
+        - gravação: entrega os registros ao destino (por padrão, self.extracted_data)
+        
+        A latência da rede fica escondida atrás do processamento e vice-versa. Como as
+        filas têm capacidade fixa, a quantidade de mensagens em memória não cresce
+        com o tamanho do lote. A profundidade das filas fica em self.pipeline_stats.
+        
+        Args:
+            record_sink: Função chamada com cada registro extraído, ainda com os valores
+                brutos (padrão: acrescentar a self.extracted_data)
+            failed_ids: Lista que recebe os IDs dos emails cuja extração falhou
             
+        Returns:
+            Quantidade de emails processados
+        """
+        # A conversão dos valores e os campos adicionais ficam para depois, em lote (normalize_records)
+        record_sink = record_sink or self.extracted_data.append
+        raw_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        record_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        stop_event = threading.Event()
+        done = object()  # Marca de fim de fila
+        
+        self.pipeline_stats = {
+            'rede': {'fila': 0, 'max': 0, 'capacidade': self.pipeline_queue_size},
+            'extracao': {'fila': 0, 'max': 0, 'capacidade': self.pipeline_queue_size},
+        }
+        
+        def put(target_queue, item, stage):
+            # Colocar na fila sem travar para sempre caso outra etapa tenha falhado
+            while not stop_event.is_set():
+                try:
+                    target_queue.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            depth = target_queue.qsize()
+            stats = self.pipeline_stats[stage]
+            stats['fila'] = depth
+            stats['max'] = max(stats['max'], depth)
+        
+        def network_stage():
+            try:
+                for email_id, raw_email in fetched_emails:
+                    if stop_event.is_set():
+                        break
+                    received_ids.append(email_id)
+                    put(raw_queue, (email_id, raw_email), 'rede')
+            except Exception as e:
+                logger.error(f"Erro na etapa de busca do pipeline: {str(e)}", exc_info=True)
+            finally:
+                put(raw_queue, done, 'rede')
+        
+        def extraction_stage():
+            try:
+                while not stop_event.is_set():
+                    try:
+                        item = raw_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if item is done:
+                        break
+                    email_id, raw_email = item
+                    try:
+                        extracted_fields = self.process_raw_email(raw_email, normalize=False)
+                        put(record_queue, (email_id, extracted_fields), 'extracao')
+                    except Exception as e:
+                        if failed_ids is not None:
+                            failed_ids.append(email_id)
+                        logger.error(f"Erro ao processar email ID {email_id}: {str(e)}", exc_info=True)
+            finally:
+                put(record_queue, done, 'extracao')
+        
+        threads = [threading.Thread(target=network_stage, daemon=True),
+                   threading.Thread(target=extraction_stage, daemon=True)]
+        for thread in threads:
+            thread.start()
+        
+        # Etapa de gravação na thread atual
+        processed = 0
         try:
-            # Criar DataFrame com os dados extraídos
-            df = pd.DataFrame(self.extracted_data)
-            
-            # Definir nome do arquivo Excel
-            if filename is None:
-                # Usar nome padrão com timestamp para evitar sobrescrever arquivos existentes
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                default_filename = f"processos_extraidos_{timestamp}.xlsx"
-                # Verificar se temos arquivo Excel padrão no diretório atual
-                excel_files = [f for f in os.listdir(os.getcwd()) if f.endswith('.xlsx') and f.startswith('processos_extraidos')]
+            while True:
+                item = record_queue.get()
+                if item is done:
+                    break
+                email_id, extracted_fields = item
+                if extracted_fields:
+                    record_sink(extracted_fields)
+                processed += 1
                 
-                # Se existir algum arquivo Excel de dados extraídos, usar o mais recente
-                if excel_files:
-                    filename = sorted(excel_files)[-1]  # Pega o mais recente alfabeticamente (geralmente pelo timestamp)
-                    logger.info(f"Encontrado arquivo existente: {filename}")
-                else:
-                    filename = default_filename
-                    logger.info(f"Criando novo arquivo: {filename}")
+                if processed % 100 == 0:
+                    logger.info(f"Pipeline: {processed}/{total_emails} emails, "
+                                f"fila de rede {raw_queue.qsize()}/{self.pipeline_queue_size}, "
+                                f"fila de extração {record_queue.qsize()}/{self.pipeline_queue_size}")
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+        
+        logger.info(f"Pipeline finalizado: fila de rede máx. {self.pipeline_stats['rede']['max']}, "
+                    f"fila de extração máx. {self.pipeline_stats['extracao']['max']}")
+        return processed
+
+    def fetch_emails(self, email_ids, imap_server=None):
+        """
+        Busca os emails em lotes com UID FETCH sobre faixas compactadas de UIDs
+        
+        Em vez de um comando por mensagem, cada lote de até 'fetch_batch_size' UIDs
+        é pedido em um único comando (ex.: "1:200,305,410:900"), reduzindo as idas
+        e voltas ao servidor.
+        
+        Args:
+            email_ids: UIDs retornados por search_emails
+            imap_server: Conexão a ser usada (padrão: self.imap_server)
+            
+        Returns:
+            Gerador de tuplas (uid, bytes da mensagem), na ordem crescente de UID
+        """
+        imap_server = imap_server or self.imap_server
+        uids = to_uid_list(email_ids)
+        
+        for batch in chunked(uids, self.fetch_batch_size):
+            yield from self._fetch_batch(imap_server, batch)
+
+    def _fetch_batch(self, imap_server, batch):
+        """Busca um lote de UIDs conforme o modo de busca configurado e retorna a lista de (uid, bytes)"""
+        if self.fetch_mode == 'bodystructure':
+            return self._fetch_text_parts_batch(imap_server, batch)
+        return self._fetch_rfc822_batch(imap_server, batch)
+
+    def _fetch_rfc822_batch(self, imap_server, batch, peek=None):
+        """Busca um lote de UIDs com um único comando UID FETCH e retorna a lista de (uid, bytes)"""
+        uid_set = compress_uid_ranges(batch)
+        logger.debug(f"Buscando lote de {len(batch)} emails: {uid_set}")
+        
+        # No modo incremental a mensagem não é marcada como lida (BODY.PEEK[])
+        if peek is None:
+            peek = self.incremental_sync
+        fetch_item, response_item = ('BODY.PEEK[]', 'BODY[]') if peek else ('RFC822', 'RFC822')
+        
+        try:
+            status, data = imap_server.uid('FETCH', uid_set, f'(UID {fetch_item})')
+        except Exception as e:
+            logger.error(f"Erro ao buscar lote de emails {uid_set}: {str(e)}", exc_info=True)
+            return []
+            
+        if status != 'OK':
+            logger.warning(f"Falha ao buscar lote de emails {uid_set}, status: {status}")
+            return []
+        
+        results = []
+        for message in sorted(parse_fetch_response(data), key=lambda m: m['uid']):
+            raw_email = message['items'].get(response_item)
+            if raw_email is not None:
+                results.append((message['uid'], raw_email))
+        
+        received = {uid for uid, _ in results}
+        missing = [uid for uid in batch if uid not in received]
+        if missing:
+            logger.warning(f"Emails não retornados pelo servidor: {compress_uid_ranges(missing)}")
+        return results
+
+    def _fetch_text_parts_batch(self, imap_server, batch):
+        """
+        Busca apenas o cabeçalho e as partes de texto de um lote de emails
+        
+        Primeiro pede o BODYSTRUCTURE de cada mensagem para descobrir as seções
+        text/plain (ou text/html, na falta de texto simples) e depois busca somente
+        essas seções com BODY.PEEK, sem baixar anexos. Cada mensagem é remontada
+        como um email simples contendo o cabeçalho original e o texto decodificado.
+        """
+        uid_set = compress_uid_ranges(batch)
+        logger.debug(f"Buscando estrutura de {len(batch)} emails: {uid_set}")
+        
+        try:
+            status, data = imap_server.uid('FETCH', uid_set, '(UID BODYSTRUCTURE)')
+            if status != 'OK':
+                logger.warning(f"Falha ao buscar estrutura dos emails {uid_set}, status: {status}")
+                return []
+            
+            # Agrupar as mensagens com as mesmas seções para buscá-las juntas
+            groups = {}
+            for message in parse_fetch_response(data):
+                sections = find_text_sections(get_bodystructure(message['meta']))
+                plain = [part for part in sections if part['subtype'] == 'plain']
+                selected = tuple((part['section'], part['subtype'], part['charset'], part['encoding'])
+                                 for part in (plain or sections))
+                groups.setdefault(selected, []).append(message['uid'])
             
-            # Caminho completo para o arquivo
-            full_path = os.path.join(os.getcwd(), filename)
+            results = []
+            for parts, uids in groups.items():
+                items = ['UID', 'BODY.PEEK[HEADER]'] + [f"BODY.PEEK[{part[0]}]" for part in parts]
+                group_set = compress_uid_ranges(uids)
+                status, data = imap_server.uid('FETCH', group_set, '({})'.format(' '.join(items)))
+                if status != 'OK':
+                    logger.warning(f"Falha ao buscar partes de texto dos emails {group_set}, status: {status}")
+                    continue
+                
+                for message in parse_fetch_response(data):
+                    header = message['items'].get('BODY[HEADER]')
+                    missing_parts = [part[0] for part in parts if f"BODY[{part[0]}]" not in message['items']]
+                    if header is None or missing_parts:
+                        # Mensagem incompleta: não é entregue nem marcada como lida, para ser buscada novamente
+                        logger.warning(f"Email {message['uid']} retornado sem o cabeçalho ou as partes {missing_parts}")
+                        continue
+                    bodies = [(subtype, self._decode_transfer_encoding(message['items'][f"BODY[{section}]"], encoding), charset)
+                              for section, subtype, charset, encoding in parts]
+                    results.append((message['uid'], self._build_text_email(header, bodies)))
             
-            # Verificar se o arquivo já existe
-            if os.path.exists(full_path):
+            # BODY.PEEK não marca as mensagens como lidas; marcar explicitamente como no modo RFC822,
+            # apenas as mensagens efetivamente recebidas
+            if results and not self.incremental_sync:
+                imap_server.uid('STORE', compress_uid_ranges([uid for uid, _ in results]), '+FLAGS', '(\\Seen)')
+        except Exception as e:
+            logger.error(f"Erro ao buscar partes de texto dos emails {uid_set}: {str(e)}", exc_info=True)
+            return []
+        
+        results.sort(key=lambda item: item[0])
+        received = {uid for uid, _ in results}
+        missing = [uid for uid in batch if uid not in received]
+        if missing:
+            logger.warning(f"Emails não retornados pelo servidor: {compress_uid_ranges(missing)}")
+        return results
+
+    def _decode_transfer_encoding(self, payload, encoding):
+        """Desfaz a codificação de transferência (base64/quoted-printable) de uma parte"""
+        try:
+            if encoding == 'base64':
+                return base64.b64decode(payload)
+            if encoding == 'quoted-printable':
+                return quopri.decodestring(payload)
+        except Exception as e:
+            logger.warning(f"Erro ao decodificar parte em {encoding}: {str(e)}")
+        return payload
+
+    def _build_text_email(self, header, bodies):
+        """
+        Remonta um email simples a partir do cabeçalho original e das partes de texto
+        
+        Args:
+            header: Bytes do cabeçalho da mensagem
+            bodies: Lista de tuplas (subtipo, bytes decodificados, charset)
+        """
+        msg = email.message_from_bytes(header)
+        
+        texts = []
+        subtype = 'plain'
+        for subtype, payload, charset in bodies:
+            texts.append(decode_bytes(payload, charset))
+        
+        # Substituir o corpo original pelo texto já decodificado em UTF-8
+        for name in ('Content-Type', 'Content-Transfer-Encoding', 'MIME-Version'):
+            del msg[name]
+        msg['MIME-Version'] = '1.0'
+        msg['Content-Type'] = f'text/{subtype}; charset="utf-8"'
+        msg['Content-Transfer-Encoding'] = 'base64'
+        msg.set_payload(base64.encodebytes(''.join(texts).encode('utf-8')).decode('ascii'))
+        return msg.as_bytes()
+
+    def open_session(self, timeout=None):
+        """
+        Abre uma nova sessão IMAP autenticada com as mesmas configurações de connect_to_server
+        
+        A sessão já retorna com a caixa de correio selecionada. Erros são propagados
+        para quem chamou, sem exibir mensagens na interface.
+        """
+        timeout = timeout or self.timeout
+        if self.use_ssl:
+            session = imaplib.IMAP4_SSL(self.imap_host, self.imap_port, timeout=timeout)
+        else:
+            session = imaplib.IMAP4(self.imap_host, self.imap_port, timeout=timeout)
+            session.starttls()
+        session.login(self.email_user, self.email_pass)
+        session.select(self.mailbox)
+        return session
+
+    def fetch_emails_parallel(self, email_ids, pool_size=None):
+        """
+        Busca os emails distribuindo os lotes entre várias sessões IMAP simultâneas
+        
+        Abre até 'fetch_pool_size' sessões autenticadas e busca os lotes em paralelo
+        com um pool de threads. Os resultados são devolvidos na ordem crescente de UID,
+        independentemente de qual sessão terminou primeiro.
+        
+        Returns:
+            Gerador de tuplas (uid, bytes da mensagem), como em fetch_emails
+        """
+        uids = to_uid_list(email_ids)
+        batches = list(chunked(uids, self.fetch_batch_size))
+        pool_size = min(pool_size or self.fetch_pool_size, len(batches))
+        
+        if pool_size <= 1:
+            yield from self.fetch_emails(uids)
+            return
+        
+        # Abrir as sessões do pool
+        sessions = []
+        for i in range(pool_size):
+            try:
+                sessions.append(self.open_session(self.session_timeout))
+            except Exception as e:
+                logger.warning(f"Não foi possível abrir a sessão {i + 1} do pool: {str(e)}")
+        
+        if not sessions:
+            logger.warning("Nenhuma sessão adicional disponível, usando a conexão principal")
+            yield from self.fetch_emails(uids)
+            return
+        
+        logger.info(f"Buscando {len(uids)} emails em {len(batches)} lotes com {len(sessions)} sessões paralelas")
+        
+        idle_sessions = list(sessions)
+        sessions_lock = threading.Lock()
+        
+        def fetch_with_session(batch):
+            with sessions_lock:
+                session = idle_sessions.pop()
+            try:
                 try:
-                    # Criar um escritor Excel com formato
-                    with pd.ExcelWriter(full_path, engine='openpyxl', mode='a', if_sheet_exists='overlay') as writer:
-                        # Ler o arquivo existente para obter os dados
-                        existing_df = pd.read_excel(full_path)
-                        
-                        # Garantir que temos todas as colunas necessárias
-                        for col in df.columns:
-                            if col not in existing_df.columns:
-                                existing_df[col] = ""
-                        
-                        # Garantir que novos dados têm as mesmas colunas do arquivo existente
-                        for col in existing_df.columns:
-                            if col not in df.columns:
-                                df[col] = ""
-                        
-                        # Concatenar os dados existentes com os novos
-                        combined_df = pd.concat([existing_df, df], ignore_index=True)
-                        
-                        # Configurar os formatos para cada coluna baseado nos formatos definidos
-                        for field in self.custom_fields:
-                            field_name = field["name"]
-                            field_format = field.get("format", "texto")
-                            
-                            # Aplicar formatos específicos às colunas do DataFrame
-                            if field_name in combined_df.columns:
-                                if field_format == "número":
-                                    # Converter para float caso ainda não seja
-                                    combined_df[field_name] = pd.to_numeric(combined_df[field_name], errors='coerce')
-                                elif field_format == "data":
-                                    # Converter para datetime
-                                    combined_df[field_name] = pd.to_datetime(combined_df[field_name], errors='coerce')
-                        
-                        # Salvar o arquivo com todos os dados
-                        combined_df.to_excel(writer, index=False, sheet_name='Sheet1')
-                        
-                    logger.info(f"Acrescentando dados ao arquivo existente: {full_path}")
+                    return self._fetch_batch(session, batch)
+                except imaplib.IMAP4.abort as e:
+                    # Conexão perdida: reabrir a sessão e tentar o lote mais uma vez
+                    logger.warning(f"Sessão do pool perdida ({str(e)}), reconectando")
+                    self.close_connection(session)
+                    session = self.open_session(self.session_timeout)
+                    sessions.append(session)
+                    return self._fetch_batch(session, batch)
+            except Exception as e:
+                logger.error(f"Erro ao buscar lote no pool: {str(e)}", exc_info=True)
+                return []
+            finally:
+                with sessions_lock:
+                    idle_sessions.append(session)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+                # Manter apenas alguns lotes em andamento para não acumular mensagens em memória
+                pending = []
+                batch_iter = iter(batches)
+                for batch in batch_iter:
+                    pending.append(executor.submit(fetch_with_session, batch))
+                    if len(pending) >= len(sessions) * 2:
+                        break
+                
+                while pending:
+                    future = pending.pop(0)
+                    next_batch = next(batch_iter, None)
+                    if next_batch is not None:
+                        pending.append(executor.submit(fetch_with_session, next_batch))
+                    yield from future.result()
+        finally:
+            for session in sessions:
+                self.close_connection(session)
+
+    def get_extraction_cache(self):
+        """Abre (uma única vez) o cache de extração; retorna None se falhar"""
+        if self._extraction_cache is None:
+            try:
+                self._extraction_cache = ExtractionCache(self.extraction_cache_file, self.extraction_cache_max_entries)
+            except Exception as e:
+                logger.error(f"Erro ao abrir o cache de extração {self.extraction_cache_file}: {str(e)}")
+                self.use_extraction_cache = False
+                return None
+        return self._extraction_cache
+
+    def _evict_extraction_cache(self):
+        """Aplica o limite de tamanho do cache de extração ao final de um processamento"""
+        if self.use_extraction_cache and self._extraction_cache is not None:
+            try:
+                self._extraction_cache.evict()
+            except Exception as e:
+                logger.warning(f"Não foi possível limpar o cache de extração: {str(e)}")
+
+    def get_message_store(self):
+        """Abre (uma única vez) o armazenamento local de mensagens; retorna None se falhar"""
+        if self._message_store is None:
+            try:
+                self._message_store = MessageStore(self.message_store_file,
+                                                   self.message_store_max_mb * 1024 * 1024)
+            except Exception as e:
+                logger.error(f"Erro ao abrir o armazenamento local {self.message_store_file}: {str(e)}")
+                return None
+        return self._message_store
+
+    def _fetch_through_store(self, email_ids, fetcher):
+        """
+        Entrega as mensagens do armazenamento local e busca no servidor apenas as ausentes
+        
+        As mensagens buscadas são gravadas no armazenamento em lotes. O resultado segue
+        a ordem crescente de UID, como em fetch_emails. Fora do modo incremental, as
+        mensagens lidas do armazenamento são marcadas como lidas no servidor, como
+        aconteceria se tivessem sido buscadas com RFC822.
+        """
+        store = self.get_message_store()
+        uids = to_uid_list(email_ids)
+        if store is None or not self.current_uidvalidity:
+            yield from fetcher(uids)
+            return
+        
+        mailbox, uidvalidity, kind = self.mailbox, self.current_uidvalidity, self.fetch_mode
+        stored = sorted(store.find(mailbox, uidvalidity, uids, kind))
+        stored_set = set(stored)
+        missing = [uid for uid in uids if uid not in stored_set]
+        logger.info(f"Armazenamento local: {len(stored)} emails disponíveis, {len(missing)} a buscar no servidor")
+        
+        if stored and not self.incremental_sync:
+            for batch in chunked(stored, self.fetch_batch_size):
+                try:
+                    self.imap_server.uid('STORE', compress_uid_ranges(batch), '+FLAGS', '(\\Seen)')
                 except Exception as e:
-                    # Se houver erro ao ler o arquivo existente, criar um novo
-                    logger.warning(f"Não foi possível atualizar o arquivo existente: {str(e)}")
-                    logger.info(f"Criando novo arquivo: {full_path}")
-                    
-                    # Criar um novo arquivo com os formatos adequados
-                    with pd.ExcelWriter(full_path, engine='openpyxl') as writer:
-                        # Configurar os formatos para cada coluna
-                        for field in self.custom_fields:
-                            field_name = field["name"]
-                            field_format = field.get("format", "texto")
-                            
-                            # Aplicar formatos específicos às colunas do DataFrame
-                            if field_name in df.columns:
-                                if field_format == "número":
-                                    # Converter para float caso ainda não seja
-                                    df[field_name] = pd.to_numeric(df[field_name], errors='coerce')
-                                elif field_format == "data":
-                                    # Converter para datetime
-                                    df[field_name] = pd.to_datetime(df[field_name], errors='coerce')
-                        
-                        df.to_excel(writer, index=False)
-            else:
-                # O arquivo não existe, criar um novo
-                logger.info(f"Criando novo arquivo: {full_path}")
+                    logger.warning(f"Não foi possível marcar emails como lidos: {str(e)}")
+        
+        new_messages = []
+        
+        def cached_messages():
+            for batch in chunked(stored, self.fetch_batch_size):
+                found = store.get_many(mailbox, uidvalidity, batch, kind)
+                for uid in batch:
+                    if uid in found:
+                        yield uid, found.pop(uid)
+        
+        def fetched_messages():
+            if not missing:
+                return
+            for uid, raw_email in fetcher(missing):
+                new_messages.append((uid, raw_email))
+                if len(new_messages) >= self.fetch_batch_size:
+                    store.put_many(mailbox, uidvalidity, new_messages, kind)
+                    new_messages.clear()
+                yield uid, raw_email
+        
+        try:
+            yield from heapq.merge(cached_messages(), fetched_messages(), key=lambda item: item[0])
+        finally:
+            store.put_many(mailbox, uidvalidity, new_messages, kind)
+            store.evict()
+
+    def prewarm_message_store(self, search_subject=None, on_progress=None):
+        """
+        Baixa para o armazenamento local as mensagens da caixa que ainda não estão nele
+        
+        Busca todas as mensagens (ou apenas as com o assunto informado), lidas ou não,
+        com BODY.PEEK[] para não alterar a marcação de lidas no servidor. As mensagens
+        ficam guardadas completas, prontas para process_message_store.
+        
+        Returns:
+            Quantidade de mensagens gravadas
+        """
+        store = self.get_message_store()
+        if store is None:
+            return 0
+        
+        try:
+            self.imap_server.select(self.mailbox)
+            uidvalidity = self.current_uidvalidity = self._selected_uidvalidity()
+            
+            status, uids = self.search_uids('ALL', search_subject)
+            if status != 'OK':
+                logger.warning(f"Falha ao listar os emails para o armazenamento local, status: {status}")
+                return 0
+            
+            stored = store.find(self.mailbox, uidvalidity, uids, 'rfc822')
+            missing = [uid for uid in uids if uid not in stored]
+            logger.info(f"Pré-carga do armazenamento local: {len(stored)} de {len(uids)} emails já armazenados, "
+                        f"{len(missing)} a buscar")
+            
+            saved = 0
+            start_time = time.monotonic()
+            for batch in chunked(missing, self.fetch_batch_size):
+                saved += store.put_many(self.mailbox, uidvalidity,
+                                        self._fetch_rfc822_batch(self.imap_server, batch, peek=True), 'rfc822')
+                rate = saved / max(time.monotonic() - start_time, 1e-6)
+                logger.info(f"Pré-carga: {saved}/{len(missing)} emails ({rate:.1f} emails/s)")
+                if on_progress:
+                    on_progress(saved, len(missing), rate)
+            
+            store.evict()
+            return saved
+        except Exception as e:
+            logger.error(f"Erro na pré-carga do armazenamento local: {str(e)}", exc_info=True)
+            return 0
+
+    def process_message_store(self, mailbox=None, workers=None, on_progress=None):
+        """
+        Reextrai os campos das mensagens guardadas no armazenamento local, sem acessar a rede
+        
+        Útil após alterar os campos personalizados. Usa o UIDVALIDITY mais recente
+        armazenado para a caixa; para cada UID, prefere a mensagem completa e recorre
+        à versão reduzida (modo bodystructure) quando só ela estiver disponível.
+        
+        Returns:
+            Quantidade de emails processados
+        """
+        mailbox = mailbox or self.mailbox
+        store = self.get_message_store()
+        if store is None:
+            return 0
+        
+        uidvalidity, full_uids = store.list_uids(mailbox, kind='rfc822')
+        if uidvalidity is None:
+            uidvalidity, _ = store.list_uids(mailbox, kind='bodystructure')
+            full_uids = []
+        _, text_uids = store.list_uids(mailbox, uidvalidity, kind='bodystructure') if uidvalidity else (None, [])
+        
+        kinds = {uid: 'bodystructure' for uid in text_uids}
+        kinds.update((uid, 'rfc822') for uid in full_uids)
+        tasks = [(self.message_store_file, mailbox, uidvalidity, uid, kinds[uid]) for uid in sorted(kinds)]
+        logger.info(f"Reextração do armazenamento local: {len(tasks)} emails de {mailbox} (UIDVALIDITY {uidvalidity})")
+        return self._process_offline(tasks, _extract_stored_message, workers, on_progress)
+
+    def backfill(self, since, before, search_subject=None, shard_days=30, workers=4, retries=1, force=False,
+                 on_progress=None):
+        """
+        Carga histórica: processa todos os emails de um período, dividido em faixas de datas paralelas
+        
+        O período [since, before) é dividido em faixas de 'shard_days' dias (SINCE/BEFORE).
+        Cada faixa é processada em um processo do pool, com a sua própria sessão IMAP,
+        lendo as mensagens com BODY.PEEK[] (sem marcá-las como lidas). O resultado de
+        cada faixa é gravado em um checkpoint em 'backfill_dir'; faixas com checkpoint
+        da mesma configuração não são refeitas (a não ser com 'force'), de modo que uma
+        nova execução repete apenas as faixas que falharam. Faixas com falha também são
+        repetidas até 'retries' vezes na própria execução.
+        
+        Ao final, os registros das faixas concluídas são reunidos em ordem cronológica
+        (por faixa e UID) em extracted_data.
+        
+        Returns:
+            Tupla (quantidade de emails processados, lista dos nomes das faixas que falharam)
+        """
+        shards = date_shards(since, before, shard_days)
+        os.makedirs(self.backfill_dir, exist_ok=True)
+        signature = self._backfill_signature(search_subject)
+        
+        pending = [shard for shard in shards
+                   if force or load_checkpoint(checkpoint_path(self.backfill_dir, shard), signature) is None]
+        logger.info(f"Carga histórica: {len(shards)} faixas, {len(shards) - len(pending)} já concluídas, "
+                    f"{len(pending)} a processar")
+        
+        settings = {name: getattr(self, name) for name in BACKFILL_SETTINGS}
+        extraction_cache_file = self.extraction_cache_file if self.use_extraction_cache else None
+        workers = max(1, min(workers or 1, len(pending) or 1))
+        done, emails = len(shards) - len(pending), 0
+        start_time = time.monotonic()
+        
+        if workers == 1:
+            # Sem paralelismo: processar no próprio processo
+            _init_offline_worker(self.custom_fields, extraction_cache_file, self.max_content_chars)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_offline_worker,
+                                           initargs=(self.custom_fields, extraction_cache_file, self.max_content_chars))
+        
+        try:
+            for attempt in range(retries + 1):
+                if not pending:
+                    break
+                if attempt:
+                    logger.info(f"Carga histórica: repetindo {len(pending)} faixas com falha (tentativa {attempt + 1})")
+                tasks = [(settings, search_subject, shard, checkpoint_path(self.backfill_dir, shard), signature)
+                         for shard in pending]
+                if executor is None:
+                    results = map(_backfill_shard, tasks)
+                else:
+                    results = (future.result() for future in
+                               as_completed([executor.submit(_backfill_shard, task) for task in tasks]))
                 
-                with pd.ExcelWriter(full_path, engine='openpyxl') as writer:
-                    # Configurar os formatos para cada coluna
-                    for field in self.custom_fields:
-                        field_name = field["name"]
-                        field_format = field.get("format", "texto")
-                        
-                        # Aplicar formatos específicos às colunas do DataFrame
-                        if field_name in df.columns:
-                            if field_format == "número":
-                                # Converter para float caso ainda não seja
-                                df[field_name] = pd.to_numeric(df[field_name], errors='coerce')
-                            elif field_format == "data":
-                                # Converter para datetime
-                                df[field_name] = pd.to_datetime(df[field_name], errors='coerce')
-                    
-                    df.to_excel(writer, index=False)
+                failed = []
+                for shard, processed in results:
+                    if processed is None:
+                        failed.append(shard)
+                        continue
+                    done += 1
+                    emails += processed
+                    rate = emails / max(time.monotonic() - start_time, 1e-6)
+                    logger.info(f"Carga histórica: {done}/{len(shards)} faixas ({rate:.1f} emails/s)")
+                    if on_progress:
+                        on_progress(done, len(shards), rate)
+                pending = sorted(failed)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            else:
+                _close_worker_mboxes()
+        
+        failed_names = [shard_name(shard) for shard in pending]
+        if failed_names:
+            logger.error(f"Carga histórica: faixas com falha: {', '.join(failed_names)}")
+        
+        # Reunir os resultados em ordem cronológica, inclusive os das execuções anteriores
+        self.extracted_data = []
+        reference_data_loaded = self._load_reference_if_configured()
+        for shard in shards:
+            checkpoint = load_checkpoint(checkpoint_path(self.backfill_dir, shard), signature)
+            if checkpoint is not None:
+                self.extracted_data.extend(checkpoint['records'])
+        self.normalize_extracted_data(reference_data_loaded)
+        
+        logger.info(f"Carga histórica finalizada. {emails} emails processados, "
+                    f"{len(self.extracted_data)} registros reunidos.")
+        return emails, failed_names
+
+    def _backfill_signature(self, search_subject):
+        """Hash da configuração de busca e dos campos; checkpoints com outro hash são refeitos"""
+        definition = json.dumps([self.mailbox, search_subject or '', self.sender_filter, self.search_body_labels,
+                                 self.header_prefilter,
+                                 [field_fingerprint(field, self.max_content_chars) for field in self.custom_fields]],
+                                ensure_ascii=False)
+        return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+    def output_path(self, filename=None):
+        """
+        Caminho do arquivo de saída no diretório atual
+        
+        Sem 'filename', é usado o arquivo "processos_extraidos_*" mais recente no formato
+        configurado (output_format) ou, se não houver, um novo com data e hora no nome.
+        """
+        if filename is None:
+            extension = OUTPUT_FORMATS.get(self.output_format, '.xlsx')
+            # Usar nome padrão com timestamp para evitar sobrescrever arquivos existentes
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            default_filename = f"processos_extraidos_{timestamp}{extension}"
+            # Verificar se temos arquivo de saída padrão no diretório atual
+            output_files = [f for f in os.listdir(os.getcwd()) if f.endswith(extension) and f.startswith('processos_extraidos')]
+            
+            # Se existir algum arquivo de dados extraídos, usar o mais recente
+            if output_files:
+                filename = sorted(output_files)[-1]  # Pega o mais recente alfabeticamente (geralmente pelo timestamp)
+                logger.info(f"Encontrado arquivo existente: {filename}")
+            else:
+                filename = default_filename
+                logger.info(f"Criando novo arquivo: {filename}")
+        
+        # Caminho completo para o arquivo
+        return os.path.join(os.getcwd(), filename)
+
+    def output_columns(self):
+        """Colunas da saída: os campos personalizados e, se configurados, os campos adicionais"""
+        columns = [field["name"] for field in self.custom_fields]
+        if self.additional_excel_file and self.key_field and self.additional_fields:
+            columns.extend(self.additional_fields)
+        return list(dict.fromkeys(columns))
+
+    def create_output_sink(self, path):
+        """
+        Cria o destino dos registros conforme a extensão do arquivo ou, se não for
+        reconhecida, o formato configurado (output_format)
+        
+        Returns:
+            ExcelSink, CsvSink, ParquetSink ou SqliteSink
+        """
+        output_format = output_format_for(path, self.output_format)
+        if output_format == 'csv':
+            return CsvSink(path, self.custom_fields, self.output_columns())
+        if output_format == 'parquet':
+            return ParquetSink(path, self.custom_fields, self.output_columns(), self.output_batch_size)
+        if output_format == 'sqlite':
+            key_columns = self.output_key_columns or ([self.key_field] if self.key_field else [])
+            return SqliteSink(path, self.custom_fields, self.output_columns(), key_columns, self.output_batch_size)
+        if output_format != 'excel':
+            raise ValueError(f"Formato de saída inválido: '{output_format}' (use {', '.join(OUTPUT_FORMATS)})")
+        # Acrescentar apenas as novas linhas, sem reler e regravar os dados já existentes com o pandas
+        return ExcelSink(path, self.custom_fields, self.excel_max_rows, self.excel_rollover)
+
+    def save_to_excel(self, filename=None):
+        """
+        Salva os dados extraídos no formato de saída configurado, com os formatos adequados
+        
+        O Excel é o padrão; ver create_output_sink para CSV, Parquet e SQLite.
+        """
+        if not self.extracted_data:
+            self._notify('showinfo', "Informação", "Nenhum dado para salvar.")
+            return False
+            
+        try:
+            with self.create_output_sink(self.output_path(filename)) as sink:
+                sink.write(self.extracted_data)
             
-            messagebox.showinfo("Sucesso", f"Dados salvos com sucesso em {full_path}")
+            self._notify('showinfo', "Sucesso", f"Dados salvos com sucesso em {', '.join(sink.paths)}")
             return True
         except Exception as e:
-            error_msg = f"Erro ao salvar arquivo Excel: {str(e)}"
+            error_msg = f"Erro ao salvar arquivo de saída: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            messagebox.showerror("Erro", error_msg)
+            self._notify('showerror', "Erro", error_msg)
             return False
 
-    def close_connection(self):
-        """Fecha a conexão com o servidor IMAP"""
-        if self.imap_server:
+    def watch_mailbox(self, search_subject, stop_event, on_new_data=None):
+        """
+        Monitora a caixa de correio continuamente usando IMAP IDLE
+        
+        A cada notificação de novas mensagens (EXISTS), busca, extrai e acrescenta ao
+        arquivo de saída apenas os emails novos. O IDLE é reemitido antes do limite
+        de inatividade do servidor e a conexão é refeita automaticamente em caso de
+        queda. Servidores sem suporte a IDLE são verificados a cada 'poll_interval'.
+        
+        Requer que connect_to_server já tenha sido chamado com sucesso.
+        
+        Args:
+            search_subject: Texto do assunto a ser buscado
+            stop_event: threading.Event que encerra o monitoramento quando sinalizado
+            on_new_data: Função chamada com a quantidade de emails processados a cada lote
+        """
+        self.show_dialogs = False
+        reconnect_delay = 5
+        
+        logger.info(f"Iniciando monitoramento da caixa {self.mailbox}")
+        
+        try:
+            while not stop_event.is_set():
+                try:
+                    if self.imap_server is None:
+                        if not self.connect_to_server(self.email_user, self.email_pass, self.imap_host,
+                                                      self.imap_port, self.use_ssl, self.timeout):
+                            raise imaplib.IMAP4.abort("Falha ao reconectar ao servidor")
+                        logger.info("Reconectado ao servidor para monitoramento")
+                    
+                    email_ids = self.search_emails(search_subject)
+                    # A busca refaz o SELECT: a primeira contagem EXISTS é a dele, as seguintes são emails novos
+                    new_mail = len(self.imap_server.untagged_responses.pop('EXISTS', [])) > 1
+                    if email_ids:
+                        processed = self.process_emails(email_ids)
+                        # Avançar a marca de sincronização apenas com a saída gravada
+                        if not self.extracted_data or self.save_to_excel():
+                            self.commit_sync_state()
+                        if on_new_data:
+                            on_new_data(processed)
+                        # Emails que chegaram durante o processamento são avisados nas respostas
+                        # dos comandos (e não de novo no IDLE): o NOOP recolhe esses avisos
+                        self.imap_server.noop()
+                        new_mail = new_mail or bool(self.imap_server.untagged_responses.pop('EXISTS', None))
+                    
+                    if new_mail:
+                        logger.info("Novos emails chegaram durante o processamento, buscando novamente")
+                    elif 'IDLE' in self.imap_server.capabilities:
+                        self._idle_wait(stop_event, self.idle_timeout)
+                    else:
+                        # Sem suporte a IDLE: manter a conexão viva e verificar periodicamente
+                        stop_event.wait(self.poll_interval)
+                        self.imap_server.noop()
+                    
+                    reconnect_delay = 5
+                except (imaplib.IMAP4.error, OSError, EOFError) as e:
+                    logger.warning(f"Conexão de monitoramento perdida: {str(e)}. Nova tentativa em {reconnect_delay}s")
+                    self.close_connection()
+                    self.imap_server = None
+                    stop_event.wait(reconnect_delay)
+                    reconnect_delay = min(reconnect_delay * 2, 300)
+        finally:
+            self.show_dialogs = True
+            logger.info("Monitoramento encerrado")
+
+    def _idle_wait(self, stop_event, timeout):
+        """
+        Entra em IDLE e aguarda até chegar uma notificação EXISTS, o timeout ou o stop_event
+        
+        Returns:
+            True se o servidor avisou sobre novas mensagens
+        """
+        server = self.imap_server
+        # Começar pelos bytes que o imaplib já leu do socket e ainda não entregou
+        reader = SocketLineReader(server.sock, take_buffered_bytes(server.file, server.sock))
+        tag = server._new_tag()
+        server.tagged_commands.pop(tag, None)
+        server.send(tag + b' IDLE\r\n')
+        
+        # Aguardar a resposta de continuação do servidor
+        new_mail = False
+        while True:
+            line = reader.readline(self.timeout)
+            if line is None:
+                raise imaplib.IMAP4.abort("Servidor não respondeu ao comando IDLE")
+            if line.startswith(b'+'):
+                break
+            if line.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE recusado pelo servidor: {line.decode(errors='replace').strip()}")
+            if re.match(rb'\* \d+ EXISTS', line):
+                new_mail = True
+        
+        logger.debug("Aguardando novas mensagens (IDLE)")
+        deadline = time.monotonic() + timeout
+        while not new_mail and not stop_event.is_set() and time.monotonic() < deadline:
+            # Leituras curtas para responder rapidamente ao stop_event
+            line = reader.readline(1)
+            if line is None:
+                continue
+            if re.match(rb'\* \d+ EXISTS', line):
+                logger.info("Servidor notificou novas mensagens")
+                new_mail = True
+                break
+            if line.startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort("Servidor encerrou a conexão durante o IDLE")
+        
+        server.send(b'DONE\r\n')
+        while True:
+            line = reader.readline(self.timeout)
+            if line is None:
+                raise imaplib.IMAP4.abort("Servidor não confirmou o fim do IDLE")
+            if line.startswith(tag):
+                if b' OK' not in line:
+                    raise imaplib.IMAP4.error(f"Erro ao encerrar IDLE: {line.decode(errors='replace').strip()}")
+                break
+        
+        return new_mail
+
+    def close_connection(self, imap_server=None):
+        """Fecha a conexão com o servidor IMAP (por padrão, a conexão principal)"""
+        imap_server = imap_server or self.imap_server
+        if imap_server:
             try:
-                self.imap_server.close()
-                self.imap_server.logout()
+                imap_server.close()
+                imap_server.logout()
             except:
                 pass
 
@@ -611,9 +2070,13 @@ class EmailProcessor:
             logger.warning(f"Arquivo de referência não encontrado: {self.additional_excel_file}")
             return False
             
+        self.reference_index = None
         try:
-            # Carregar o arquivo Excel em um DataFrame
-            self.reference_data = pd.read_excel(self.additional_excel_file)
+            # Carregar do arquivo Excel apenas o campo chave e os campos adicionais, já indexados
+            # pela chave uma única vez: cada busca passa a ser O(1)
+            self.reference_data, reference_index = load_reference_excel(
+                self.additional_excel_file, self.key_field, self.additional_fields,
+                self.reference_duplicates, self.use_reference_snapshot)
             
             # Verificar se o campo chave existe no DataFrame
             if self.key_field and self.key_field not in self.reference_data.columns:
@@ -629,8 +2092,14 @@ class EmailProcessor:
             if missing_fields:
                 logger.warning(f"Campos adicionais não encontrados no arquivo Excel: {', '.join(missing_fields)}")
                 return False
+            
+            self.reference_index = reference_index
+            if self.reference_index.duplicate_keys:
+                logger.warning(f"{self.reference_index.duplicate_keys} linhas com chave repetida no arquivo de referência "
+                               f"(mantida a {'primeira' if self.reference_duplicates == 'first' else 'última'} ocorrência)")
                 
-            logger.info(f"Dados de referência carregados com sucesso: {len(self.reference_data)} registros")
+            logger.info(f"Dados de referência carregados com sucesso: {len(self.reference_data)} registros, "
+                        f"{len(self.reference_index)} chaves")
             return True
         except Exception as e:
             logger.error(f"Erro ao carregar arquivo de referência: {str(e)}")
@@ -646,28 +2115,179 @@ class EmailProcessor:
         Returns:
             Um dicionário com os campos adicionais encontrados ou vazio se não encontrar
         """
-        if self.reference_data is None or not self.key_field or not self.additional_fields:
+        if self.reference_index is None or not self.key_field or not self.additional_fields:
             return {}
         
         try:
-            # Verifica se o valor da chave está no DataFrame
-            matches = self.reference_data[self.reference_data[self.key_field] == key_value]
+            # Consulta ao índice montado em load_reference_data (chave repetida: conforme reference_duplicates)
+            result = self.reference_index.get(key_value)
             
-            if matches.empty:
+            if result is None:
                 logger.warning(f"Nenhum registro encontrado para o valor chave: {key_value}")
                 return {}
             
-            # Obtém o primeiro registro correspondente (assume-se chave única)
-            first_match = matches.iloc[0]
-            
-            # Extrai os campos adicionais
-            result = {}
-            for field in self.additional_fields:
-                if field in first_match:
-                    result[field] = first_match[field]
-            
             logger.info(f"Dados adicionais encontrados para chave '{key_value}': {result}")
             return result
         except Exception as e:
             logger.error(f"Erro ao buscar dados adicionais para '{key_value}': {str(e)}")
-            return {}
\ No newline at end of file
+            return {}
+
+
+def list_email_files(directory):
+    """
+    Lista, em ordem estável, os arquivos .eml e as mensagens de pastas Maildir de um diretório
+
+    Em um Maildir, cada mensagem é um arquivo dentro das subpastas 'cur' e 'new'.
+    """
+    files = []
+    for root, dirs, filenames in os.walk(directory):
+        dirs.sort()
+        parent = os.path.dirname(root)
+        in_maildir = (os.path.basename(root) in ('cur', 'new')
+                      and all(os.path.isdir(os.path.join(parent, d)) for d in ('cur', 'new', 'tmp')))
+        for filename in sorted(filenames):
+            if in_maildir or filename.lower().endswith('.eml'):
+                files.append(os.path.join(root, filename))
+    return files
+
+
+# Processador usado por cada processo do pool no processamento offline
+_worker_processor = None
+
+
+def _init_offline_worker(custom_fields, extraction_cache_file=None, max_content_chars=None):
+    """Inicializa o processador de cada processo do pool com os campos configurados"""
+    global _worker_processor
+    _worker_processor = EmailProcessor()
+    _worker_processor.custom_fields = custom_fields
+    if max_content_chars is not None:
+        _worker_processor.max_content_chars = max_content_chars
+    if extraction_cache_file:
+        _worker_processor.use_extraction_cache = True
+        _worker_processor.extraction_cache_file = extraction_cache_file
+    if multiprocessing.parent_process() is not None:
+        # Processo do pool: gravar o cache de extração pendente e fechar os arquivos ao encerrar
+        multiprocessing.util.Finalize(None, _close_worker_mboxes, exitpriority=10)
+
+
+# Arquivos mbox mapeados em memória em cada processo do pool
+_worker_mboxes = {}
+
+
+def _extract_mbox_message(task):
+    """Extrai os campos de uma mensagem de um mbox a partir de suas posições (executado nos processos do pool)"""
+    mbox_path, start, end = task
+    try:
+        mbox = _worker_mboxes.get(mbox_path)
+        if mbox is None:
+            mbox = _worker_mboxes[mbox_path] = MboxIndex(mbox_path).open()
+        return _worker_processor.process_raw_email(mbox.slice(start, end), normalize=False)
+    except Exception as e:
+        logger.error(f"Erro ao processar mensagem do mbox {mbox_path} na posição {start}: {str(e)}", exc_info=True)
+        return {}
+
+
+def _close_worker_mboxes():
+    """Fecha os arquivos mbox mapeados, os armazenamentos locais e o cache de extração abertos pelo processo atual"""
+    for mbox in _worker_mboxes.values():
+        mbox.close()
+    _worker_mboxes.clear()
+    for store in _worker_stores.values():
+        store.close()
+    _worker_stores.clear()
+    if _worker_processor is not None and _worker_processor._extraction_cache is not None:
+        try:
+            _worker_processor._extraction_cache.close()
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o cache de extração: {str(e)}")
+        _worker_processor._extraction_cache = None
+
+
+# Armazenamentos locais de mensagens abertos em cada processo do pool
+_worker_stores = {}
+
+
+def _extract_stored_message(task):
+    """Extrai os campos de uma mensagem do armazenamento local (executado nos processos do pool)"""
+    store_path, mailbox, uidvalidity, uid, kind = task
+    try:
+        store = _worker_stores.get(store_path)
+        if store is None:
+            store = _worker_stores[store_path] = MessageStore(store_path)
+        raw_email = store.get(mailbox, uidvalidity, uid, kind)
+        if raw_email is None:
+            logger.warning(f"Email UID {uid} não encontrado no armazenamento local")
+            return {}
+        return _worker_processor.process_raw_email(raw_email, normalize=False)
+    except Exception as e:
+        logger.error(f"Erro ao processar email UID {uid} do armazenamento local: {str(e)}", exc_info=True)
+        return {}
+
+
+def _backfill_shard(task):
+    """
+    Busca e extrai os emails de uma faixa de datas da carga histórica (executado nos processos do pool)
+    
+    Returns:
+        Tupla (faixa, quantidade de emails processados), com None no lugar da quantidade
+        se a faixa falhou (nesse caso nenhum checkpoint é gravado)
+    """
+    settings, search_subject, shard, path, signature = task
+    processor = _worker_processor
+    for name, value in settings.items():
+        setattr(processor, name, value)
+    processor.show_dialogs = False
+    processor.search_since, processor.search_before = shard[0].isoformat(), shard[1].isoformat()
+    name = shard_name(shard)
+    
+    try:
+        if not processor.connect_to_server(processor.email_user, processor.email_pass, processor.imap_host,
+                                           processor.imap_port, processor.use_ssl, processor.timeout):
+            return shard, None
+        # Somente leitura: a carga histórica não altera as marcações das mensagens
+        processor.imap_server.select(processor.mailbox, readonly=True)
+        subject_criterion = None if processor.header_prefilter else search_subject
+        status, uids = processor.search_uids('ALL', subject_criterion, body_labels=processor.search_body_labels)
+        if status != 'OK':
+            logger.error(f"Faixa {name}: falha na busca, status: {status}")
+            return shard, None
+        if processor.header_prefilter and uids:
+            uids = processor.prefilter_by_headers(uids, search_subject)
+        
+        records = []
+        emails = 0
+        for batch in chunked(uids, processor.fetch_batch_size):
+            messages = processor._fetch_rfc822_batch(processor.imap_server, batch, peek=True)
+            received = {uid for uid, _ in messages}
+            missing = [uid for uid in batch if uid not in received]
+            if missing:
+                # Lote incompleto: a faixa inteira é refeita, senão o checkpoint a daria por concluída
+                logger.error(f"Faixa {name}: emails não retornados no lote: {compress_uid_ranges(missing)}")
+                return shard, None
+            for uid, raw_email in messages:
+                extracted_fields = processor.process_raw_email(raw_email, normalize=False)
+                if extracted_fields:
+                    records.append(extracted_fields)
+            emails += len(messages)
+        
+        save_checkpoint(path, {'since': shard[0].isoformat(), 'before': shard[1].isoformat(),
+                               'signature': signature, 'emails': emails, 'records': records})
+        logger.info(f"Faixa {name}: {emails} emails, {len(records)} registros")
+        return shard, emails
+    except Exception as e:
+        logger.error(f"Erro na faixa {name} da carga histórica: {str(e)}", exc_info=True)
+        return shard, None
+    finally:
+        if processor.imap_server is not None:
+            processor.close_connection()
+
+
+def _extract_offline_file(path):
+    """Lê um arquivo de email e extrai os campos personalizados (executado nos processos do pool)"""
+    try:
+        with open(path, 'rb') as f:
+            raw_email = f.read()
+        return _worker_processor.process_raw_email(raw_email, normalize=False)
+    except Exception as e:
+        logger.error(f"Erro ao processar arquivo {path}: {str(e)}", exc_info=True)
+        return {}
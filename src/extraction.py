@@ -0,0 +1,295 @@
+import re
+import logging
+from functools import lru_cache
+
+# O módulo regex permite limitar o tempo de cada busca dos padrões personalizados
+import regex
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger('email_extrator')
+
+# Trecho após o rótulo no padrão exato ("Campo: valor") e no flexível ("Campo valor", "Campo : valor")
+EXACT_TAIL_RE = re.compile(r':\s*([^\r\n]+)')
+FLEXIBLE_TAIL_RE = re.compile(r'\s*:?\s*([^\r\n]+)')
+PATTERN_TIMEOUT = 0.5  # Tempo máximo (segundos) de cada busca de padrão personalizado
+REPEAT_OPS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)  # Repetições com backtracking (não possessivas)
+
+# Caracteres usados para comparar classes (\d, \S, [a-z]...) ao verificar se dois trechos podem se sobrepor
+ALPHABET = frozenset(range(0x250))
+CATEGORY_CHARS = {category: frozenset(c for c in ALPHABET if re.match(cls, chr(c)))
+                  for category, cls in ((sre_parse.CATEGORY_DIGIT, r'\d'), (sre_parse.CATEGORY_NOT_DIGIT, r'\D'),
+                                        (sre_parse.CATEGORY_SPACE, r'\s'), (sre_parse.CATEGORY_NOT_SPACE, r'\S'),
+                                        (sre_parse.CATEGORY_WORD, r'\w'), (sre_parse.CATEGORY_NOT_WORD, r'\W'))}
+
+
+def label_pattern(field_name):
+    """Padrão gerado automaticamente a partir do nome do campo ("Campo: valor")"""
+    return r'{}:\s*([^\r\n]+)'.format(re.escape(field_name))
+
+
+def _children(op, av):
+    """Subpadrões de um item da árvore do sre_parse"""
+    if op in REPEAT_OPS or op == getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+        return [av[2]]
+    if op == sre_parse.SUBPATTERN:
+        return [av[-1]]
+    if op == sre_parse.BRANCH:
+        return av[1]
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+    if op == sre_parse.GROUPREF_EXISTS:
+        return [branch for branch in av[1:] if branch is not None]
+    if op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+        return [av]
+    return []
+
+
+def _class_chars(items):
+    """Caracteres aceitos por uma classe [...] (restritos a ALPHABET, exceto literais)"""
+    chars = set()
+    negate = False
+    for op, av in items:
+        if op == sre_parse.NEGATE:
+            negate = True
+        elif op == sre_parse.LITERAL:
+            chars.add(av)
+        elif op == sre_parse.RANGE:
+            chars.update(c for c in ALPHABET if av[0] <= c <= av[1])
+            chars.update(av)
+        else:
+            chars |= CATEGORY_CHARS.get(av, ALPHABET)
+    return ALPHABET - chars if negate else chars
+
+
+def _item_first(op, av):
+    """
+    Caracteres com que um item da árvore pode começar
+
+    Returns:
+        Tupla (conjunto de códigos de caracteres, True se o item puder casar vazio)
+    """
+    if op == sre_parse.LITERAL:
+        return {av}, False
+    if op == sre_parse.NOT_LITERAL:
+        return ALPHABET - {av}, False
+    if op == sre_parse.ANY:
+        return ALPHABET - {ord('\n')}, False
+    if op == sre_parse.IN:
+        return _class_chars(av), False
+    if op == sre_parse.SUBPATTERN:
+        return _first_chars(av[-1]), _nullable(av[-1])
+    if op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+        return _first_chars(av), _nullable(av)
+    if op in REPEAT_OPS or op == getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+        return _first_chars(av[2]), av[0] == 0 or _nullable(av[2])
+    if op in (sre_parse.BRANCH, sre_parse.GROUPREF_EXISTS):
+        alternatives = av[1] if op == sre_parse.BRANCH else av[1:]
+        chars, nullable = set(), False
+        for alternative in alternatives:
+            if alternative is None:
+                nullable = True
+                continue
+            chars |= _first_chars(alternative)
+            nullable = nullable or _nullable(alternative)
+        return chars, nullable
+    if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        # Âncoras e verificações não consomem caracteres
+        return set(), True
+    # Referências a grupos e demais itens: podem começar por qualquer caractere
+    return set(ALPHABET), True
+
+
+def _first_chars(items):
+    """Conjunto de caracteres com que um trecho do padrão pode começar (atravessando os itens que podem ser vazios)"""
+    chars = set()
+    for op, av in items:
+        first, nullable = _item_first(op, av)
+        chars |= first
+        if not nullable:
+            break
+    return chars
+
+
+def _nullable(items):
+    """Indica se um trecho do padrão pode casar com o texto vazio"""
+    return all(_item_first(op, av)[1] for op, av in items)
+
+
+def _overlapping_branches(alternatives):
+    """Alternativas que podem começar pelo mesmo caractere (ou vazias), ex.: (a|a) ou (a|ab)"""
+    seen = set()
+    for alternative in alternatives:
+        chars = _first_chars(alternative)
+        if _nullable(alternative) or chars & seen:
+            return True
+        seen |= chars
+    return False
+
+
+def _ambiguous_sequence(items, follow):
+    """
+    Trecho que pode casar o mesmo texto de várias formas quando seguido por um texto que começa por 'follow'
+
+    Um quantificador de tamanho variável só é ambíguo se o que ele repete puder começar
+    pelo mesmo caractere que vem depois dele (o separador ou, no fim do corpo, o início
+    da próxima repetição): em (\d{1,3}\.)* o ponto separa as repetições e só há uma forma
+    de casar, já em (a+)+ ou (\w+\s?)+ os caracteres podem ser divididos de várias formas.
+    """
+    items = list(items)
+    for index, (op, av) in enumerate(items):
+        rest = items[index + 1:]
+        after = _first_chars(rest) | (follow if _nullable(rest) else set())
+        if op in REPEAT_OPS:
+            body = list(av[2])
+            if av[0] != av[1] and _first_chars(body) & after:
+                return True
+            if _ambiguous_sequence(body, after | _first_chars(body)):
+                return True
+        elif op == sre_parse.BRANCH:
+            if _overlapping_branches(av[1]) or any(_ambiguous_sequence(branch, after) for branch in av[1]):
+                return True
+        elif op == sre_parse.SUBPATTERN:
+            if _ambiguous_sequence(av[-1], after):
+                return True
+    return False
+
+
+def _has_catastrophic_repeat(items):
+    """Repetição sem limite (+, *, {n,}) sobre um trecho ambíguo, ex.: (a+)+, (\w+\s?)+ ou (a|a)*"""
+    for op, av in items:
+        if op in REPEAT_OPS and av[1] == sre_parse.MAXREPEAT and _ambiguous_sequence(av[2], _first_chars(av[2])):
+            return True
+        if any(_has_catastrophic_repeat(child) for child in _children(op, av)):
+            return True
+    return False
+
+
+def validate_pattern(pattern):
+    """
+    Verifica se um padrão personalizado pode ser usado na extração
+
+    Returns:
+        Mensagem de erro, ou None se o padrão for válido
+    """
+    try:
+        compiled = re.compile(pattern)
+        regex.compile(pattern)
+    except (re.error, regex.error) as e:
+        return f"expressão regular inválida ({str(e)})"
+    if compiled.groups > 1:
+        return "o padrão deve ter no máximo um grupo de captura"
+    if _has_catastrophic_repeat(sre_parse.parse(pattern)):
+        return ("grupo repetido com quantificadores ou alternativas sobrepostas (ex.: (a+)+ ou (a|a)*) "
+                "pode travar a extração; use uma classe de caracteres, ex.: [\\d.]+")
+    return None
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern):
+    """Compila (uma única vez) um padrão personalizado com o módulo regex, que aceita limite de tempo"""
+    return regex.compile(pattern)
+
+
+class ExtractionPlan:
+    """
+    Plano de extração compilado para uma lista de nomes de campos
+
+    Em vez de duas buscas no texto inteiro por campo, uma única expressão com
+    todos os rótulos (em alternância, dos mais longos para os mais curtos)
+    localiza cada ocorrência de rótulo em uma só passada. Em cada ocorrência, os
+    trechos exato e flexível são testados com match() ancorado na posição.
+
+    O resultado é o mesmo das buscas separadas: para cada campo vale a primeira
+    ocorrência no formato exato e, se não houver, a primeira no formato flexível.
+
+    Campos com padrão próprio ('pattern' diferente do gerado pelo nome) são
+    buscados primeiro com esse padrão, sob um limite de tempo; se ele não
+    encontrar nada ou estourar o limite, vale o resultado pelo rótulo.
+    """
+
+    def __init__(self, field_names, patterns=None):
+        self.field_names = list(dict.fromkeys(field_names))
+        self.patterns = {}
+        for name, pattern in (patterns or {}).items():
+            if not pattern or pattern == label_pattern(name):
+                continue
+            error = validate_pattern(pattern)
+            if error:
+                logger.warning(f"Padrão do campo '{name}' ignorado: {error}")
+                continue
+            self.patterns[name] = compile_pattern(pattern)
+        labels = sorted((name for name in self.field_names if name), key=len, reverse=True)
+
+        # Quando um rótulo ocorre, todos os rótulos que são prefixo dele ocorrem na mesma posição
+        self.prefixes = {label: [other for other in labels if label.startswith(other)] for label in labels}
+        self.labels_re = re.compile('|'.join(re.escape(label) for label in labels)) if labels else None
+
+    def search(self, text, stats=None, timed_out=None):
+        """
+        Localiza os valores de todos os campos no texto
+
+        Args:
+            stats: Dicionário opcional onde são contadas as buscas de padrão que estouraram o limite ('timeouts')
+            timed_out: Conjunto opcional que recebe os nomes dos campos cujo padrão foi interrompido
+
+        Returns:
+            Dicionário {nome do campo: valor bruto (sem espaços nas pontas) ou None}
+        """
+        exact = {}
+        flexible = {}
+
+        if self.labels_re is not None:
+            pending = len(self.prefixes)
+            match = self.labels_re.search(text)
+            while match:
+                position = match.start()
+                for label in self.prefixes[match.group(0)]:
+                    if label in exact:
+                        continue
+                    end = position + len(label)
+                    tail = EXACT_TAIL_RE.match(text, end)
+                    if tail:
+                        exact[label] = tail.group(1)
+                        pending -= 1
+                    elif label not in flexible:
+                        tail = FLEXIBLE_TAIL_RE.match(text, end)
+                        if tail:
+                            flexible[label] = tail.group(1)
+                if not pending:
+                    break
+                # Recomeçar na posição seguinte para não perder rótulos sobrepostos
+                match = self.labels_re.search(text, position + 1)
+
+        results = {}
+        for name in self.field_names:
+            if not name:
+                # Rótulo vazio: mesmo comportamento das buscas individuais
+                tail = EXACT_TAIL_RE.search(text) or FLEXIBLE_TAIL_RE.search(text)
+                value = tail.group(1) if tail else None
+            else:
+                value = exact.get(name, flexible.get(name))
+            pattern = self.patterns.get(name)
+            if pattern is not None:
+                value = self._search_pattern(name, pattern, text, stats, timed_out) or value
+            results[name] = value.strip() if value is not None else None
+        return results
+
+    def _search_pattern(self, name, pattern, text, stats, timed_out=None):
+        """Aplica o padrão personalizado de um campo respeitando o limite de tempo"""
+        try:
+            match = pattern.search(text, timeout=PATTERN_TIMEOUT)
+        except TimeoutError:
+            logger.warning(f"Padrão do campo '{name}' excedeu {PATTERN_TIMEOUT}s e foi interrompido")
+            if stats is not None:
+                stats['timeouts'] = stats.get('timeouts', 0) + 1
+            if timed_out is not None:
+                timed_out.add(name)
+            return None
+        if not match:
+            return None
+        return match.group(1) if pattern.groups else match.group(0)
@@ -0,0 +1,146 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger('email_extrator')
+
+# Versão da seleção do texto examinado em cada email (EmailProcessor.get_email_content);
+# incrementar ao mudar essa lógica para que os valores guardados sejam extraídos novamente
+CONTENT_SELECTION_VERSION = 1
+
+
+def field_fingerprint(field, max_content_chars=None):
+    """
+    Hash da definição de um campo (nome e padrão) e do texto em que ele é procurado
+
+    O limite de caracteres e a versão da seleção do texto entram no hash: com outro
+    texto examinado, o mesmo padrão pode encontrar outro valor. O formato não entra:
+    o cache guarda o valor bruto, antes da conversão, então mudar o formato de um
+    campo não invalida os resultados.
+    """
+    definition = json.dumps([field["name"], field.get("pattern") or "", CONTENT_SELECTION_VERSION, max_content_chars],
+                            ensure_ascii=False)
+    return hashlib.sha256(definition.encode('utf-8')).hexdigest()[:32]
+
+
+def message_fingerprint(raw_email):
+    """Hash SHA-256 do conteúdo bruto da mensagem (bytes ou memoryview)"""
+    return hashlib.sha256(raw_email).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Cache persistente (SQLite) dos valores extraídos de cada mensagem
+
+    Cada entrada é identificada por (hash da mensagem, hash da definição do campo)
+    e guarda o valor bruto encontrado (ou NULL quando o campo não foi encontrado).
+    Ao reprocessar as mesmas mensagens após acrescentar ou alterar um campo, só
+    os campos novos ou alterados precisam ser extraídos. Quando o número de
+    entradas passa de 'max_entries', as acessadas há mais tempo são removidas.
+
+    As gravações (valores novos e a data de último acesso das entradas lidas) ficam
+    em memória e são gravadas juntas, em uma única transação, a cada 'flush_rows'
+    entradas, na limpeza (evict) e ao fechar o cache: ler uma mensagem do cache não
+    custa uma gravação em disco.
+    """
+
+    def __init__(self, path, max_entries=1000000, flush_rows=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_rows = flush_rows
+        self._lock = threading.Lock()
+        self._pending = {}  # (mensagem, campo) -> valor ainda não gravado
+        self._touched = {}  # (mensagem, campo) -> data do último acesso ainda não gravada
+        # Vários processos do pool podem gravar ao mesmo tempo: aguardar o bloqueio em vez de falhar
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                message TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (message, field)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_access ON extractions (last_access)")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def get_many(self, message, fields):
+        """
+        Busca os valores armazenados de uma mensagem para os hashes de campo informados
+
+        Returns:
+            Dicionário {hash do campo: valor bruto ou None}, apenas com os campos encontrados
+        """
+        fields = list(fields)
+        with self._lock:
+            values = {field: self._pending[(message, field)] for field in fields if (message, field) in self._pending}
+            remaining = [field for field in fields if field not in values]
+            if remaining:
+                placeholders = ','.join('?' * len(remaining))
+                rows = self._conn.execute(
+                    f"SELECT field, value FROM extractions WHERE message = ? AND field IN ({placeholders})",
+                    [message] + remaining).fetchall()
+                now = time.time()
+                for field, value in rows:
+                    values[field] = value
+                    self._touched[(message, field)] = now
+                self._flush_if_full()
+        return values
+
+    def put_many(self, message, values):
+        """Guarda os valores brutos {hash do campo: valor ou None} de uma mensagem (gravados no próximo flush)"""
+        if not values:
+            return
+        with self._lock:
+            for field, value in values.items():
+                self._pending[(message, field)] = value
+                self._touched.pop((message, field), None)
+            self._flush_if_full()
+
+    def flush(self):
+        """Grava os valores e acessos pendentes em uma única transação"""
+        with self._lock:
+            self._flush()
+
+    def _flush_if_full(self):
+        if len(self._pending) + len(self._touched) >= self.flush_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending and not self._touched:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE extractions SET last_access = ? WHERE message = ? AND field = ?",
+            [(last_access, message, field) for (message, field), last_access in self._touched.items()])
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO extractions (message, field, value, last_access) VALUES (?, ?, ?, ?)",
+            [(message, field, value, now) for (message, field), value in self._pending.items()])
+        self._conn.commit()
+        self._pending.clear()
+        self._touched.clear()
+
+    def evict(self):
+        """Remove as entradas menos usadas até o cache caber em max_entries"""
+        with self._lock:
+            self._flush()
+            count = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM extractions WHERE rowid IN "
+                "(SELECT rowid FROM extractions ORDER BY last_access LIMIT ?)", (excess,))
+            self._conn.commit()
+        logger.info(f"Cache de extração: {excess} entradas removidas (LRU)")
+        return excess
@@ -0,0 +1,84 @@
+import re
+from html.parser import HTMLParser
+
+# Tags que iniciam uma nova linha no texto (blocos, quebras e linhas de tabela)
+BLOCK_TAGS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'br', 'caption', 'dd', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li',
+    'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'tbody', 'tfoot', 'thead', 'tr', 'ul',
+])
+# Células de tabela ficam na mesma linha, separadas por espaço ("Campo  valor")
+CELL_TAGS = frozenset(['td', 'th'])
+# Conteúdo que não é texto visível
+SKIP_TAGS = frozenset(['head', 'script', 'style', 'template', 'title'])
+
+SPACES_RE = re.compile(r'[^\S\n]+')
+BLANK_LINES_RE = re.compile(r' ?\n[\s]*')
+
+# Tamanho dos blocos entregues ao parser; permite parar cedo ao atingir o limite de texto
+FEED_CHUNK_SIZE = 64 * 1024
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Converte HTML em texto simples, mantendo uma linha por bloco (parágrafo, div, linha de tabela)"""
+
+    def __init__(self, max_chars=None):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.skip_depth = 0
+
+    @property
+    def full(self):
+        return self.max_chars is not None and self.length >= self.max_chars
+
+    def _append(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._append('\n')
+        elif tag in CELL_TAGS:
+            self._append(' ')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._append('\n')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self._append(data)
+
+    def get_text(self):
+        text = SPACES_RE.sub(' ', ''.join(self.parts))
+        text = BLANK_LINES_RE.sub('\n', text).strip()
+        if self.max_chars is not None:
+            text = text[:self.max_chars]
+        return text
+
+
+def html_to_text(html, max_chars=None):
+    """
+    Converte um documento HTML em texto simples com html.parser
+
+    O HTML é entregue ao parser em blocos e a conversão termina assim que o texto
+    atinge 'max_chars' caracteres, sem processar o restante do documento.
+    """
+    parser = HTMLTextExtractor(max_chars)
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        if parser.full:
+            break
+    else:
+        parser.close()
+    return parser.get_text()
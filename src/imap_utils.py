@@ -0,0 +1,377 @@
+import re
+import ssl
+import select
+import time
+from datetime import date, datetime
+
+# Cabeçalho de uma resposta FETCH: "<seq> (" no início da linha
+FETCH_START_RE = re.compile(rb'^\d+ \(')
+# Item de dados que precede um literal, ex.: "RFC822 {1234}" ou "BODY[1.2] {56}"
+FETCH_LITERAL_RE = re.compile(rb'([A-Z0-9.]+(?:\[[^\]]*\])?(?:<\d+>)?) \{\d+\}$', re.IGNORECASE)
+FETCH_UID_RE = re.compile(rb'UID (\d+)', re.IGNORECASE)
+# Itens de uma resposta ESEARCH (RFC 4731), ex.: "MIN 1 MAX 90 COUNT 42 ALL 1:5,9,20:90"
+ESEARCH_ITEM_RE = re.compile(r'\b(MIN|MAX|COUNT|ALL) ([\d:,]+)', re.IGNORECASE)
+
+# Nomes dos meses no formato de data do IMAP (independente do locale)
+IMAP_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def to_uid_list(email_ids):
+    """Converte a lista de IDs (bytes, str ou int) em inteiros ordenados e sem repetição"""
+    uids = set()
+    for email_id in email_ids:
+        if isinstance(email_id, bytes):
+            email_id = email_id.decode('ascii')
+        uids.add(int(email_id))
+    return sorted(uids)
+
+
+def compress_uid_ranges(email_ids):
+    """
+    Compacta uma lista de UIDs em um conjunto de sequência IMAP
+
+    Ex.: [1, 2, 3, 5, 7, 8] -> "1:3,5,7:8"
+    """
+    uids = to_uid_list(email_ids)
+    if not uids:
+        return ""
+
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid == prev + 1:
+            prev = uid
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = uid
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def expand_uid_ranges(uid_set):
+    """
+    Expande um conjunto de sequência IMAP em uma lista de UIDs
+
+    Ex.: "1:3,5,8:7" -> [1, 2, 3, 5, 7, 8]
+    """
+    uids = []
+    for part in uid_set.split(','):
+        if not part:
+            continue
+        start, _, end = part.partition(':')
+        start = int(start)
+        end = int(end) if end else start
+        uids.extend(range(min(start, end), max(start, end) + 1))
+    return uids
+
+
+def parse_date(value):
+    """Converte uma data (date, datetime, "dd/mm/aaaa" ou "aaaa-mm-dd") em date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for date_format in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida para a busca: '{text}' (use dd/mm/aaaa)")
+
+
+def imap_date(value):
+    """
+    Converte uma data (date, "dd/mm/aaaa" ou "aaaa-mm-dd") no formato das buscas IMAP
+
+    Ex.: "05/03/2024" -> "5-Mar-2024"
+    """
+    value = parse_date(value)
+    return f"{value.day}-{IMAP_MONTHS[value.month - 1]}-{value.year}"
+
+
+def imap_quote(text):
+    """
+    Formata um texto como string entre aspas de um comando IMAP
+
+    Returns:
+        String entre aspas, ou None se o texto tiver caracteres fora do ASCII
+        (que só podem ser enviados como literal)
+    """
+    if not text.isascii() or '\r' in text or '\n' in text:
+        return None
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def or_criteria(criteria):
+    """
+    Combina critérios de busca com OR (o OR do IMAP recebe exatamente dois operandos)
+
+    Ex.: ['A', 'B', 'C'] -> "OR OR A B C"
+    """
+    if not criteria:
+        return ""
+    combined = criteria[0]
+    for criterion in criteria[1:]:
+        combined = f"OR {combined} {criterion}"
+    return combined
+
+
+def parse_search_response(data):
+    """
+    UIDs de uma resposta SEARCH do imaplib, ignorando o "(MODSEQ n)" final
+
+    Com CONDSTORE, uma busca com o critério MODSEQ termina com o maior MODSEQ das
+    mensagens encontradas (RFC 7162), ex.: b"4 5 (MODSEQ 7)" -> [4, 5].
+    """
+    if not data or not data[0]:
+        return []
+    return to_uid_list(data[0].split(b'(', 1)[0].split())
+
+
+def parse_esearch_response(data):
+    """
+    Interpreta a resposta ESEARCH de um UID SEARCH RETURN (MIN MAX COUNT ALL)
+
+    Returns:
+        Dicionário com 'min', 'max' e 'count' (inteiros ou None) e 'uids' (lista expandida de ALL)
+    """
+    result = {'min': None, 'max': None, 'count': 0, 'uids': []}
+    for line in data or []:
+        if line is None:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode('ascii', errors='replace')
+        for name, value in ESEARCH_ITEM_RE.findall(line):
+            name = name.lower()
+            if name == 'all':
+                result['uids'].extend(expand_uid_ranges(value))
+            else:
+                result[name] = int(value)
+    return result
+
+
+def chunked(items, size):
+    """Divide uma lista em blocos de tamanho máximo 'size'"""
+    size = max(1, int(size))
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def parse_fetch_response(data):
+    """
+    Interpreta a resposta de um comando (UID) FETCH do imaplib
+
+    O imaplib devolve uma lista misturando tuplas (cabeçalho, literal) e bytes
+    soltos. Uma mesma mensagem pode ocupar vários elementos quando pedimos
+    mais de um item com literal (ex.: BODY[1] e BODY[2]).
+
+    Returns:
+        Lista de dicionários no formato {'uid': int, 'items': {nome: bytes}, 'meta': bytes},
+        onde 'meta' reúne o texto fora dos literais (UID, FLAGS, BODYSTRUCTURE...)
+    """
+    messages = []
+    current = None
+
+    for element in data or []:
+        if element is None:
+            continue
+
+        if isinstance(element, tuple):
+            header, literal = element[0], element[1]
+        else:
+            header, literal = element, None
+
+        if FETCH_START_RE.match(header):
+            current = {'uid': None, 'items': {}, 'meta': b''}
+            messages.append(current)
+        elif current is None:
+            continue
+
+        if literal is not None:
+            match = FETCH_LITERAL_RE.search(header)
+            if match:
+                current['items'][match.group(1).decode('ascii').upper()] = literal
+                header = header[:match.start()]
+        current['meta'] += header + b' '
+
+    results = []
+    for message in messages:
+        match = FETCH_UID_RE.search(message['meta'])
+        if not match:
+            # Respostas FETCH não solicitadas (ex.: mudança de flags) não trazem UID
+            continue
+        message['uid'] = int(match.group(1))
+        results.append(message)
+    return results
+
+
+def parse_imap_list(data, start=0):
+    """
+    Interpreta uma lista IMAP entre parênteses (ex.: BODYSTRUCTURE) a partir de 'start'
+
+    Strings viram str, NIL vira None e listas aninhadas viram listas Python.
+
+    Returns:
+        Tupla (valor interpretado, posição seguinte ao fim da lista)
+    """
+    stack = []
+    current = None
+    i = start
+    length = len(data)
+
+    while i < length:
+        char = data[i:i + 1]
+        if char == b'(':
+            new_list = []
+            if current is not None:
+                current.append(new_list)
+                stack.append(current)
+            current = new_list
+            i += 1
+        elif char == b')':
+            i += 1
+            if not stack:
+                return current, i
+            current = stack.pop()
+        elif char == b'"':
+            i += 1
+            value = bytearray()
+            while i < length and data[i:i + 1] != b'"':
+                if data[i:i + 1] == b'\\':
+                    i += 1
+                value += data[i:i + 1]
+                i += 1
+            i += 1
+            current.append(bytes(value).decode('utf-8', errors='replace'))
+        elif char in (b' ', b'\r', b'\n'):
+            i += 1
+        else:
+            end = i
+            while end < length and data[end:end + 1] not in (b' ', b'(', b')', b'\r', b'\n'):
+                end += 1
+            atom = data[i:end].decode('ascii', errors='replace')
+            if current is None:
+                return atom, end
+            current.append(None if atom.upper() == 'NIL' else atom)
+            i = end
+
+    return current, i
+
+
+def get_bodystructure(meta):
+    """Extrai e interpreta o BODYSTRUCTURE contido no texto de uma resposta FETCH"""
+    position = meta.upper().find(b'BODYSTRUCTURE ')
+    if position < 0:
+        return None
+    structure, _ = parse_imap_list(meta, position + len(b'BODYSTRUCTURE '))
+    return structure
+
+
+def _body_params(params):
+    """Converte a lista de parâmetros ("CHARSET" "utf-8" ...) em dicionário"""
+    if not isinstance(params, list):
+        return {}
+    return {str(params[i]).lower(): params[i + 1] for i in range(0, len(params) - 1, 2)}
+
+
+def find_text_sections(structure, prefix=''):
+    """
+    Localiza as partes text/plain e text/html de um BODYSTRUCTURE, ignorando anexos
+
+    Returns:
+        Lista de dicionários {'section', 'subtype', 'charset', 'encoding'} na ordem da mensagem
+    """
+    if not isinstance(structure, list) or not structure:
+        return []
+
+    # Multipart: as subpartes vêm primeiro, seguidas do subtipo
+    if isinstance(structure[0], list):
+        sections = []
+        number = 0
+        for subpart in structure:
+            if not isinstance(subpart, list):
+                break
+            number += 1
+            section = f"{prefix}.{number}" if prefix else str(number)
+            sections.extend(find_text_sections(subpart, section))
+        return sections
+
+    if len(structure) < 7:
+        return []
+
+    maintype = str(structure[0] or '').lower()
+    subtype = str(structure[1] or '').lower()
+    if maintype != 'text' or subtype not in ('plain', 'html'):
+        return []
+
+    params = _body_params(structure[2])
+    # Extensões de partes text: md5 (9º), disposição (10º)
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and str(disposition[0] or '').lower() == 'attachment':
+        return []
+    if 'name' in params:
+        return []
+
+    return [{
+        'section': prefix or '1',
+        'subtype': subtype,
+        'charset': params.get('charset'),
+        'encoding': str(structure[5] or '7bit').lower(),
+    }]
+
+
+class SocketLineReader:
+    """
+    Lê linhas diretamente do socket da conexão IMAP com timeout
+
+    Usado durante o IDLE, quando a conexão fica aguardando notificações do servidor
+    por muitos minutos. O arquivo interno do imaplib fica inutilizável após um
+    timeout de leitura, por isso a espera é feita com select() no socket.
+
+    O select() não enxerga o que o imaplib já leu do socket e guardou no buffer do
+    seu arquivo (ex.: um "* N EXISTS" recebido junto com a resposta do último
+    comando). Esses bytes devem ser retirados com take_buffered_bytes e passados
+    em 'buffered', para serem lidos antes do socket.
+    """
+
+    def __init__(self, sock, buffered=b''):
+        self.sock = sock
+        self.buffer = buffered
+
+    def readline(self, timeout):
+        """Retorna a próxima linha ou None se nada chegar dentro de 'timeout' segundos"""
+        deadline = time.monotonic() + timeout
+        while b'\n' not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Sockets SSL podem ter dados já decifrados que o select() não enxerga
+            pending = self.sock.pending() if hasattr(self.sock, 'pending') else 0
+            if not pending:
+                readable, _, _ = select.select([self.sock], [], [], remaining)
+                if not readable:
+                    return None
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise EOFError("Conexão encerrada pelo servidor")
+            self.buffer += chunk
+        line, _, self.buffer = self.buffer.partition(b'\n')
+        return line + b'\n'
+
+
+def take_buffered_bytes(file, sock):
+    """
+    Retira, sem bloquear, os bytes já lidos pelo imaplib e guardados no buffer do arquivo da conexão
+
+    Com o socket temporariamente não bloqueante, read1() devolve o conteúdo do buffer
+    (ou o que já estiver disponível no socket) e retorna vazio em vez de esperar.
+    """
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        return file.read1(65536) or b''
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return b''
+    finally:
+        sock.settimeout(timeout)
@@ -0,0 +1,136 @@
+import os
+import json
+import mmap
+import time
+import logging
+from array import array
+
+logger = logging.getLogger('email_extrator')
+
+INDEX_MAGIC = b'MBOXIDX1'
+
+
+class MboxIndex:
+    """
+    Índice das mensagens de um arquivo mbox, lido via mmap
+
+    Uma única varredura registra a posição inicial e final de cada mensagem; o
+    índice é gravado ao lado do arquivo (<arquivo>.idx) e reaproveitado enquanto o
+    tamanho e a data de modificação do mbox não mudarem. As mensagens são entregues
+    como fatias memoryview do mmap, sem copiar o arquivo para a memória.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or f"{path}.idx"
+        self.offsets = array('Q')  # Pares (início do corpo, fim) de cada mensagem
+        self._file = None
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.offsets) // 2
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """Mapeia o arquivo em memória e carrega (ou constrói) o índice"""
+        self._file = open(self.path, 'rb')
+        if os.path.getsize(self.path) > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if not self._load_index():
+            self.build()
+            self._save_index()
+        return self
+
+    def close(self):
+        """Libera o mmap e o arquivo"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _source_signature(self):
+        stat = os.stat(self.path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def _load_index(self):
+        """Carrega o índice salvo se ele corresponder ao arquivo atual"""
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, 'rb') as f:
+                if f.readline().rstrip(b'\n') != INDEX_MAGIC:
+                    return False
+                meta = json.loads(f.readline())
+                if meta != self._source_signature():
+                    logger.info(f"Índice do mbox desatualizado, reconstruindo: {self.index_path}")
+                    return False
+                offsets = array('Q')
+                offsets.frombytes(f.read())
+            self.offsets = offsets
+            logger.info(f"Índice do mbox carregado: {len(self)} mensagens")
+            return True
+        except Exception as e:
+            logger.warning(f"Não foi possível ler o índice do mbox {self.index_path}: {str(e)}")
+            return False
+
+    def _save_index(self):
+        try:
+            with open(self.index_path, 'wb') as f:
+                f.write(INDEX_MAGIC + b'\n')
+                f.write(json.dumps(self._source_signature()).encode('ascii') + b'\n')
+                f.write(self.offsets.tobytes())
+        except Exception as e:
+            logger.warning(f"Não foi possível salvar o índice do mbox {self.index_path}: {str(e)}")
+
+    def build(self):
+        """Varre o mbox uma vez procurando as linhas separadoras 'From '"""
+        start_time = time.monotonic()
+        offsets = array('Q')
+        data = self._mmap
+        size = len(data) if data is not None else 0
+
+        # Posição da primeira linha "From " (início do arquivo ou após uma quebra de linha)
+        if size == 0:
+            position = -1
+        elif data[:5] == b'From ':
+            position = 0
+        else:
+            found = data.find(b'\nFrom ')
+            position = found + 1 if found >= 0 else -1
+
+        while position >= 0:
+            next_separator = data.find(b'\nFrom ', position)
+            end = next_separator + 1 if next_separator >= 0 else size
+            # O corpo começa depois da linha "From " do envelope
+            body_start = data.find(b'\n', position, end)
+            body_start = body_start + 1 if body_start >= 0 else end
+            offsets.append(body_start)
+            offsets.append(end)
+            position = next_separator + 1 if next_separator >= 0 else -1
+
+        self.offsets = offsets
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        logger.info(f"Índice do mbox construído: {len(self)} mensagens em {elapsed:.1f}s "
+                    f"({size / elapsed / 1024 / 1024:.1f} MB/s)")
+        return len(self)
+
+    def ranges(self):
+        """Lista de tuplas (início, fim) de cada mensagem"""
+        return [(self.offsets[i], self.offsets[i + 1]) for i in range(0, len(self.offsets), 2)]
+
+    def message(self, number):
+        """Retorna a mensagem 'number' como memoryview do mmap (sem cópia)"""
+        start, end = self.offsets[number * 2], self.offsets[number * 2 + 1]
+        return self.slice(start, end)
+
+    def slice(self, start, end):
+        """Retorna o trecho [start, end) do arquivo como memoryview do mmap"""
+        return memoryview(self._mmap)[start:end]
@@ -0,0 +1,151 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger('email_extrator')
+
+
+class MessageStore:
+    """
+    Armazenamento local das mensagens brutas buscadas no servidor (SQLite)
+
+    Cada mensagem é identificada por (caixa, UIDVALIDITY, UID, tipo), onde o tipo
+    indica o modo de busca ('rfc822' para a mensagem completa ou 'bodystructure'
+    para a versão reduzida às partes de texto). O hash SHA-256 do conteúdo é
+    guardado junto. Quando o tamanho total passa de 'max_bytes', as mensagens
+    acessadas há mais tempo são removidas (LRU).
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                mailbox TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uid INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (mailbox, uidvalidity, uid, kind)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_last_access ON messages (last_access)")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_many(self, mailbox, uidvalidity, uids, kind='rfc822'):
+        """Retorna {uid: bytes} das mensagens encontradas e atualiza o último acesso"""
+        found = {}
+        uids = list(uids)
+        with self._lock:
+            # Consultar em blocos para respeitar o limite de parâmetros do SQLite
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT uid, data FROM messages WHERE mailbox = ? AND uidvalidity = ? AND kind = ? "
+                    f"AND uid IN ({placeholders})",
+                    [mailbox, uidvalidity, kind] + chunk).fetchall()
+                for uid, data in rows:
+                    found[uid] = bytes(data)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE messages SET last_access = ? WHERE mailbox = ? AND uidvalidity = ? AND kind = ? "
+                        f"AND uid IN ({placeholders})",
+                        [time.time(), mailbox, uidvalidity, kind] + chunk)
+            self._conn.commit()
+        return found
+
+    def find(self, mailbox, uidvalidity, uids, kind='rfc822'):
+        """Retorna o conjunto dos UIDs informados que já estão armazenados (sem ler o conteúdo)"""
+        found = set()
+        uids = list(uids)
+        with self._lock:
+            for i in range(0, len(uids), 500):
+                chunk = uids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT uid FROM messages WHERE mailbox = ? AND uidvalidity = ? AND kind = ? "
+                    f"AND uid IN ({placeholders})",
+                    [mailbox, uidvalidity, kind] + chunk).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def get(self, mailbox, uidvalidity, uid, kind='rfc822'):
+        """Retorna os bytes de uma mensagem ou None se não estiver armazenada"""
+        return self.get_many(mailbox, uidvalidity, [uid], kind).get(uid)
+
+    def put_many(self, mailbox, uidvalidity, messages, kind='rfc822'):
+        """Armazena uma lista de tuplas (uid, bytes) em uma única transação"""
+        now = time.time()
+        rows = [(mailbox, uidvalidity, uid, kind, hashlib.sha256(data).hexdigest(), len(data), data, now)
+                for uid, data in messages]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (mailbox, uidvalidity, uid, kind, sha256, size, data, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def list_uids(self, mailbox, uidvalidity=None, kind='rfc822'):
+        """
+        Lista os UIDs armazenados de uma caixa de correio
+
+        Sem UIDVALIDITY informado, usa o mais recente armazenado para a caixa.
+
+        Returns:
+            Tupla (uidvalidity, lista de UIDs em ordem crescente)
+        """
+        with self._lock:
+            if uidvalidity is None:
+                row = self._conn.execute(
+                    "SELECT uidvalidity FROM messages WHERE mailbox = ? AND kind = ? "
+                    "ORDER BY last_access DESC LIMIT 1", (mailbox, kind)).fetchone()
+                if row is None:
+                    return None, []
+                uidvalidity = row[0]
+            rows = self._conn.execute(
+                "SELECT uid FROM messages WHERE mailbox = ? AND uidvalidity = ? AND kind = ? ORDER BY uid",
+                (mailbox, uidvalidity, kind)).fetchall()
+        return uidvalidity, [row[0] for row in rows]
+
+    def total_size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+
+    def evict(self):
+        """Remove as mensagens menos usadas até o armazenamento caber em max_bytes"""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT mailbox, uidvalidity, uid, kind, size FROM messages ORDER BY last_access").fetchall()
+            for mailbox, uidvalidity, uid, kind, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute(
+                    "DELETE FROM messages WHERE mailbox = ? AND uidvalidity = ? AND uid = ? AND kind = ?",
+                    (mailbox, uidvalidity, uid, kind))
+                total -= size
+                removed += 1
+            self._conn.commit()
+
+        logger.info(f"Armazenamento local: {removed} mensagens removidas (LRU), {total / 1024 / 1024:.1f} MB em uso")
+        return removed
+
@@ -0,0 +1,147 @@
+from collections import deque
+from itertools import repeat
+from operator import itemgetter
+
+import numpy as np
+
+# Caracteres removidos dos números: R, $ e espaços (os mesmos de [R$\s]), exceto a quebra de linha,
+# usada para juntar a coluna em um único texto
+_NUMBER_STRIP_TABLE = str.maketrans('', '', 'R$' + ''.join(
+    chr(code) for code in range(0x3001) if chr(code).isspace() and chr(code) != '\n'))
+
+# Operações vetorizadas sobre arrays de texto (numpy >= 2.0)
+_np_strings = getattr(np, 'strings', None)
+
+
+def normalize_number_column(values):
+    """
+    Converte de uma só vez uma coluna de valores no formato brasileiro (ex.: "R$ 1.234,56") em números
+
+    Mesmas regras de EmailProcessor.process_value: remove R$, $ e espaços; havendo
+    vírgula, os pontos são separadores de milhar e a vírgula é o separador decimal.
+
+    Returns:
+        Tupla (lista de valores convertidos, lista de índices que não puderam ser
+        convertidos). Valores vazios continuam vazios e as falhas mantêm o texto original.
+    """
+    values = _as_text(values)
+    joined = '\n'.join(values)
+    if _np_strings is None or joined.count('\n') != len(values) - 1:
+        # Sem numpy >= 2.0 (ou com quebras de linha nos valores): converter valor a valor
+        cleaned = [value.translate(_NUMBER_STRIP_TABLE).replace('\n', '') for value in values]
+        cleaned = [value.replace('.', '').replace(',', '.') if ',' in value else value for value in cleaned]
+        return _to_float(values, np.array(cleaned, dtype=object))
+
+    cleaned = np.array(joined.translate(_NUMBER_STRIP_TABLE).split('\n'))
+    decimal_comma = _np_strings.find(cleaned, ',') >= 0
+    cleaned = np.where(decimal_comma,
+                       _np_strings.replace(_np_strings.replace(cleaned, '.', ''), ',', '.'),
+                       cleaned)
+    return _to_float(values, cleaned)
+
+
+def _as_text(values):
+    """Garante uma lista de textos (os valores extraídos já são texto; None vira vazio)"""
+    values = list(values)
+    try:
+        # join() falha com qualquer valor que não seja texto, sem um laço em Python
+        ''.join(values)
+        return values
+    except TypeError:
+        return ['' if value is None else str(value) for value in values]
+
+
+def _to_float(values, cleaned):
+    """Converte o array de textos já limpos em float, separando vazios e falhas"""
+    empty = [index for index, value in enumerate(values) if not value]
+    cleaned[empty] = '0'
+    try:
+        # astype(float) usa a mesma conversão de float(), linha a linha apenas em C
+        numbers = cleaned.astype(np.float64).tolist()
+        failed = []
+    except ValueError:
+        numbers, failed = [], []
+        for index, value in enumerate(cleaned.tolist()):
+            try:
+                numbers.append(float(value))
+            except ValueError:
+                numbers.append(values[index])
+                failed.append(index)
+
+    for index in empty:
+        numbers[index] = values[index]
+    return numbers, failed
+
+
+def normalize_date_column(values):
+    """
+    Converte de uma só vez uma coluna de datas dd/mm/aaaa em texto no formato aaaa-mm-dd
+
+    Valores sem barra continuam como estão; valores com barra fora do formato são falhas.
+
+    Returns:
+        Tupla (lista de valores convertidos, lista de índices que não puderam ser convertidos)
+    """
+    values = _as_text(values)
+    if _np_strings is None:
+        parts = [value.split('/') for value in values]
+        converted = [f"{p[2]}-{p[1].zfill(2)}-{p[0].zfill(2)}" if len(p) == 3 else value
+                     for p, value in zip(parts, values)]
+        failed = [index for index, p in enumerate(parts) if len(p) not in (1, 3)]
+        return converted, failed
+
+    text = np.array(values)
+    day, first_slash, rest = _np_strings.partition(text, '/')
+    month, second_slash, year = _np_strings.partition(rest, '/')
+    has_slash = first_slash != ''
+    valid = (second_slash != '') & (_np_strings.find(year, '/') < 0)
+
+    converted = _np_strings.add(_np_strings.add(_np_strings.add(year, '-'), _np_strings.zfill(month, 2)),
+                                _np_strings.add('-', _np_strings.zfill(day, 2)))
+    result = np.where(valid, converted, text).tolist()
+    failed = np.flatnonzero(has_slash & ~valid).tolist()
+    return result, failed
+
+
+def normalize_records(records, custom_fields):
+    """
+    Converte os valores brutos dos campos "número" e "data" de uma lista de registros, coluna a coluna
+
+    Os registros (dicionários) são atualizados no lugar.
+
+    Returns:
+        Lista de falhas no formato (índice do registro, nome do campo, valor)
+    """
+    failures = []
+    if not records:
+        return failures
+
+    for field in custom_fields:
+        field_name = field["name"]
+        field_format = field.get("format", "texto")
+        if field_format == "número":
+            normalize = normalize_number_column
+        elif field_format == "data":
+            normalize = normalize_date_column
+        else:
+            continue
+
+        try:
+            column = list(map(itemgetter(field_name), records))
+        except KeyError:
+            column = None
+
+        if column is not None:
+            converted, failed = normalize(column)
+            # Gravar a coluna convertida de volta nos registros sem um laço em Python
+            deque(map(dict.__setitem__, records, repeat(field_name), converted), maxlen=0)
+        else:
+            # Algum registro sem o campo: montar a coluna registro a registro
+            column = [record.get(field_name, "") for record in records]
+            converted, failed = normalize(column)
+            for record, value in zip(records, converted):
+                if field_name in record:
+                    record[field_name] = value
+        failures.extend((index, field_name, column[index]) for index in failed)
+
+    return failures
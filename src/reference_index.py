@@ -0,0 +1,235 @@
+import os
+import re
+import time
+import numbers
+import pickle
+import logging
+
+from datetime import date
+
+import openpyxl
+import pandas as pd
+
+logger = logging.getLogger('email_extrator')
+
+DUPLICATE_POLICIES = ('first', 'last')
+STREAMING_EXTENSIONS = ('.xlsx', '.xlsm')  # Formatos lidos linha a linha pelo openpyxl
+STREAM_LOG_INTERVAL = 50000  # Linhas lidas entre os registros de progresso no log
+
+# Chave só com dígitos e separadores (ex.: número CNJ "0001234-56.2023.8.24.0033")
+NUMERIC_KEY_RE = re.compile(r'[\d\s./-]*\d[\d\s./-]*')
+NON_DIGITS_RE = re.compile(r'\D+')
+SPACES_RE = re.compile(r'\s+')
+
+
+def is_missing_key(key):
+    """Chave vazia: None, NaN (célula vazia lida pelo pandas) ou texto em branco"""
+    return key is None or key != key or (isinstance(key, str) and not key.strip())
+
+
+def normalize_key(key):
+    """
+    Forma canônica de uma chave, para comparar valores extraídos com células do Excel
+
+    - Números e textos só com dígitos e separadores (ex.: número CNJ): apenas os
+      dígitos, sem zeros à esquerda ("0001234-56.2023.8.24.0033", "00012345620238240033"
+      e a célula numérica 12345620238240033 viram "12345620238240033")
+    - Datas: dígitos aaaammdd, a mesma forma do texto "aaaa-mm-dd" dos campos do tipo data
+    - Números não inteiros: o próprio número como texto (ex.: "3.5")
+    - Demais textos: sem espaços nas pontas, espaços internos simples e sem
+      distinção de maiúsculas
+
+    Returns:
+        Texto normalizado, ou None para chaves vazias
+    """
+    if is_missing_key(key):
+        return None
+    if isinstance(key, numbers.Number) and not isinstance(key, bool):
+        if isinstance(key, numbers.Integral) or float(key).is_integer():
+            return str(abs(int(key)))
+        return str(float(key))
+    if isinstance(key, date):
+        return key.strftime('%Y%m%d')
+
+    key = str(key)
+    if NUMERIC_KEY_RE.fullmatch(key):
+        return NON_DIGITS_RE.sub('', key).lstrip('0') or '0'
+    return SPACES_RE.sub(' ', key.strip()).casefold()
+
+
+class ReferenceIndex:
+    """
+    Índice em memória das linhas do Excel de referência, pelo valor do campo chave
+
+    Cada chave aponta para a tupla de valores dos campos adicionais, de modo que
+    cada busca é uma consulta a um dicionário, em vez de comparar a coluna inteira.
+    As chaves são guardadas na forma de normalize_key, calculada uma única vez por
+    linha ao montar o índice. Com chaves que coincidem após a normalização, vale a
+    primeira linha ('first') ou a última ('last').
+    """
+
+    def __init__(self, fields, duplicates='first'):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"Política de chaves repetidas inválida: '{duplicates}' (use 'first' ou 'last')")
+        self.fields = list(fields)
+        self.duplicates = duplicates
+        self.rows = {}
+        self.duplicate_keys = 0  # Linhas descartadas por repetirem uma chave
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def from_dataframe(cls, df, key_field, fields, duplicates='first'):
+        """Monta o índice a partir de um DataFrame, descartando as linhas sem chave"""
+        index = cls(fields, duplicates)
+        keys = pd.Series([normalize_key(key) for key in df[key_field].tolist()], index=df.index, dtype=object)
+        valid = keys.notna()
+        keys = keys[valid]
+        duplicated = keys.duplicated(keep=duplicates)
+        index.duplicate_keys = int(duplicated.sum())
+        unique = ~duplicated
+        index.rows = dict(zip(keys[unique].tolist(),
+                              df.loc[valid, index.fields][unique].itertuples(index=False, name=None)))
+        return index
+
+    def add(self, key, values):
+        """Acrescenta uma linha ao índice, respeitando a política de chaves repetidas"""
+        key = normalize_key(key)
+        if key is None:
+            return
+        if key in self.rows:
+            self.duplicate_keys += 1
+            if self.duplicates == 'first':
+                return
+        self.rows[key] = tuple(values)
+
+    def get(self, key):
+        """
+        Busca os campos adicionais de uma chave (comparada na forma de normalize_key)
+
+        Returns:
+            Dicionário {campo adicional: valor}, ou None se a chave não estiver no índice
+        """
+        row = self.rows.get(normalize_key(key))
+        if row is None:
+            return None
+        return dict(zip(self.fields, row))
+
+
+def snapshot_path(path):
+    """Arquivo do snapshot de um Excel de referência, ao lado do original (ex.: "registro.xlsx.snapshot.pkl")"""
+    return f"{path}.snapshot.pkl"
+
+
+def stream_reference_excel(path, key_field, fields, duplicates='first'):
+    """
+    Lê um .xlsx linha a linha (openpyxl em modo read_only), guardando apenas as colunas usadas
+
+    Só o intervalo de colunas entre o campo chave e os campos adicionais é
+    percorrido, e o índice é montado durante a leitura, de modo que a memória
+    ocupada é proporcional às colunas selecionadas, e não à planilha inteira.
+    A velocidade de leitura (linhas/s) é informada no log.
+
+    Returns:
+        Tupla (ReferenceIndex, dicionário {coluna: lista de valores}) apenas com as
+        colunas encontradas no cabeçalho; o índice é None se alguma coluna faltar
+    """
+    wanted = list(dict.fromkeys([key_field] + list(fields)))
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Mesma planilha e cabeçalho usados pelo pandas.read_excel: a primeira aba, primeira linha
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        positions = {}
+        for position, name in enumerate(header):
+            if name in wanted and name not in positions:
+                positions[name] = position
+        names = [name for name in wanted if name in positions]
+        columns = {name: [] for name in names}
+        if not names:
+            return None, columns
+
+        first = min(positions.values())
+        offsets = [positions[name] - first for name in names]
+        index = ReferenceIndex(fields, duplicates) if len(names) == len(wanted) else None
+        key_offset = names.index(key_field) if index is not None else None
+        field_offsets = [names.index(name) for name in fields] if index is not None else []
+        column_lists = [columns[name] for name in names]
+
+        rows = 0
+        start_time = time.monotonic()
+        for row in sheet.iter_rows(min_row=2, min_col=first + 1, max_col=max(positions.values()) + 1,
+                                   values_only=True):
+            values = [row[offset] for offset in offsets]
+            if all(value is None for value in values):
+                continue
+            for column, value in zip(column_lists, values):
+                column.append(value)
+            if index is not None:
+                index.add(values[key_offset], [values[offset] for offset in field_offsets])
+            rows += 1
+            if rows % STREAM_LOG_INTERVAL == 0:
+                rate = rows / max(time.monotonic() - start_time, 1e-6)
+                logger.info(f"Lendo arquivo de referência: {rows} linhas ({rate:.0f} linhas/s)")
+
+        rate = rows / max(time.monotonic() - start_time, 1e-6)
+        logger.info(f"Arquivo de referência lido: {rows} linhas ({rate:.0f} linhas/s)")
+        return index, columns
+    finally:
+        workbook.close()
+
+
+def load_reference_excel(path, key_field, fields, duplicates='first', use_snapshot=True):
+    """
+    Carrega do Excel de referência o campo chave e os campos adicionais, já indexados pela chave
+
+    Enquanto a data de modificação e o tamanho do Excel (e a lista de colunas) não
+    mudarem, as colunas são lidas de um snapshot binário (pickle) gravado ao lado do
+    arquivo original. Sem snapshot válido, arquivos .xlsx/.xlsm são lidos linha a
+    linha por stream_reference_excel; outros formatos, pelo pandas.
+
+    Returns:
+        Tupla (DataFrame apenas com as colunas encontradas, ReferenceIndex ou None se
+        alguma coluna não existir no arquivo)
+    """
+    fields = list(fields)
+    columns = list(dict.fromkeys([key_field] + fields))
+    stat = os.stat(path)
+    signature = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'columns': columns}
+    cache_path = snapshot_path(path)
+
+    if use_snapshot:
+        try:
+            with open(cache_path, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('signature') == signature:
+                logger.info(f"Dados de referência lidos do snapshot {cache_path}")
+                df = snapshot['data']
+                return df, ReferenceIndex.from_dataframe(df, key_field, fields, duplicates)
+            logger.info(f"Arquivo de referência alterado, snapshot {cache_path} será refeito")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Snapshot {cache_path} ignorado: {str(e)}")
+
+    if os.path.splitext(path)[1].lower() in STREAMING_EXTENSIONS:
+        index, data = stream_reference_excel(path, key_field, fields, duplicates)
+        df = pd.DataFrame(data, columns=list(data))
+    else:
+        wanted = set(columns)
+        df = pd.read_excel(path, usecols=lambda column: column in wanted)
+        index = None
+        if len(df.columns) == len(columns):
+            index = ReferenceIndex.from_dataframe(df, key_field, fields, duplicates)
+
+    if use_snapshot and index is not None:
+        temporary = f"{cache_path}.tmp"
+        try:
+            with open(temporary, 'wb') as f:
+                pickle.dump({'signature': signature, 'data': df}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, cache_path)
+        except OSError as e:
+            # Pasta sem permissão de escrita: seguir sem snapshot
+            logger.warning(f"Não foi possível gravar o snapshot {cache_path}: {str(e)}")
+    return df, index
@@ -0,0 +1,488 @@
+import os
+import re
+import csv
+import numbers
+import sqlite3
+import logging
+from datetime import date, datetime
+
+import openpyxl
+
+try:
+    # Necessário apenas para a saída em Parquet
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger('email_extrator')
+
+EXCEL_MAX_ROWS = 1048575  # Linhas de dados por planilha no Excel (1.048.576 menos o cabeçalho)
+EXCEL_PART_ROWS = 50000  # Linhas de dados por parte da saída (padrão): limita o custo de regravar o arquivo
+# Formato das células de data, o mesmo usado pelo pandas.to_excel nos arquivos já existentes
+EXCEL_DATE_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+ROLLOVER_MODES = ('file', 'sheet')
+PART_SUFFIX_RE = re.compile(r'_parte\d+$')
+
+# Formatos de saída e a extensão dos arquivos de cada um (Excel é o padrão)
+OUTPUT_FORMATS = {'excel': '.xlsx', 'csv': '.csv', 'parquet': '.parquet', 'sqlite': '.sqlite3'}
+SQLITE_TABLE = 'registros'
+SQLITE_TYPES = {"número": "REAL", "data": "TEXT", "texto": "TEXT"}  # Campos adicionais ficam sem tipo declarado
+
+
+def typed_value(value, field_format):
+    """
+    Converte um valor já normalizado para o tipo gravado na saída, conforme o formato do campo
+
+    "número" vira float e "data" ("aaaa-mm-dd") vira datetime; valores que não podem
+    ser convertidos ficam vazios (None), como no pd.to_numeric/pd.to_datetime com
+    errors='coerce'. NaN também vira vazio.
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if field_format == "número":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if field_format == "data":
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        try:
+            return datetime.strptime(str(value).strip(), '%Y-%m-%d')
+        except ValueError:
+            return None
+    if value == "":
+        return None
+    return value
+
+
+def output_format_for(path, default='excel'):
+    """Formato de saída correspondente à extensão do arquivo (ex.: "dados.csv" -> 'csv'), ou 'default'"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.sqlite', '.db'):
+        return 'sqlite'
+    for output_format, format_extension in OUTPUT_FORMATS.items():
+        if extension == format_extension:
+            return output_format
+    return default
+
+
+def rollover_path(path, part):
+    """Nome de uma parte da divisão (ex.: "dados.xlsx" ou "dados_parte002.xlsx", parte 3 -> "dados_parte003.xlsx")"""
+    base, extension = os.path.splitext(path)
+    base = PART_SUFFIX_RE.sub('', base)
+    return f"{base}_parte{part:03d}{extension}"
+
+
+class RecordSink:
+    """
+    Destino dos registros extraídos
+
+    write() recebe os registros aos poucos (listas de dicionários {campo: valor}) e
+    close() conclui a gravação. Os valores são convertidos uma única vez, conforme
+    o formato de cada campo personalizado (ver typed_value), na ordem de 'columns';
+    se 'columns' não for informado, valem os campos do primeiro lote. Campos fora
+    de 'columns' são ignorados.
+    """
+
+    def __init__(self, path, custom_fields=None, columns=None):
+        self.path = path
+        self.formats = {field["name"]: field.get("format", "texto") for field in custom_fields or []}
+        self.columns = list(dict.fromkeys(columns)) if columns else None
+        self.count = 0  # Registros recebidos
+        self.paths = []  # Arquivos gravados
+        self._ignored = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, records):
+        if not records:
+            return
+        if self.columns is None:
+            self.columns = list(dict.fromkeys(name for record in records for name in record))
+        ignored = {name for record in records for name in record} - set(self.columns) - self._ignored
+        if ignored:
+            self._ignored |= ignored
+            logger.warning(f"Campos ignorados na saída {self.path}: {', '.join(sorted(ignored))}")
+        self._write_rows([self.typed_row(record) for record in records])
+        self.count += len(records)
+
+    def typed_row(self, record):
+        """Valores de um registro na ordem das colunas, com as datas como date (sem horário)"""
+        row = []
+        for name in self.columns:
+            value = typed_value(record.get(name), self.formats.get(name, "texto"))
+            if isinstance(value, datetime) and self.formats.get(name) == "data":
+                value = value.date()
+            row.append(value)
+        return row
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _next_part(self, part):
+        """Próximo arquivo da divisão que ainda não existe"""
+        part += 1
+        while os.path.exists(rollover_path(self.path, part)):
+            part += 1
+        return rollover_path(self.path, part), part
+
+
+class ExcelSink(RecordSink):
+    """
+    Saída em Excel que acrescenta as novas linhas à última parte do arquivo
+
+    A última parte é aberta no primeiro write() e cada lote é gravado nas células
+    logo após a última linha usada da última planilha, sem reler os dados antigos com
+    o pandas nem reconverter as colunas; o arquivo é salvo ao completar uma parte e
+    em close(). A ordem das colunas do arquivo é mantida (colunas novas entram no
+    fim) e cada célula nova recebe o formato numérico da coluna (o da última linha
+    existente ou o padrão para "data"). Ao atingir 'max_rows' linhas de dados, a
+    gravação continua em um novo arquivo ('file') ou em uma nova planilha ('sheet').
+
+    O xlsx é um zip de XML e o openpyxl precisa carregar e regravar o arquivo inteiro
+    para acrescentar linhas. Com a divisão em arquivos, apenas a parte atual (no
+    máximo 'max_rows' linhas) fica em memória e é regravada, e uma parte já cheia
+    nem chega a ser carregada: o custo não cresce com o histórico. Com a divisão em
+    planilhas, o arquivo único fica inteiro em memória e é regravado a cada gravação.
+    """
+
+    def __init__(self, path, custom_fields=None, max_rows=EXCEL_PART_ROWS, rollover='file'):
+        if rollover not in ROLLOVER_MODES:
+            raise ValueError(f"Modo de divisão inválido: '{rollover}' (use 'file' ou 'sheet')")
+        super().__init__(path, custom_fields)
+        self.max_rows = max(1, min(int(max_rows), EXCEL_MAX_ROWS))
+        self.rollover = rollover
+        self._workbook = None
+
+    def _open(self):
+        """Abre a última parte (ou começa uma nova) e posiciona a gravação após a última linha usada"""
+        self.paths = []
+        path, part = self._last_part()
+        workbook = None
+        header = []
+        if os.path.exists(path):
+            used_rows, existing_header = self._inspect(path)
+            if self.rollover == 'file' and used_rows is not None and used_rows >= self.max_rows:
+                # Parte cheia: começar a próxima com o mesmo cabeçalho, sem carregar as linhas antigas
+                header = existing_header
+                path, part = self._next_part(part)
+                logger.info(f"Arquivo {self.path} com {used_rows} linhas, continuando no arquivo {path}")
+            else:
+                try:
+                    workbook = openpyxl.load_workbook(path)
+                    sheet = workbook.worksheets[-1]
+                    logger.info(f"Acrescentando dados ao arquivo existente: {path}")
+                except Exception as e:
+                    # Não sobrescrever um arquivo que não pôde ser lido: gravar na parte seguinte
+                    path, part = self._next_part(part)
+                    logger.warning(f"Não foi possível abrir o arquivo existente ({str(e)}), gravando em {path}")
+        if workbook is None:
+            workbook = openpyxl.Workbook()
+            sheet = workbook.active
+            sheet.title = 'Sheet1'
+            for position, name in enumerate(header):
+                sheet.cell(1, position + 1, name)
+            logger.info(f"Criando novo arquivo: {path}")
+
+        self._workbook, self._sheet, self._path, self._part = workbook, sheet, path, part
+        # sheet.max_row percorre todas as células: é lido uma única vez e depois a linha é contada aqui
+        last_row = sheet.max_row
+        self._columns = [cell.value for cell in sheet[1]] if sheet.cell(1, 1).value is not None else []
+        self._row = last_row if self._columns else 1
+        self._number_formats = self._column_formats(sheet, self._columns, self._row)
+
+    def write(self, records):
+        if not records:
+            return
+        if self._workbook is None:
+            self._open()
+
+        new_columns = [name for name in dict.fromkeys(name for record in records for name in record)
+                       if name not in self._columns]
+        if new_columns:
+            start = len(self._columns)
+            for name in new_columns:
+                self._columns.append(name)
+                self._sheet.cell(1, len(self._columns), name)
+            # Colunas novas ainda não têm linhas de onde copiar o formato
+            self._number_formats.extend(self._column_formats(self._sheet, self._columns, 1, start))
+
+        for record in records:
+            if self._row - 1 >= self.max_rows:
+                self._rollover()
+            self._row += 1
+            for position, name in enumerate(self._columns):
+                value = typed_value(record.get(name), self.formats.get(name, "texto"))
+                if value is not None:
+                    self._sheet.cell(self._row, position + 1, value)
+            for position, number_format in self._number_formats:
+                self._sheet.cell(self._row, position + 1).number_format = number_format
+        self.count += len(records)
+
+    def _rollover(self):
+        if self.rollover == 'sheet':
+            self._sheet = self._workbook.create_sheet(f"Sheet{len(self._workbook.worksheets) + 1}")
+            logger.info(f"Limite de {self.max_rows} linhas atingido, continuando na planilha {self._sheet.title}")
+        else:
+            self._workbook.save(self._path)
+            self.paths.append(self._path)
+            self._path, self._part = self._next_part(self._part)
+            self._workbook = openpyxl.Workbook()
+            self._sheet = self._workbook.active
+            self._sheet.title = 'Sheet1'
+            logger.info(f"Limite de {self.max_rows} linhas atingido, continuando no arquivo {self._path}")
+        self._row = 1
+        for position, name in enumerate(self._columns):
+            self._sheet.cell(1, position + 1, name)
+
+    def close(self):
+        if self._workbook is None:
+            return
+        self._workbook.save(self._path)
+        self.paths.append(self._path)
+        self._workbook = None
+
+    def _last_part(self):
+        """Última parte já gravada da divisão (o próprio arquivo, se ainda não houver outras)"""
+        part = 1
+        while os.path.exists(rollover_path(self.path, part + 1)):
+            part += 1
+        return (rollover_path(self.path, part) if part > 1 else self.path), part
+
+    @staticmethod
+    def _inspect(path):
+        """
+        Linhas de dados e cabeçalho da última planilha, lidos em modo read_only (sem carregar as células)
+
+        Returns:
+            Tupla (linhas de dados ou None se o arquivo não informar suas dimensões, cabeçalho)
+        """
+        try:
+            workbook = openpyxl.load_workbook(path, read_only=True)
+        except Exception:
+            return None, []
+        try:
+            sheet = workbook.worksheets[-1]
+            header = [name for name in next(sheet.iter_rows(max_row=1, values_only=True), ()) if name is not None]
+            return (sheet.max_row - 1 if sheet.max_row else None), header
+        finally:
+            workbook.close()
+
+    def _column_formats(self, sheet, columns, last_row, start=0):
+        """Formato numérico das colunas a partir de 'start': o da última linha existente ou o padrão para datas"""
+        number_formats = []
+        for position, name in enumerate(columns[start:], start):
+            number_format = 'General'
+            if last_row > 1:
+                number_format = sheet.cell(last_row, position + 1).number_format
+            if number_format == 'General' and self.formats.get(name) == "data":
+                number_format = EXCEL_DATE_FORMAT
+            if number_format != 'General':
+                number_formats.append((position, number_format))
+        return number_formats
+
+
+class CsvSink(RecordSink):
+    """
+    Saída em CSV gravada à medida que os registros chegam, sem mantê-los em memória
+
+    Um arquivo existente com o mesmo cabeçalho recebe as novas linhas no fim; com
+    outro cabeçalho, a gravação vai para a parte seguinte ("<arquivo>_parte002.csv").
+    Arquivos novos são gravados em UTF-8 com BOM, para que o Excel reconheça os acentos.
+    Números usam ponto decimal e datas o formato aaaa-mm-dd.
+    """
+
+    def __init__(self, path, custom_fields=None, columns=None, delimiter=','):
+        super().__init__(path, custom_fields, columns)
+        self.delimiter = delimiter
+        self._file = None
+        self._writer = None
+
+    def _open(self):
+        path, part = self.path, 1
+        while os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                    header = next(csv.reader(f, delimiter=self.delimiter), [])
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Não foi possível ler o arquivo existente {path} ({str(e)})")
+                header = None
+            if header == self.columns:
+                logger.info(f"Acrescentando dados ao arquivo existente: {path}")
+                self._file = open(path, 'a', encoding='utf-8', newline='')
+                self._writer = csv.writer(self._file, delimiter=self.delimiter)
+                self.paths.append(path)
+                return
+            path, part = self._next_part(part)
+
+        logger.info(f"Criando novo arquivo: {path}")
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file, delimiter=self.delimiter)
+        self._writer.writerow(self.columns)
+        self.paths.append(path)
+
+    def _write_rows(self, rows):
+        if self._writer is None:
+            self._open()
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+class ParquetSink(RecordSink):
+    """
+    Saída em Parquet (requer pyarrow), gravada em grupos de 'row_group_size' linhas
+
+    Apenas um grupo de linhas fica em memória. Campos "número" viram float64,
+    "data" viram date32 e os demais, texto. Um arquivo Parquet não pode receber
+    novas linhas depois de fechado: se o arquivo já existir, a gravação vai para
+    a parte seguinte ("<arquivo>_parte002.parquet").
+    """
+
+    def __init__(self, path, custom_fields=None, columns=None, row_group_size=5000):
+        if pyarrow is None:
+            raise ImportError("A saída em Parquet requer o pyarrow (pip install pyarrow)")
+        super().__init__(path, custom_fields, columns)
+        self.row_group_size = max(1, int(row_group_size))
+        self._rows = []
+        self._writer = None
+        self._schema = None
+
+    def _arrow_type(self, name):
+        field_format = self.formats.get(name)
+        if field_format == "número":
+            return pyarrow.float64()
+        if field_format == "data":
+            return pyarrow.date32()
+        return pyarrow.string()
+
+    def _write_rows(self, rows):
+        self._rows.extend(rows)
+        while len(self._rows) >= self.row_group_size:
+            self._flush(self._rows[:self.row_group_size])
+            del self._rows[:self.row_group_size]
+
+    def _flush(self, rows):
+        if self._writer is None:
+            path = self.path
+            if os.path.exists(path):
+                path, _ = self._next_part(1)
+            logger.info(f"Criando novo arquivo: {path}")
+            self._schema = pyarrow.schema([(name, self._arrow_type(name)) for name in self.columns])
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+            self.paths.append(path)
+
+        arrays = []
+        for position, field in enumerate(self._schema):
+            values = [row[position] for row in rows]
+            if field.type == pyarrow.string():
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pyarrow.array(values, type=field.type))
+        self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        if self._rows:
+            self._flush(self._rows)
+            self._rows = []
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class SqliteSink(RecordSink):
+    """
+    Saída em banco SQLite (tabela "registros"), com gravação em transações de 'batch_size' linhas
+
+    A tabela é criada se não existir e recebe as colunas que faltarem. Campos
+    "número" são REAL e "data" são texto aaaa-mm-dd. Ao fechar, é criado (se ainda
+    não existir) um índice sobre 'key_columns', para consultar os registros pela chave;
+    criá-lo depois da carga evita atualizar o índice a cada linha inserida.
+    """
+
+    def __init__(self, path, custom_fields=None, columns=None, key_columns=(), batch_size=5000):
+        super().__init__(path, custom_fields, columns)
+        self.key_columns = list(key_columns)
+        self.batch_size = max(1, int(batch_size))
+        self._rows = []
+        self._conn = None
+        self._insert = None
+
+    @staticmethod
+    def _quote(name):
+        return '"' + str(name).replace('"', '""') + '"'
+
+    @staticmethod
+    def _sqlite_value(value):
+        # O sqlite3 não converte date/datetime sem adaptadores (obsoletos a partir do Python 3.12)
+        if value is None or isinstance(value, (int, float, str, bytes)):
+            return value
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, numbers.Integral):
+            return int(value)
+        if isinstance(value, numbers.Real):
+            return float(value)
+        return str(value)
+
+    def _open(self):
+        logger.info(f"Gravando dados no banco SQLite: {self.path}")
+        self._conn = sqlite3.connect(self.path)
+        definitions = ', '.join(f"{self._quote(name)} {SQLITE_TYPES.get(self.formats.get(name), '')}".rstrip()
+                                for name in self.columns)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {SQLITE_TABLE} ({definitions})")
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({SQLITE_TABLE})")}
+        for name in self.columns:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE {SQLITE_TABLE} ADD COLUMN {self._quote(name)} "
+                                   f"{SQLITE_TYPES.get(self.formats.get(name), '')}".rstrip())
+        self._conn.commit()
+        self._insert = (f"INSERT INTO {SQLITE_TABLE} ({', '.join(self._quote(name) for name in self.columns)}) "
+                        f"VALUES ({', '.join('?' * len(self.columns))})")
+        self.paths.append(self.path)
+
+    def _write_rows(self, rows):
+        if self._conn is None:
+            self._open()
+        self._rows.extend([self._sqlite_value(value) for value in row] for row in rows)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        # Uma transação por lote
+        with self._conn:
+            self._conn.executemany(self._insert, self._rows)
+        self._rows = []
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            if self._rows:
+                self._flush()
+            key_columns = [name for name in self.key_columns if name in self.columns]
+            missing = [name for name in self.key_columns if name not in self.columns]
+            if missing:
+                logger.warning(f"Colunas de índice não encontradas na saída: {', '.join(missing)}")
+            if key_columns:
+                index_name = self._quote(f"idx_{SQLITE_TABLE}_{'_'.join(key_columns)}")
+                with self._conn:
+                    self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {SQLITE_TABLE} "
+                                       f"({', '.join(self._quote(name) for name in key_columns)})")
+        finally:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,130 @@
+import re
+import threading
+import socketserver
+
+UID_RANGE_RE = re.compile(r'^(\d+)(?::(\d+|\*))?$')
+
+
+class StubMailbox:
+    """Caixa de correio do servidor de teste: UID -> MODSEQ da última alteração"""
+
+    def __init__(self, uids=(), uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.modseqs = {}
+        self.highestmodseq = 0
+        for uid in uids:
+            self.add(uid)
+
+    def add(self, uid):
+        self.highestmodseq += 1
+        self.modseqs[uid] = self.highestmodseq
+
+    @property
+    def uidnext(self):
+        return max(self.modseqs, default=0) + 1
+
+    def search(self, criteria):
+        """Avalia os critérios ALL, UID <a:b> e MODSEQ <n> (os usados pela sincronização incremental)"""
+        uids = sorted(self.modseqs)
+        tokens = criteria.split()
+        while tokens:
+            token = tokens.pop(0).upper()
+            if token == 'UID':
+                start, end = UID_RANGE_RE.match(tokens.pop(0)).groups()
+                low = int(start)
+                high = self.uidnext if end == '*' else int(end or start)
+                # "n:*" sempre inclui a última mensagem
+                uids = [uid for uid in uids if low <= uid <= high or (end == '*' and uid == uids[-1])]
+            elif token == 'MODSEQ':
+                modseq = int(tokens.pop(0))
+                uids = [uid for uid in uids if self.modseqs[uid] >= modseq]
+        return uids
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        mailbox = server.mailbox
+        condstore = False
+        self.send(f"* OK [CAPABILITY {server.capabilities}] Servidor de teste")
+        for raw in self.rfile:
+            line = raw.decode('ascii').rstrip('\r\n')
+            tag, _, rest = line.partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            if command == 'UID':
+                command, _, args = args.partition(' ')
+                command = 'UID ' + command.upper()
+            server.commands.append(f"{command} {args}".strip())
+
+            if command == 'CAPABILITY':
+                self.send(f"* CAPABILITY {server.capabilities}")
+            elif command == 'ENABLE':
+                enabled = [name for name in args.split() if name in server.capabilities.split()]
+                condstore = condstore or bool(enabled)
+                self.send(f"* ENABLED {' '.join(enabled)}")
+            elif command in ('SELECT', 'EXAMINE'):
+                condstore = condstore or 'CONDSTORE' in args or 'QRESYNC' in args
+                self.send(f"* {len(mailbox.modseqs)} EXISTS")
+                self.send(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+                self.send(f"* OK [UIDNEXT {mailbox.uidnext}] Predicted next UID")
+                if condstore:
+                    self.send(f"* OK [HIGHESTMODSEQ {mailbox.highestmodseq}] Highest")
+            elif command == 'UID SEARCH':
+                uids = mailbox.search(args)
+                line = ' '.join(str(uid) for uid in uids)
+                if 'MODSEQ' in args.upper() and uids:
+                    # RFC 7162: a resposta traz o maior MODSEQ das mensagens encontradas
+                    line += f" (MODSEQ {max(mailbox.modseqs[uid] for uid in uids)})"
+                self.send(f"* SEARCH {line}".rstrip())
+            elif command == 'IDLE':
+                self.send("+ idling")
+                # O servidor de teste não envia avisos durante o IDLE: só aguarda o DONE
+                self.rfile.readline()
+            elif command == 'LOGOUT':
+                self.send("* BYE")
+                self.send(f"{tag} OK LOGOUT completed")
+                return
+            elif command not in ('LOGIN', 'NOOP', 'CLOSE'):
+                self.send(f"{tag} BAD comando não suportado pelo servidor de teste")
+                continue
+            # Avisos pendentes vão junto com a resposta do comando; os de 'trailing' chegam
+            # logo após a conclusão, no mesmo envio (e ficam no buffer do cliente)
+            lines = server.notices + [f"{tag} OK {command} completed"] + server.trailing
+            server.notices, server.trailing = [], []
+            self.wfile.write(''.join(line + '\r\n' for line in lines).encode('ascii'))
+
+
+class StubServer(socketserver.ThreadingTCPServer):
+    """
+    Servidor IMAP mínimo para os testes, em uma porta local livre
+
+    Anuncia as capacidades informadas (ex.: "IMAP4rev1 ENABLE CONDSTORE QRESYNC")
+    e registra em 'commands' os comandos recebidos, sem a tag. Linhas colocadas em
+    'notices' são enviadas na resposta do próximo comando e as de 'trailing' logo
+    depois dela (ex.: "* 4 EXISTS" de um email que acabou de chegar).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox, capabilities='IMAP4rev1'):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.mailbox = mailbox
+        self.capabilities = capabilities
+        self.commands = []
+        self.notices = []
+        self.trailing = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+from src import email_processor
+from src.backfill import load_checkpoint
+
+MESSAGE = b'Subject: teste\r\n\r\nPedido: %d\r\n'
+
+
+class BackfillShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'faixa.json')
+        email_processor._init_offline_worker([{"name": "Pedido", "format": "texto"}])
+        self.processor = email_processor._worker_processor
+        self.processor.fetch_batch_size = 2
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_shard(self, returned_uids):
+        def fetch(imap_server, batch, peek=None):
+            return [(uid, MESSAGE % uid) for uid in batch if uid in returned_uids]
+
+        def connect(*args):
+            self.processor.imap_server = mock.Mock()
+            return True
+
+        task = ({}, None, (date(2024, 1, 1), date(2024, 2, 1)), self.path, 'assinatura')
+        with mock.patch.object(self.processor, 'connect_to_server', side_effect=connect), \
+                mock.patch.object(self.processor, 'search_uids', return_value=('OK', [1, 2, 3])), \
+                mock.patch.object(self.processor, '_fetch_rfc822_batch', side_effect=fetch):
+            return email_processor._backfill_shard(task)
+
+    def test_complete_shard_is_checkpointed(self):
+        shard, emails = self.run_shard({1, 2, 3})
+        self.assertEqual(emails, 3)
+        checkpoint = load_checkpoint(self.path, 'assinatura')
+        self.assertEqual(checkpoint['emails'], 3)
+        self.assertEqual([record['Pedido'] for record in checkpoint['records']], ['1', '2', '3'])
+
+    def test_partial_batch_fails_the_shard(self):
+        # O servidor omitiu o UID 2: a faixa deve ser refeita, sem checkpoint
+        shard, emails = self.run_shard({1, 3})
+        self.assertIsNone(emails)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
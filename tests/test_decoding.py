@@ -0,0 +1,31 @@
+import unittest
+
+from src.decoding import decode_bytes, lookup_codec
+
+
+# Tamanho par: também seria aceito (com texto sem sentido) por codecs de 2 bytes como utf-16
+LATIN1_BODY = "Valor liquido transferido para parte: R$ 1.234,56 confirmação."
+
+
+class DecodeBytesTest(unittest.TestCase):
+
+    def test_declared_charset(self):
+        self.assertEqual(decode_bytes(LATIN1_BODY.encode('iso-8859-1'), 'iso-8859-1'), LATIN1_BODY)
+
+    def test_wrong_declared_charset_falls_back_to_utf8(self):
+        self.assertEqual(decode_bytes(LATIN1_BODY.encode('utf-8'), 'us-ascii'), LATIN1_BODY)
+
+    def test_unknown_charset_and_empty(self):
+        self.assertIsNone(lookup_codec('x-desconhecido'))
+        self.assertIsNone(lookup_codec('base64'))
+        self.assertEqual(decode_bytes(b'', 'utf-8'), "")
+
+    def test_messages_decoded_in_sequence_are_independent(self):
+        # Uma mensagem que não é utf-8 nem latin-1 não pode mudar a decodificação das seguintes
+        decode_bytes(bytes([0xff, 0xfe, 0x80, 0x81]) * 3, 'utf-8')
+        self.assertEqual(decode_bytes(LATIN1_BODY.encode('latin-1'), 'utf-8'), LATIN1_BODY)
+        self.assertEqual(decode_bytes(LATIN1_BODY.encode('latin-1'), 'utf-8', detect=False), LATIN1_BODY)
+
+
+if __name__ == '__main__':
+    unittest.main()
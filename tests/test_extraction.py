@@ -0,0 +1,45 @@
+import unittest
+
+from src.email_processor import EmailProcessor
+from src.extraction import ExtractionPlan, label_pattern, validate_pattern
+
+
+class ValidatePatternTest(unittest.TestCase):
+
+    def test_linear_repeats_with_separator_are_accepted(self):
+        for pattern in (r"(?:\d{1,3}\.)*\d{1,3},\d{2}", r"(\d+(?:,\d+)*)", r"Valor: (\S+(?: \S+)*)"):
+            with self.subTest(pattern=pattern):
+                self.assertIsNone(validate_pattern(pattern))
+
+    def test_ambiguous_repeats_are_rejected(self):
+        for pattern in (r"(a+)+", r"(a|a)*", r"(\w+\s?)+", r"(a*b*)+"):
+            with self.subTest(pattern=pattern):
+                self.assertIsNotNone(validate_pattern(pattern))
+
+    def test_invalid_and_multiple_groups(self):
+        self.assertIn("inválida", validate_pattern(r"(a"))
+        self.assertIn("grupo", validate_pattern(r"(a)(b)"))
+
+    def test_accepted_pattern_extracts_value(self):
+        plan = ExtractionPlan(["Valor"], {"Valor": r"(?:\d{1,3}\.)*\d{1,3},\d{2}"})
+        self.assertEqual(plan.search("Valor transferido R$ 1.234.567,89 hoje"), {"Valor": "1.234.567,89"})
+
+
+class BodySearchTermsTest(unittest.TestCase):
+
+    def terms(self, fields):
+        processor = EmailProcessor()
+        processor.custom_fields = fields
+        return processor._body_search_terms()
+
+    def test_terms_from_labels(self):
+        fields = [{"name": "Número processo CNJ"}, {"name": "Valor", "pattern": label_pattern("Valor")}]
+        self.assertEqual(self.terms(fields), ["processo CNJ", "Valor"])
+
+    def test_custom_pattern_disables_body_search(self):
+        # O padrão pode casar em emails sem o rótulo, que o servidor descartaria
+        self.assertEqual(self.terms([{"name": "Processo"}, {"name": "Valor", "pattern": r"R\$ ([\d.]+,\d{2})"}]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
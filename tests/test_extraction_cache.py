@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.email_processor import EmailProcessor
+from src.extraction_cache import ExtractionCache, field_fingerprint, message_fingerprint
+
+
+MESSAGE = b'Subject: teste\r\nContent-Type: text/plain\r\n\r\nPedido: 123\r\n'
+
+
+class ExtractionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.processor = EmailProcessor()
+        self.processor.use_extraction_cache = True
+        self.processor.extraction_cache_file = os.path.join(self.directory.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        if self.processor._extraction_cache is not None:
+            self.processor._extraction_cache.close()
+        self.directory.cleanup()
+
+    def cached(self, field):
+        cache = ExtractionCache(self.processor.extraction_cache_file)
+        try:
+            fingerprint = field_fingerprint(field, self.processor.max_content_chars)
+            return cache.get_many(message_fingerprint(MESSAGE), [fingerprint])
+        finally:
+            cache.close()
+
+    def test_fingerprint_depends_on_content_limit(self):
+        field = {"name": "Pedido", "format": "texto"}
+        self.assertNotEqual(field_fingerprint(field, 1000), field_fingerprint(field, 2000))
+        self.assertEqual(field_fingerprint(field, 1000), field_fingerprint(dict(field, format="número"), 1000))
+
+    def test_found_value_is_cached(self):
+        field = {"name": "Pedido", "format": "texto"}
+        self.processor.custom_fields = [field]
+        self.processor.process_raw_email(MESSAGE, normalize=False)
+        self.processor._evict_extraction_cache()
+        self.assertEqual(list(self.cached(field).values()), ['123'])
+
+    def test_timed_out_pattern_is_not_cached(self):
+        field = {"name": "Pedido", "format": "texto", "pattern": r"Pedido (\d+)"}
+        self.processor.custom_fields = [field]
+        slow_pattern = mock.Mock(search=mock.Mock(side_effect=TimeoutError))
+        with mock.patch('src.extraction.compile_pattern', return_value=slow_pattern):
+            extracted = self.processor.process_raw_email(MESSAGE, normalize=False)
+        self.processor._evict_extraction_cache()
+        # O valor pelo rótulo é usado nesta execução, mas não fica guardado
+        self.assertEqual(extracted, {'Pedido': '123'})
+        self.assertEqual(self.processor.extraction_stats['timeouts'], 1)
+        self.assertEqual(self.cached(field), {})
+
+    def test_warm_run_does_not_write_per_message(self):
+        field = {"name": "Pedido", "format": "texto"}
+        self.processor.custom_fields = [field]
+        messages = [MESSAGE + b'Email %d\r\n' % number for number in range(50)]
+        for raw_email in messages:
+            self.processor.process_raw_email(raw_email, normalize=False)
+        self.processor._evict_extraction_cache()
+        cache = self.processor.get_extraction_cache()
+        changes = cache._conn.total_changes
+        for raw_email in messages:
+            self.assertEqual(self.processor.process_raw_email(raw_email, normalize=False), {'Pedido': '123'})
+        self.assertEqual(cache._conn.total_changes, changes)
+        # Os acessos são gravados juntos, em uma única transação
+        cache.flush()
+        self.assertEqual(cache._conn.total_changes, changes + len(messages))
+
+    def test_pending_values_are_read_and_saved_on_close(self):
+        cache = ExtractionCache(self.processor.extraction_cache_file)
+        cache.put_many('mensagem', {'campo': 'valor', 'vazio': None})
+        self.assertEqual(cache.get_many('mensagem', ['campo', 'vazio', 'outro']), {'campo': 'valor', 'vazio': None})
+        cache.close()
+        cache = ExtractionCache(self.processor.extraction_cache_file)
+        self.assertEqual(cache.get_many('mensagem', ['campo']), {'campo': 'valor'})
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import imaplib
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.email_processor import EmailProcessor
+from tests.imap_stub import StubMailbox, StubServer
+
+
+class IdleTest(unittest.TestCase):
+    """Avisos de emails novos recebidos fora do IDLE"""
+
+    def setUp(self):
+        self.server = StubServer(StubMailbox([1, 2, 3]), 'IMAP4rev1 IDLE')
+        self.processor = EmailProcessor()
+        self.processor.show_dialogs = False
+        self.processor.timeout = 5
+        self.processor.imap_server = imaplib.IMAP4('127.0.0.1', self.server.port)
+        self.processor.imap_server.login('usuario', 'senha')
+        self.processor.imap_server.select('INBOX')
+
+    def tearDown(self):
+        try:
+            self.processor.imap_server.logout()
+        except Exception:
+            pass
+        self.server.stop()
+
+    def test_exists_buffered_by_imaplib_ends_idle(self):
+        # O aviso chega logo após a resposta do NOOP e fica no buffer do imaplib
+        self.server.trailing.append("* 4 EXISTS")
+        self.processor.imap_server.noop()
+        start = time.monotonic()
+        self.assertTrue(self.processor._idle_wait(threading.Event(), 5))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(self.processor.imap_server.noop()[0], 'OK')
+
+    def test_exists_during_processing_searches_again(self):
+        stop_event = threading.Event()
+        searches = []
+
+        def search_emails(search_subject):
+            searches.append(list(self.server.commands))
+            if len(searches) == 2:
+                stop_event.set()
+            return [1] if len(searches) == 1 else []
+
+        def process_emails(email_ids):
+            # Email entregue durante o processamento: avisado na resposta do próximo comando
+            self.server.notices.append("* 4 EXISTS")
+            return len(email_ids)
+
+        self.processor.idle_timeout = 5
+        with mock.patch.object(self.processor, 'search_emails', side_effect=search_emails), \
+                mock.patch.object(self.processor, 'process_emails', side_effect=process_emails):
+            start = time.monotonic()
+            self.processor.watch_mailbox(None, stop_event)
+        self.assertEqual(len(searches), 2)
+        self.assertNotIn('IDLE', searches[1])
+        self.assertLess(time.monotonic() - start, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from src.imap_utils import (compress_uid_ranges, find_text_sections, parse_fetch_response, parse_imap_list,
+                            parse_search_response)
+
+
+class CompressUidRangesTest(unittest.TestCase):
+
+    def test_ranges_and_single_uids(self):
+        self.assertEqual(compress_uid_ranges([1, 2, 3, 5, 7, 8]), "1:3,5,7:8")
+
+    def test_unsorted_repeated_and_mixed_types(self):
+        self.assertEqual(compress_uid_ranges([b'10', '9', 9, 12, b'11', 1]), "1,9:12")
+
+    def test_empty(self):
+        self.assertEqual(compress_uid_ranges([]), "")
+
+
+class ParseSearchResponseTest(unittest.TestCase):
+
+    def test_plain(self):
+        self.assertEqual(parse_search_response([b'3 1 2']), [1, 2, 3])
+
+    def test_modseq_suffix(self):
+        self.assertEqual(parse_search_response([b'4 5 (MODSEQ 7)']), [4, 5])
+
+    def test_empty(self):
+        self.assertEqual(parse_search_response([b'']), [])
+        self.assertEqual(parse_search_response([None]), [])
+
+
+class ParseFetchResponseTest(unittest.TestCase):
+
+    def test_one_literal_per_message(self):
+        data = [(b'1 (UID 10 RFC822 {5}', b'hello'), b')',
+                (b'2 (UID 12 RFC822 {3}', b'abc'), b')']
+        messages = parse_fetch_response(data)
+        self.assertEqual([message['uid'] for message in messages], [10, 12])
+        self.assertEqual(messages[0]['items'], {'RFC822': b'hello'})
+        self.assertEqual(messages[1]['items'], {'RFC822': b'abc'})
+
+    def test_several_literals_in_one_message(self):
+        data = [(b'1 (UID 10 BODY[1] {5}', b'plain'), (b' BODY[2] {6}', b'<html>'), b')']
+        messages = parse_fetch_response(data)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['items'], {'BODY[1]': b'plain', 'BODY[2]': b'<html>'})
+
+    def test_uid_after_literal_and_meta(self):
+        data = [(b'7 (FLAGS (\\Seen) BODY[HEADER.FIELDS (SUBJECT)] {9}', b'Subject:x'), b' UID 70)']
+        messages = parse_fetch_response(data)
+        self.assertEqual(messages[0]['uid'], 70)
+        self.assertIn(b'FLAGS', messages[0]['meta'])
+        self.assertEqual(messages[0]['items'], {'BODY[HEADER.FIELDS (SUBJECT)]': b'Subject:x'})
+
+    def test_unsolicited_fetch_without_uid_is_ignored(self):
+        data = [b'3 (FLAGS (\\Seen))', (b'1 (UID 10 RFC822 {2}', b'ok'), b')', None]
+        self.assertEqual([message['uid'] for message in parse_fetch_response(data)], [10])
+
+    def test_empty(self):
+        self.assertEqual(parse_fetch_response(None), [])
+        self.assertEqual(parse_fetch_response([None]), [])
+
+
+class FindTextSectionsTest(unittest.TestCase):
+
+    def structure(self, text):
+        return parse_imap_list(text)[0]
+
+    def test_single_part(self):
+        structure = self.structure(b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 120 4)')
+        self.assertEqual(find_text_sections(structure), [
+            {'section': '1', 'subtype': 'plain', 'charset': 'utf-8', 'encoding': 'quoted-printable'}])
+
+    def test_multipart_skips_attachments(self):
+        structure = self.structure(
+            b'((("TEXT" "PLAIN" ("CHARSET" "iso-8859-1") NIL NIL "7BIT" 10 1)'
+            b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "BASE64" 20 1) "ALTERNATIVE")'
+            b'("APPLICATION" "PDF" ("NAME" "a.pdf") NIL NIL "BASE64" 2000)'
+            b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 5 1 NIL ("ATTACHMENT" ("FILENAME" "a.txt")) NIL)'
+            b'("TEXT" "PLAIN" ("NAME" "b.txt") NIL NIL "7BIT" 5 1) "MIXED")')
+        self.assertEqual(find_text_sections(structure), [
+            {'section': '1.1', 'subtype': 'plain', 'charset': 'iso-8859-1', 'encoding': '7bit'},
+            {'section': '1.2', 'subtype': 'html', 'charset': 'utf-8', 'encoding': 'base64'},
+        ])
+
+    def test_non_text_or_invalid(self):
+        self.assertEqual(find_text_sections(self.structure(b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 100)')), [])
+        self.assertEqual(find_text_sections(None), [])
+        self.assertEqual(find_text_sections([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import imaplib
+import tempfile
+import unittest
+
+from src.email_processor import EmailProcessor
+from tests.imap_stub import StubMailbox, StubServer
+
+
+class IncrementalSyncTest(unittest.TestCase):
+    """Sincronização incremental com QRESYNC, apenas CONDSTORE ou nenhuma das extensões"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sync_state_file = os.path.join(self.directory.name, 'sync_state.json')
+        self.mailbox = StubMailbox([1, 2, 3])
+        self.connections = []
+
+    def tearDown(self):
+        for connection in self.connections:
+            try:
+                connection.logout()
+            except Exception:
+                pass
+        self.server.stop()
+        self.directory.cleanup()
+
+    def start(self, capabilities):
+        self.server = StubServer(self.mailbox, capabilities)
+
+    def search(self):
+        """Uma execução: nova conexão, busca incremental e gravação da marca"""
+        processor = EmailProcessor()
+        processor.show_dialogs = False
+        processor.incremental_sync = True
+        processor.sync_state_file = self.sync_state_file
+        processor.imap_server = imaplib.IMAP4('127.0.0.1', self.server.port)
+        processor.imap_server.login('usuario', 'senha')
+        self.connections.append(processor.imap_server)
+        self.server.commands.clear()
+        uids = processor.search_emails(None)
+        processor.commit_sync_state([int(uid) for uid in uids], [int(uid) for uid in uids])
+        return uids
+
+    def commands(self, prefix):
+        return [command for command in self.server.commands if command.startswith(prefix)]
+
+    def test_qresync(self):
+        self.start('IMAP4rev1 ENABLE CONDSTORE QRESYNC')
+        self.assertEqual(self.search(), [1, 2, 3])
+        self.assertEqual(self.commands('ENABLE'), ['ENABLE QRESYNC'])
+
+        self.mailbox.add(4)
+        self.assertEqual(self.search(), [4])
+        self.assertEqual(self.commands('SELECT'), ['SELECT INBOX (QRESYNC (1 3))'])
+        self.assertEqual(self.commands('UID SEARCH'), ['UID SEARCH UID 4:* MODSEQ 4'])
+
+    def test_condstore_only(self):
+        self.start('IMAP4rev1 CONDSTORE')
+        self.assertEqual(self.search(), [1, 2, 3])
+        self.assertEqual(self.commands('ENABLE'), [])
+
+        self.mailbox.add(4)
+        self.mailbox.add(5)
+        self.assertEqual(self.search(), [4, 5])
+        self.assertEqual(self.commands('SELECT'), ['SELECT INBOX (CONDSTORE)'])
+        self.assertEqual(self.commands('UID SEARCH'), ['UID SEARCH UID 4:* MODSEQ 4'])
+
+    def test_without_extensions(self):
+        self.start('IMAP4rev1')
+        self.assertEqual(self.search(), [1, 2, 3])
+
+        self.mailbox.add(4)
+        self.assertEqual(self.search(), [4])
+        self.assertEqual(self.commands('SELECT'), ['SELECT INBOX'])
+        self.assertEqual(self.commands('UID SEARCH'), ['UID SEARCH UID 4:*'])
+
+    def test_unchanged_highestmodseq_skips_search(self):
+        self.start('IMAP4rev1 ENABLE CONDSTORE QRESYNC')
+        self.assertEqual(self.search(), [1, 2, 3])
+
+        self.assertEqual(self.search(), [])
+        self.assertEqual(self.commands('UID SEARCH'), [])
+        self.assertEqual(self.commands('UID FETCH'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
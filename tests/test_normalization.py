@@ -0,0 +1,73 @@
+import random
+import unittest
+from unittest import mock
+
+from src import normalization
+from src.email_processor import EmailProcessor
+from src.normalization import normalize_date_column, normalize_number_column, normalize_records
+
+NUMBER_CHARS = '0123456789' * 3 + '.,' * 3 + ' \t R$-ea'
+DATE_CHARS = '0123456789' * 2 + '/' * 4 + ' -.a'
+
+
+def random_values(chars, count, seed):
+    generator = random.Random(seed)
+    return [''.join(generator.choice(chars) for _ in range(generator.randint(0, 12))) for _ in range(count)]
+
+
+class NormalizeColumnTest(unittest.TestCase):
+    """A conversão por coluna deve dar o mesmo resultado de EmailProcessor.process_value valor a valor"""
+
+    def setUp(self):
+        self.processor = EmailProcessor()
+
+    def assert_same_as_process_value(self, normalize, values, format_type):
+        converted, failed = normalize(values)
+        expected = [self.processor.process_value(value, format_type) for value in values]
+        # Nas falhas, process_value devolve o texto já limpo e a conversão por coluna, o original
+        expected_failed = [index for index, value in enumerate(values)
+                           if value and (format_type == "número" and not isinstance(expected[index], float)
+                                         or format_type == "data" and '/' in value and value.count('/') != 2)]
+        self.assertEqual(failed, expected_failed)
+        for index in failed:
+            converted[index] = expected[index] = values[index]
+        self.assertEqual(converted, expected)
+
+    def test_numbers_match_process_value(self):
+        values = random_values(NUMBER_CHARS, 2000, seed=1) + ["R$ 1.234,56", "1.234", "12,5", "", "abc"]
+        self.assert_same_as_process_value(normalize_number_column, values, "número")
+
+    def test_dates_match_process_value(self):
+        values = random_values(DATE_CHARS, 2000, seed=2) + ["1/2/2024", "31/12/2023", "2024-01-01", "1/2", ""]
+        self.assert_same_as_process_value(normalize_date_column, values, "data")
+
+    def test_without_numpy_strings(self):
+        with mock.patch.object(normalization, '_np_strings', None):
+            self.assert_same_as_process_value(normalize_number_column, random_values(NUMBER_CHARS, 500, seed=3),
+                                              "número")
+            self.assert_same_as_process_value(normalize_date_column, random_values(DATE_CHARS, 500, seed=4), "data")
+
+    def test_value_with_line_break(self):
+        converted, failed = normalize_number_column(["1,5", "2\n,5", "x"])
+        self.assertEqual(converted, [1.5, 2.5, "x"])
+        self.assertEqual(failed, [2])
+
+
+class NormalizeRecordsTest(unittest.TestCase):
+
+    def test_records_updated_in_place(self):
+        fields = [{"name": "Valor", "format": "número"}, {"name": "Data", "format": "data"},
+                  {"name": "Nome", "format": "texto"}]
+        records = [{"Valor": "R$ 1.000,00", "Data": "5/3/2024", "Nome": "1,0"},
+                   {"Valor": "erro", "Nome": "x"}]
+        failures = normalize_records(records, fields)
+        self.assertEqual(records, [{"Valor": 1000.0, "Data": "2024-03-05", "Nome": "1,0"},
+                                   {"Valor": "erro", "Nome": "x"}])
+        self.assertEqual(failures, [(1, "Valor", "erro")])
+
+    def test_empty(self):
+        self.assertEqual(normalize_records([], [{"name": "Valor", "format": "número"}]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+import openpyxl
+
+from src.reference_index import ReferenceIndex, load_reference_excel, normalize_key, snapshot_path
+
+
+class NormalizeKeyTest(unittest.TestCase):
+
+    def test_cnj_text_and_number_share_the_same_key(self):
+        keys = ["0001234-56.2023.8.24.0033", "00012345620238240033", 12345620238240033, " 0001234-56.2023.8.24.0033 "]
+        self.assertEqual({normalize_key(key) for key in keys}, {"12345620238240033"})
+        # Célula numérica lida como float (até 15 dígitos, o limite de precisão do Excel)
+        self.assertEqual(normalize_key(123456202382400.0), normalize_key("0123456-20.2382.4.00"))
+
+    def test_dates_match_extracted_date_text(self):
+        self.assertEqual(normalize_key(date(2024, 3, 5)), "20240305")
+        self.assertEqual(normalize_key(datetime(2024, 3, 5, 10, 30)), "20240305")
+        self.assertEqual(normalize_key("2024-03-05"), "20240305")
+
+    def test_numbers_and_text(self):
+        self.assertEqual(normalize_key(3.5), "3.5")
+        self.assertEqual(normalize_key(-12), "12")
+        self.assertEqual(normalize_key("000"), "0")
+        self.assertEqual(normalize_key("  João   da Silva "), "joão da silva")
+        self.assertEqual(normalize_key("ABC-1"), "abc-1")
+        self.assertEqual(normalize_key(True), "true")
+
+    def test_missing_keys(self):
+        for key in (None, float('nan'), "", "   "):
+            with self.subTest(key=key):
+                self.assertIsNone(normalize_key(key))
+
+
+class ReferenceIndexTest(unittest.TestCase):
+
+    def test_duplicate_policies(self):
+        for duplicates, expected in (('first', 'A'), ('last', 'B')):
+            index = ReferenceIndex(['Nome'], duplicates)
+            index.add("0001-2", ['A'])
+            index.add(12, ['B'])
+            index.add(None, ['C'])
+            self.assertEqual(index.get("00012"), {'Nome': expected})
+            self.assertEqual((len(index), index.duplicate_keys), (1, 1))
+        self.assertIsNone(index.get("99"))
+        with self.assertRaises(ValueError):
+            ReferenceIndex(['Nome'], 'nenhuma')
+
+
+class LoadReferenceExcelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'referencia.xlsx')
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Outro', 'Processo', 'Nome', 'Vara'])
+        # O xlsx guarda números como double: até 15 dígitos sem perda
+        sheet.append(['x', 123456202382400, 'Maria', '1ª'])
+        sheet.append(['y', '0000099-00.2024.8.24.0001', 'José', '2ª'])
+        sheet.append([None, None, None, None])
+        workbook.save(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_streamed_and_snapshot_give_the_same_index(self):
+        for attempt in range(2):
+            df, index = load_reference_excel(self.path, 'Processo', ['Nome', 'Vara'])
+            self.assertEqual(list(df.columns), ['Processo', 'Nome', 'Vara'])
+            self.assertEqual(len(df), 2)
+            self.assertEqual(index.get("0123456-20.2382.4.00"), {'Nome': 'Maria', 'Vara': '1ª'})
+            self.assertEqual(index.get(990020248240001), {'Nome': 'José', 'Vara': '2ª'})
+            self.assertTrue(os.path.exists(snapshot_path(self.path)))
+
+    def test_missing_column_returns_no_index(self):
+        df, index = load_reference_excel(self.path, 'Processo', ['Inexistente'], use_snapshot=False)
+        self.assertIsNone(index)
+        self.assertEqual(list(df.columns), ['Processo'])
+
+
+if __name__ == '__main__':
+    unittest.main()
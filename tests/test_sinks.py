@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import openpyxl
+
+from src import sinks
+from src.sinks import EXCEL_DATE_FORMAT, ExcelSink, rollover_path
+
+FIELDS = [{"name": "Processo", "format": "texto"}, {"name": "Valor", "format": "número"},
+          {"name": "Data", "format": "data"}]
+
+
+def records(start, count):
+    return [{"Processo": f"P{number}", "Valor": number * 1.5, "Data": "2024-03-05"}
+            for number in range(start, start + count)]
+
+
+def read_rows(path, sheet_index=-1):
+    workbook = openpyxl.load_workbook(path)
+    try:
+        return [list(row) for row in workbook.worksheets[sheet_index].iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+class ExcelSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'dados.xlsx')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, *batches, **options):
+        with ExcelSink(self.path, FIELDS, **options) as sink:
+            for batch in batches:
+                sink.write(batch)
+        return sink
+
+    def test_new_file_with_typed_values(self):
+        sink = self.write(records(1, 2), [])
+        self.assertEqual(sink.paths, [self.path])
+        self.assertEqual(sink.count, 2)
+        self.assertEqual(read_rows(self.path), [["Processo", "Valor", "Data"],
+                                                ["P1", 1.5, datetime(2024, 3, 5)],
+                                                ["P2", 3.0, datetime(2024, 3, 5)]])
+        workbook = openpyxl.load_workbook(self.path)
+        self.assertEqual(workbook.active.cell(3, 3).number_format, EXCEL_DATE_FORMAT)
+
+    def test_batches_give_the_same_file_as_a_single_write(self):
+        self.write(records(1, 3), records(4, 2))
+        batched = read_rows(self.path)
+        os.remove(self.path)
+        self.write(records(1, 5))
+        self.assertEqual(read_rows(self.path), batched)
+
+    def test_append_keeps_column_order_and_adds_new_columns_at_the_end(self):
+        self.write(records(1, 1))
+        self.write([{"Data": "2024-01-02", "Extra": "x", "Processo": "P2"}])
+        self.assertEqual(read_rows(self.path), [["Processo", "Valor", "Data", "Extra"],
+                                                ["P1", 1.5, datetime(2024, 3, 5), None],
+                                                ["P2", None, datetime(2024, 1, 2), "x"]])
+
+    def test_rollover_to_new_files(self):
+        sink = self.write(records(1, 4), records(5, 3), max_rows=3)
+        expected = [self.path, rollover_path(self.path, 2), rollover_path(self.path, 3)]
+        self.assertEqual(sink.paths, expected)
+        self.assertEqual([len(read_rows(path)) - 1 for path in expected], [3, 3, 1])
+        self.assertEqual(read_rows(expected[2]), [["Processo", "Valor", "Data"], ["P7", 10.5, datetime(2024, 3, 5)]])
+
+        # Nova execução: continua na última parte e, quando cheia, passa à seguinte
+        sink = self.write(records(8, 3), max_rows=3)
+        self.assertEqual(sink.paths, [expected[2], rollover_path(self.path, 4)])
+        self.assertEqual([row[0] for row in read_rows(expected[2])], ["Processo", "P7", "P8", "P9"])
+        self.assertEqual([row[0] for row in read_rows(rollover_path(self.path, 4))], ["Processo", "P10"])
+
+    def test_full_part_is_not_loaded(self):
+        self.write(records(1, 3), max_rows=3)
+        load_workbook = mock.Mock(wraps=openpyxl.load_workbook)
+        with mock.patch.object(sinks.openpyxl, 'load_workbook', load_workbook):
+            sink = self.write(records(4, 1), max_rows=3)
+        self.assertEqual(sink.paths, [rollover_path(self.path, 2)])
+        # Apenas a leitura das dimensões, em modo read_only
+        self.assertTrue(all(call.kwargs.get('read_only') for call in load_workbook.call_args_list))
+        self.assertEqual(read_rows(sink.paths[0]), [["Processo", "Valor", "Data"], ["P4", 6.0, datetime(2024, 3, 5)]])
+
+    def test_rollover_to_new_sheets(self):
+        self.write(records(1, 5), max_rows=2, rollover='sheet')
+        workbook = openpyxl.load_workbook(self.path)
+        self.assertEqual(workbook.sheetnames, ['Sheet1', 'Sheet2', 'Sheet3'])
+        self.assertEqual([row[0] for row in read_rows(self.path, 2)], ["Processo", "P5"])
+
+    def test_unreadable_file_is_not_overwritten(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'nao e um xlsx')
+        with self.assertLogs('email_extrator', 'WARNING'):
+            sink = self.write(records(1, 1))
+        self.assertEqual(sink.paths, [rollover_path(self.path, 2)])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), b'nao e um xlsx')
+
+    def test_invalid_rollover_mode(self):
+        with self.assertRaises(ValueError):
+            ExcelSink(self.path, FIELDS, rollover='coluna')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from src.email_processor import EmailProcessor
+
+
+STRUCTURE = b'("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "7BIT" 5 1 NIL NIL NIL)'
+
+
+class FakeImap:
+    """Servidor falso que responde ao BODYSTRUCTURE de todos e às partes apenas de alguns emails"""
+
+    def __init__(self, uids, complete):
+        self.uids = uids
+        self.complete = complete
+        self.commands = []
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == 'STORE':
+            return 'OK', [None]
+        if 'BODYSTRUCTURE' in args[1]:
+            return 'OK', [b'%d (UID %d BODYSTRUCTURE %s)' % (uid, uid, STRUCTURE) for uid in self.uids]
+        data = []
+        for uid in self.uids:
+            header = (b'%d (UID %d BODY[HEADER] {19}' % (uid, uid), b'Subject: teste\r\n\r\n')
+            if uid in self.complete:
+                data += [header, (b' BODY[1] {5}', b'texto'), b')']
+            else:
+                data += [header, b')']
+        return 'OK', data
+
+
+class TextPartsFetchTest(unittest.TestCase):
+
+    def fetch(self, incremental_sync=False):
+        processor = EmailProcessor()
+        processor.show_dialogs = False
+        processor.incremental_sync = incremental_sync
+        imap_server = FakeImap([1, 2, 3], complete={1, 3})
+        return processor._fetch_text_parts_batch(imap_server, [1, 2, 3]), imap_server
+
+    def test_incomplete_message_is_not_returned(self):
+        results, _ = self.fetch()
+        self.assertEqual([uid for uid, _ in results], [1, 3])
+
+    def test_marks_as_read_only_received_messages(self):
+        _, imap_server = self.fetch()
+        stores = [command for command in imap_server.commands if command[0] == 'STORE']
+        self.assertEqual(stores, [('STORE', '1,3', '+FLAGS', '(\\Seen)')])
+
+    def test_incremental_sync_does_not_mark_as_read(self):
+        _, imap_server = self.fetch(incremental_sync=True)
+        self.assertFalse([command for command in imap_server.commands if command[0] == 'STORE'])
+
+
+if __name__ == '__main__':
+    unittest.main()